@@ -0,0 +1,153 @@
+"""
+BM25 Index Module
+Incrementally maintained lexical index stored next to the vector collection,
+used to recover exact-term matches (names, course codes) that dense
+retrieval misses.
+"""
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Very common English words carry no ranking signal but have huge postings
+# lists, so they are dropped at both index and query time.
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "do", "does", "for",
+    "from", "had", "has", "have", "he", "her", "his", "how", "i", "if", "in",
+    "into", "is", "it", "its", "me", "my", "no", "not", "of", "on", "or", "our",
+    "she", "so", "than", "that", "the", "their", "them", "then", "there", "these",
+    "they", "this", "to", "was", "we", "were", "what", "when", "where", "which",
+    "who", "why", "will", "with", "you", "your",
+})
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens with stopwords and single characters removed."""
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in _STOPWORDS
+    ]
+
+
+class BM25Index:
+    """Okapi BM25 over an SQLite inverted index.
+
+    Postings are keyed by (term, doc_id) so documents can be added and
+    removed one batch at a time without rebuilding the index. SQLite keeps
+    the index shared between the API workers and the ingestion process.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " doc_id TEXT PRIMARY KEY,"
+            " length INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL,"
+            " doc_id TEXT NOT NULL,"
+            " tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id)"
+        )
+        self._conn.commit()
+
+    def add(self, doc_ids: list[str], texts: list[str]) -> None:
+        """Index (or re-index) documents by ID."""
+        if not doc_ids:
+            return
+
+        doc_rows = []
+        posting_rows = []
+        for doc_id, text in zip(doc_ids, texts):
+            counts = Counter(tokenize(text))
+            doc_rows.append((doc_id, sum(counts.values())))
+            posting_rows.extend((term, doc_id, tf) for term, tf in counts.items())
+
+        with self._lock:
+            self._delete_locked(doc_ids)
+            self._conn.executemany(
+                "INSERT INTO docs (doc_id, length) VALUES (?, ?)", doc_rows
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", posting_rows
+            )
+            self._conn.commit()
+
+    def delete(self, doc_ids: list[str]) -> None:
+        """Remove documents from the index; unknown IDs are ignored."""
+        if not doc_ids:
+            return
+        with self._lock:
+            self._delete_locked(doc_ids)
+            self._conn.commit()
+
+    def _delete_locked(self, doc_ids: list[str]) -> None:
+        rows = [(doc_id,) for doc_id in doc_ids]
+        self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", rows)
+        self._conn.executemany("DELETE FROM docs WHERE doc_id = ?", rows)
+
+    def search(self, query: str, k: int = 10) -> list[tuple[str, float]]:
+        """Return up to ``k`` ``(doc_id, score)`` pairs, best first."""
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+
+        scores: dict[str, float] = {}
+        with self._lock:
+            n_docs, avg_len = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM docs"
+            ).fetchone()
+            if not n_docs:
+                return []
+            avg_len = avg_len or 1.0
+
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p"
+                    " JOIN docs d ON d.doc_id = p.doc_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                df = len(rows)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in rows:
+                    norm = tf + self.k1 * (1.0 - self.b + self.b * length / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
+
+    def doc_ids(self) -> set[str]:
+        """Return every indexed document ID."""
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_id FROM docs").fetchall()
+        return {doc_id for (doc_id,) in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()
+        return int(count)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
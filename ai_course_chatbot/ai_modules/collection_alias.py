@@ -0,0 +1,97 @@
+"""
+Collection Alias Module
+Maps the configured collection name to the physical collection that is
+currently serving it, so a rebuilt collection can replace the live one with
+a single atomic file swap.
+"""
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionAlias:
+    """Alias file ``<persist_dir>/<alias>.alias.json``.
+
+    The file records the serving collection, the one it replaced and the
+    one before that. When it does not exist the alias resolves to a
+    collection of the same name, which keeps collections built before
+    aliases existed working unchanged.
+
+    The parsed file is cached and re-read only when its inode or mtime
+    changes (every swap replaces the file), so resolving it per search
+    costs one ``stat``.
+    """
+
+    def __init__(self, persist_directory: str, alias: str):
+        self.alias = alias
+        self.path = Path(persist_directory) / f"{alias}.alias.json"
+        self._cached: tuple[tuple[int, int] | None, dict] = (None, {})
+
+    def read(self) -> dict:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._cached = (None, {})
+            return {}
+        except OSError:
+            logger.warning("Ignoring unreadable collection alias %s", self.path, exc_info=True)
+            return {}
+        version = (stat.st_ino, stat.st_mtime_ns)
+        cached_version, state = self._cached
+        if version == cached_version:
+            return dict(state)
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable collection alias %s", self.path, exc_info=True)
+            return {}
+        self._cached = (version, state)
+        return dict(state)
+
+    def resolve(self) -> str:
+        """Return the physical collection the alias points at."""
+        return self.read().get("collection") or self.alias
+
+    def previous(self) -> str | None:
+        """Return the collection kept for rollback, if any."""
+        return self.read().get("previous")
+
+    def new_collection_name(self) -> str:
+        """Return a fresh physical name for a shadow collection."""
+        now = time.time()
+        stamp = time.strftime("%Y%m%d%H%M%S", time.gmtime(now)) + f"{int(now % 1 * 1e6):06d}"
+        return f"{self.alias}-{stamp}"
+
+    def swap(self, collection: str) -> str | None:
+        """Point the alias at ``collection``.
+
+        The replaced collection is kept as ``previous`` for rollback, and
+        the one that was previous until now as ``retired``, so processes
+        that have not re-read the alias yet can finish searching it. The
+        collection retired by the swap before is returned for the caller to
+        drop.
+        """
+        state = self.read()
+        current = state.get("collection") or self.alias
+        previous = state.get("previous")
+        retired = state.get("retired")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"collection": collection, "previous": current, "retired": previous,
+                       "swapped_at": time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        logger.info("Collection alias %s now points at %s (was %s)", self.alias, collection, current)
+
+        if retired in (collection, current, previous):
+            return None
+        return retired
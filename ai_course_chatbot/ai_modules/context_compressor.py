@@ -0,0 +1,141 @@
+"""
+Context Compressor Module
+Shrinks retrieved chunks to the sentences that share the most (IDF-weighted)
+terms with the question before they are packed into the prompt. Prompt
+evaluation time grows with prompt length, so fewer context tokens means a
+faster first token.
+"""
+import logging
+import math
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends, except after the honorifics common in the course texts.
+_SENTENCE_END = re.compile(
+    r"(?<=[.!?])(?<!\bMr\.)(?<!\bMrs\.)(?<!\bDr\.)(?<!\bSt\.)\s+|\n+"
+)
+_WORD = re.compile(r"\w+")
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from",
+    "had", "has", "have", "he", "her", "his", "how", "i", "in", "is", "it", "its", "of",
+    "on", "or", "she", "that", "the", "their", "them", "they", "this", "to", "was", "were",
+    "what", "when", "where", "which", "who", "whom", "why", "will", "with", "you", "your",
+})
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+
+def _terms(text: str) -> set[str]:
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in _STOPWORDS}
+
+
+class ContextCompressor:
+    """Keep the highest-scoring sentences of the retrieved chunks.
+
+    Each sentence is scored by the IDF weights (over all retrieved
+    sentences) of the question terms it contains, divided by the square root
+    of its own term count so long sentences do not win by size alone. Every
+    chunk keeps its best sentence; the rest are added best first until
+    ``budget_tokens`` is reached. Kept sentences stay in their original
+    order. Chunks that already fit the budget are returned unchanged, and so
+    are chunks sharing no term with the question (a paraphrase), since the
+    scores could not tell their sentences apart.
+    """
+
+    def __init__(self, budget_tokens: int, chars_per_token: float = 3.5):
+        if chars_per_token <= 0:
+            raise ValueError("chars_per_token must be positive")
+        self.budget_tokens = max(0, budget_tokens)
+        self.chars_per_token = chars_per_token
+
+    def _tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def score(self, question: str, sentences: list[str]) -> np.ndarray:
+        """Return one relevance score per sentence (0 when nothing matches)."""
+        vocabulary = sorted(_terms(question))
+        if not sentences or not vocabulary:
+            return np.zeros(len(sentences), dtype=np.float32)
+        index = {term: column for column, term in enumerate(vocabulary)}
+        presence = np.zeros((len(sentences), len(vocabulary)), dtype=np.float32)
+        lengths = np.ones(len(sentences), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            terms = _terms(sentence)
+            lengths[row] = max(len(terms), 1)
+            for term in terms & index.keys():
+                presence[row, index[term]] = 1.0
+        df = presence.sum(axis=0)
+        idf = np.log1p(len(sentences) / (1.0 + df))
+        return (presence @ idf) / np.sqrt(lengths)
+
+    def best_sentences(self, question: str, text: str, count: int = 2) -> str | None:
+        """Return the (at most ``count``) sentences of ``text`` that best match
+        ``question``, in their original order, or None if none shares a term."""
+        sentences = split_sentences(text)
+        scores = self.score(question, sentences)
+        if not scores.any():
+            return None
+        best = sorted(int(row) for row in np.argsort(-scores, kind="stable")[:count]
+                      if scores[row] > 0)
+        return " ".join(sentences[row] for row in best)
+
+    def compress(self, question: str, documents: list[Document],
+                 reserved_tokens: int = 0) -> list[Document]:
+        """Return ``documents`` cut down to their best sentences for ``question``.
+
+        ``reserved_tokens`` of the budget are kept free for the rest of the
+        prompt.
+        """
+        if not self.budget_tokens or not documents:
+            return documents
+        budget = max(0, self.budget_tokens - reserved_tokens)
+        total = sum(self._tokens(doc.page_content) for doc in documents)
+        if total <= budget:
+            return documents
+
+        sentences: list[str] = []
+        owners: list[int] = []
+        for position, doc in enumerate(documents):
+            for sentence in split_sentences(doc.page_content):
+                sentences.append(sentence)
+                owners.append(position)
+        if not sentences:
+            return documents
+        scores = self.score(question, sentences)
+        if not scores.any():
+            return documents
+        # Stable sort: equal scores keep document and sentence order.
+        ranked = np.argsort(-scores, kind="stable")
+
+        keep: set[int] = set()
+        used = 0
+        seen_owners: set[int] = set()
+        for row in ranked:  # best sentence of every chunk first
+            if owners[row] not in seen_owners:
+                seen_owners.add(owners[row])
+                keep.add(int(row))
+                used += self._tokens(sentences[row]) + 1
+        for row in ranked:
+            cost = self._tokens(sentences[row]) + 1
+            if int(row) in keep or used + cost > budget:
+                continue
+            keep.add(int(row))
+            used += cost
+
+        kept: list[list[str]] = [[] for _ in documents]
+        for row in sorted(keep):
+            kept[owners[row]].append(sentences[row])
+        compressed = [
+            Document(page_content=" ".join(parts), metadata=dict(doc.metadata), id=doc.id)
+            if parts else doc
+            for doc, parts in zip(documents, kept)
+        ]
+        logger.debug("Compressed context from %d to about %d tokens (%d/%d sentences)",
+                     total, used, len(keep), len(sentences))
+        return compressed
@@ -0,0 +1,102 @@
+"""
+Context Packer Module
+Fits retrieved chunks into a token budget derived from the model's context
+window, in relevance order, so a larger ``retriever_k`` or ``chunk_size``
+can never silently overflow ``num_ctx``.
+"""
+import logging
+import math
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PackedContext:
+    """The context string sent to the model and the chunks it was built from."""
+
+    text: str
+    documents: list[Document] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    truncated: int = 0
+    skipped: int = 0
+
+
+class ContextPacker:
+    """Greedy packer over chunks that are already sorted by relevance.
+
+    Token counts are estimated from the character count (``chars_per_token``
+    is deliberately conservative, since the model's tokenizer is not
+    available locally). A chunk that does not fit whole is truncated at a
+    word boundary when at least ``min_chunk_tokens`` of budget remain, and
+    skipped otherwise; later, shorter chunks may still fill the gap.
+    """
+
+    def __init__(self, budget_tokens: int, chars_per_token: float = 3.5,
+                 separator: str = "\n\n", min_chunk_tokens: int = 64):
+        if chars_per_token <= 0:
+            raise ValueError("chars_per_token must be positive")
+        self.budget_tokens = max(0, budget_tokens)
+        self.chars_per_token = chars_per_token
+        self.separator = separator
+        self.min_chunk_tokens = min_chunk_tokens
+
+    def estimate_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def pack(self, documents: list[Document], reserved_tokens: int = 0) -> PackedContext:
+        """Pack ``documents`` into the budget minus ``reserved_tokens``.
+
+        ``reserved_tokens`` covers the rest of the prompt (template and
+        question), so the whole prompt stays within the budget.
+        """
+        budget = max(0, self.budget_tokens - reserved_tokens)
+        separator_tokens = self.estimate_tokens(self.separator)
+        packed = PackedContext(text="", budget=budget)
+        parts: list[str] = []
+        remaining = budget
+
+        for doc in documents:
+            cost = self.estimate_tokens(doc.page_content)
+            if parts:
+                cost += separator_tokens
+            if cost <= remaining:
+                parts.append(doc.page_content)
+                packed.documents.append(doc)
+                remaining -= cost
+                continue
+
+            available = remaining - (separator_tokens if parts else 0)
+            if available < self.min_chunk_tokens:
+                packed.skipped += 1
+                continue
+
+            text = self._truncate(doc.page_content, int(available * self.chars_per_token))
+            parts.append(text)
+            packed.documents.append(Document(page_content=text, metadata=dict(doc.metadata)))
+            packed.truncated += 1
+            remaining -= self.estimate_tokens(text) + (separator_tokens if len(parts) > 1 else 0)
+
+        packed.text = self.separator.join(parts)
+        packed.tokens = budget - remaining
+        if packed.truncated or packed.skipped:
+            logger.debug(
+                "Packed %d/%d chunks into %d/%d tokens (%d truncated, %d skipped)",
+                len(packed.documents), len(documents), packed.tokens, budget,
+                packed.truncated, packed.skipped,
+            )
+        return packed
+
+    @staticmethod
+    def _truncate(text: str, max_chars: int) -> str:
+        """Cut ``text`` to ``max_chars``, preferring the last word boundary."""
+        if len(text) <= max_chars:
+            return text
+        cut = text[:max_chars]
+        boundary = cut.rfind(" ")
+        if boundary > max_chars // 2:
+            cut = cut[:boundary]
+        return cut.rstrip()
@@ -0,0 +1,278 @@
+"""
+Embedding Cache Module
+Persists document embeddings on disk keyed by (embedding model, content hash)
+so re-ingesting unchanged text never goes back to Ollama, and keeps recent
+query embeddings in memory so repeated questions skip the embedding call.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from cachetools import LRUCache
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    """Return the SHA-256 hex digest used to address normalized chunk text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Size-bounded, content-addressed embedding store backed by SQLite.
+
+    Vectors are stored as raw float32 blobs. Every lookup refreshes the
+    entry's ``last_used`` timestamp, and once the table grows beyond
+    ``max_entries`` the least recently used rows are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Ingestion batches run on worker threads, so the connection is
+        # shared and serialized by ``_lock``.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, content_hash))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used"
+            " ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: list[str]) -> dict[str, list[float]]:
+        """Return cached vectors for the given hashes; missing hashes are omitted."""
+        if not hashes:
+            return {}
+
+        unique = list(dict.fromkeys(hashes))
+        found: dict[str, list[float]] = {}
+        now = time.time()
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(unique), 500):
+                part = unique[start: start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    "SELECT content_hash, vector FROM embeddings"
+                    f" WHERE model = ? AND content_hash IN ({placeholders})",
+                    [model, *part],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND content_hash = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._conn.commit()
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model: str, items: dict[str, list[float]]) -> None:
+        """Store vectors keyed by content hash and evict old entries if needed."""
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (model, key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, content_hash, vector, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        """Drop least recently used rows beyond ``max_entries`` (lock held)."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN ("
+            " SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (overflow,),
+        )
+        self.evictions += overflow
+        logger.debug("Evicted %d embeddings from cache %s", overflow, self.path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return int(count)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace and case so trivially different questions share a key."""
+    return " ".join(text.split()).lower()
+
+
+class CachedEmbeddings(Embeddings):
+    """``Embeddings`` wrapper that consults an ``EmbeddingCache`` first.
+
+    Only texts whose content hash is missing from the cache are sent to the
+    wrapped embedding client, in a single call, preserving input order.
+    Query embeddings are memoized in a bounded, thread-safe LRU keyed on
+    the normalized query (the model is fixed per instance).
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str,
+                 cache: EmbeddingCache | None = None,
+                 query_cache_size: int = 1024):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+        self.query_hits = 0
+        self.query_misses = 0
+        self._query_cache: LRUCache | None = (
+            LRUCache(maxsize=query_cache_size) if query_cache_size > 0 else None
+        )
+        self._query_lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.cache is None or not texts:
+            return self.embeddings.embed_documents(texts)
+
+        hashes = [content_hash(text) for text in texts]
+        cached = self.cache.get_many(self.model, hashes)
+
+        missing: dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model, fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        if self._query_cache is None:
+            return self.embeddings.embed_query(text)
+
+        key = (self.model, normalize_query(text))
+        vector = self._cached_query(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(" ".join(text.split()))
+            self._remember_query(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Async ``embed_query`` sharing the same LRU; a miss awaits the client."""
+        if self._query_cache is None:
+            return await self.embeddings.aembed_query(text)
+
+        key = (self.model, normalize_query(text))
+        vector = self._cached_query(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(" ".join(text.split()))
+            self._remember_query(key, vector)
+        return vector
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embed several queries with one call for all LRU misses."""
+        keys, found, missing = self._split_queries(texts)
+        vectors = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._merge_queries(keys, found, missing, vectors)
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Async ``embed_queries``."""
+        keys, found, missing = self._split_queries(texts)
+        vectors = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return self._merge_queries(keys, found, missing, vectors)
+
+    def _split_queries(self, texts: list[str]) -> tuple[list, dict, dict]:
+        # Ollama embeds queries and documents the same way (/api/embed), so
+        # the misses can go through embed_documents as one batch.
+        keys = [(self.model, normalize_query(text)) for text in texts]
+        found: dict[tuple, list[float]] = {}
+        missing: dict[tuple, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            vector = self._cached_query(key) if self._query_cache is not None else None
+            if vector is None:
+                missing[key] = " ".join(text.split())
+            else:
+                found[key] = vector
+        return keys, found, missing
+
+    def _merge_queries(self, keys: list, found: dict, missing: dict,
+                       vectors: list[list[float]]) -> list[list[float]]:
+        for key, vector in zip(missing, vectors):
+            found[key] = vector
+            if self._query_cache is not None:
+                self._remember_query(key, vector)
+        return [found[key] for key in keys]
+
+    def _cached_query(self, key: tuple) -> list[float] | None:
+        with self._query_lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self.query_hits += 1
+            else:
+                self.query_misses += 1
+            return vector
+
+    def _remember_query(self, key: tuple, vector: list[float]) -> None:
+        with self._query_lock:
+            self._query_cache[key] = vector
+
+    def query_cache_stats(self) -> dict:
+        """Return hit/miss counters and current size of the query LRU."""
+        with self._query_lock:
+            total = self.query_hits + self.query_misses
+            return {
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+                "hit_rate": (self.query_hits / total) if total else 0.0,
+                "entries": len(self._query_cache) if self._query_cache is not None else 0,
+                "max_entries": self._query_cache.maxsize if self._query_cache is not None else 0,
+            }
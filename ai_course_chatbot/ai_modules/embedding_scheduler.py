@@ -0,0 +1,203 @@
+"""
+Embedding Scheduler Module
+Feeds document batches to the embedding/storage backend with configurable
+concurrency, latency-driven batch sizing and per-batch retries.
+"""
+import logging
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+
+import httpx
+import ollama
+
+from ai_course_chatbot.config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+AddBatchFn = Callable[[list, list[str]], object]
+
+# Failures of the embedding host or its transport (timeouts, dropped
+# connections, error responses such as an oversized batch), which splitting
+# and retrying can fix. Anything else is a bug and is raised.
+RETRYABLE_ERRORS = (httpx.HTTPError, ollama.ResponseError, ConnectionError, TimeoutError)
+
+
+@dataclass
+class SchedulerReport:
+    """Outcome of one scheduler run."""
+
+    processed: int = 0
+    failed: int = 0
+    retries: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    final_batch_size: int = 0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+@dataclass
+class _Batch:
+    docs: list
+    ids: list[str]
+    attempt: int = 0
+    ready_at: float = 0.0
+
+
+class EmbeddingBatchScheduler:
+    """Adaptive batch scheduler for embedding ingestion.
+
+    Batch size adapts to measured latency: batches finishing in under half
+    of ``target_batch_seconds`` grow the next batch by 50%, slow batches and
+    failed batches halve it, always within
+    ``[min_batch_size, max_batch_size]``. A failed batch is split to the
+    current size and retried with exponential backoff; after
+    ``max_retries`` its documents are counted as failed and the run
+    continues with the remaining input. Only ``RETRYABLE_ERRORS`` are
+    retried; any other exception aborts the run.
+    """
+
+    def __init__(self, batch_size: int = 128,
+                 min_batch_size: int = 8,
+                 max_batch_size: int = 512,
+                 concurrency: int = 2,
+                 target_batch_seconds: float = 15.0,
+                 max_retries: int = 3,
+                 retry_backoff: float = 2.0):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if not 1 <= min_batch_size <= max_batch_size:
+            raise ValueError("batch size bounds must satisfy 1 <= min <= max")
+
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.batch_size = self._clamp(batch_size)
+        self.concurrency = concurrency
+        self.target_batch_seconds = target_batch_seconds
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    @classmethod
+    def from_settings(cls, settings: Settings | None = None) -> "EmbeddingBatchScheduler":
+        settings = settings or get_settings()
+        return cls(
+            batch_size=settings.embedding_batch_size,
+            min_batch_size=settings.embedding_min_batch_size,
+            max_batch_size=settings.embedding_max_batch_size,
+            concurrency=settings.embedding_concurrency,
+            target_batch_seconds=settings.embedding_target_batch_seconds,
+            max_retries=settings.embedding_max_retries,
+            retry_backoff=settings.embedding_retry_backoff,
+        )
+
+    def run(self, items: Iterable[tuple[object, str]], add_batch: AddBatchFn) -> SchedulerReport:
+        """Consume ``(document, id)`` pairs and hand batches to ``add_batch``.
+
+        Input is pulled lazily, so at most ``concurrency`` batches (plus any
+        waiting retries) are held in memory at once.
+        """
+        source: Iterator[tuple[object, str]] = iter(items)
+        retries: deque[_Batch] = deque()
+        in_flight: dict = {}  # future -> (batch, submitted_at)
+        report = SchedulerReport()
+        exhausted = False
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                now = time.perf_counter()
+                while len(in_flight) < self.concurrency:
+                    batch = None
+                    if retries and retries[0].ready_at <= now:
+                        batch = retries.popleft()
+                    elif not exhausted:
+                        pairs = list(islice(source, self.batch_size))
+                        if pairs:
+                            docs, ids = zip(*pairs)
+                            batch = _Batch(list(docs), list(ids))
+                        else:
+                            exhausted = True
+                    if batch is None:
+                        break
+                    future = executor.submit(add_batch, batch.docs, batch.ids)
+                    in_flight[future] = (batch, time.perf_counter())
+
+                if not in_flight:
+                    if retries:
+                        time.sleep(max(0.0, retries[0].ready_at - time.perf_counter()))
+                        continue
+                    break
+
+                timeout = None
+                if retries:
+                    timeout = max(0.0, retries[0].ready_at - time.perf_counter())
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    batch, submitted_at = in_flight.pop(future)
+                    elapsed = time.perf_counter() - submitted_at
+                    try:
+                        future.result()
+                    except RETRYABLE_ERRORS as e:
+                        self._on_failure(batch, e, retries, report)
+                        continue
+                    report.batches += 1
+                    report.processed += len(batch.ids)
+                    self._on_success(elapsed)
+                    total_elapsed = time.perf_counter() - start
+                    logger.info(
+                        "Processed %d documents; batch of %d in %.2f seconds (%.1f docs/sec)",
+                        report.processed, len(batch.ids), elapsed,
+                        report.processed / total_elapsed if total_elapsed > 0 else 0.0,
+                    )
+
+        report.elapsed = time.perf_counter() - start
+        report.final_batch_size = self.batch_size
+        return report
+
+    def _on_success(self, elapsed: float) -> None:
+        if elapsed > self.target_batch_seconds:
+            self._resize(self.batch_size // 2)
+        elif elapsed < self.target_batch_seconds / 2:
+            self._resize(int(self.batch_size * 1.5))
+
+    def _on_failure(self, batch: _Batch, error: Exception,
+                    retries: deque, report: SchedulerReport) -> None:
+        self._resize(self.batch_size // 2)
+        if batch.attempt >= self.max_retries:
+            report.failed += len(batch.ids)
+            logger.error(
+                "Giving up on batch of %d documents after %d attempts: %s",
+                len(batch.ids), batch.attempt + 1, error,
+            )
+            return
+
+        delay = self.retry_backoff * (2 ** batch.attempt)
+        ready_at = time.perf_counter() + delay
+        for i in range(0, len(batch.ids), self.batch_size):
+            retries.append(_Batch(
+                batch.docs[i: i + self.batch_size],
+                batch.ids[i: i + self.batch_size],
+                attempt=batch.attempt + 1,
+                ready_at=ready_at,
+            ))
+            report.retries += 1
+        logger.warning(
+            "Batch of %d documents failed (%s); retrying in %.1f seconds",
+            len(batch.ids), error, delay,
+        )
+
+    def _resize(self, size: int) -> None:
+        new_size = self._clamp(size)
+        if new_size != self.batch_size:
+            logger.debug("Embedding batch size %d -> %d", self.batch_size, new_size)
+            self.batch_size = new_size
+
+    def _clamp(self, size: int) -> int:
+        return max(self.min_batch_size, min(self.max_batch_size, size))
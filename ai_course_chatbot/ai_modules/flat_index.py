@@ -0,0 +1,508 @@
+"""
+Flat Index Module
+In-process vector index that keeps L2-normalized float32 embeddings in a
+memory-mapped matrix with a JSON-lines metadata sidecar.
+
+Top-k search is one matrix-vector product plus ``np.argpartition``; for
+collections up to a few hundred thousand chunks that is faster than a Chroma
+round trip, and every uvicorn worker maps the same read-only file instead of
+holding its own copy.
+
+Optionally the first pass runs over int8 (4x smaller) or sign-bit (32x
+smaller) codes, and only the best ``k * rerank_factor`` candidates are
+rescored against the full-precision rows, which stay on disk.
+"""
+import json
+import logging
+import os
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore as LangChainVectorStore
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Rows scored per step in the quantized first pass; bounds the float32
+# temporaries to a few megabytes regardless of index size.
+_BLOCK_ROWS = 4096
+
+_POPCOUNT = np.array([i.bit_count() for i in range(256)], dtype=np.uint8)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _matches(metadata: dict, where: dict) -> bool:
+    """Chroma-style ``where`` filter: key equality, optionally under ``$and``."""
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    return all(metadata.get(key) == value for key, value in where.items())
+
+
+def quantize(matrix: np.ndarray, quantization: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Encode float rows as int8 codes with per-row scales, or packed sign bits."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if quantization == "int8":
+        peak = np.abs(matrix).max(axis=1)
+        peak = np.where(peak == 0, 1.0, peak)
+        codes = np.round(matrix / peak[:, None] * 127.0).astype(np.int8)
+        return codes, (peak / 127.0).astype(np.float32)
+    if quantization == "binary":
+        return np.packbits(matrix > 0, axis=1), None
+    raise ValueError(f"Unsupported quantization: {quantization!r}")
+
+
+class FlatIndex(LangChainVectorStore):
+    """Exact cosine-similarity index over memory-mapped files.
+
+    Layout inside ``directory``::
+
+        manifest.json        {"generation": g, "count": n, "dim": d, "meta_bytes": m}
+        vectors-<g>.f32      n x d float32 rows, L2-normalized
+        meta-<g>.jsonl       one {"id", "text", "metadata"} object per row
+
+    Writers append rows to the current generation and then atomically
+    replace the manifest, so readers only ever see complete rows; a crashed
+    writer's partial rows are truncated before the next append. Deletes
+    compact into a new generation. Readers notice manifest changes on their
+    next call and remap. A single writer process is assumed, as with the
+    Celery ingestion worker.
+    """
+
+    def __init__(self, directory: str, embedding_function: Embeddings,
+                 quantization: str = "none", rerank_factor: int = 4):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, got {quantization!r}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._embedding_function = embedding_function
+        self.quantization = quantization
+        self.rerank_factor = max(1, rerank_factor)
+        self._lock = threading.RLock()
+        self._manifest_raw: str | None = None
+        self._generation = 0
+        self._dim = 0
+        self._meta_bytes = 0
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._codes: np.ndarray | None = None
+        self._scales: np.ndarray | None = None
+        self._ids: list[str] = []
+        self._offsets: list[int] = []
+        self._id_to_row: dict[str, int] = {}
+        self._refresh()
+
+    # ── Files ─────────────────────────────────────────────────────────────
+    @property
+    def _manifest_path(self) -> Path:
+        return self.directory / "manifest.json"
+
+    def _vectors_path(self, generation: int) -> Path:
+        return self.directory / f"vectors-{generation}.f32"
+
+    def _meta_path(self, generation: int) -> Path:
+        return self.directory / f"meta-{generation}.jsonl"
+
+    def _codes_path(self, generation: int) -> Path:
+        return self.directory / f"codes-{generation}.{self.quantization}"
+
+    def _scales_path(self, generation: int) -> Path:
+        return self.directory / f"scales-{generation}.f32"
+
+    def _code_row_bytes(self, dim: int) -> int:
+        return dim if self.quantization == "int8" else (dim + 7) // 8
+
+    def _write_manifest(self, generation: int, count: int, dim: int, meta_bytes: int) -> None:
+        tmp = self._manifest_path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({
+                "generation": generation, "count": count,
+                "dim": dim, "meta_bytes": meta_bytes,
+            }),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self._manifest_path)
+
+    def _refresh(self) -> None:
+        """Remap the files if another writer (or this one) changed the manifest."""
+        # The manifest is a few dozen bytes; comparing its content is cheap and,
+        # unlike mtime/inode checks, cannot miss a rapid sequence of writes.
+        try:
+            raw = self._manifest_path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return
+        if raw == self._manifest_raw:
+            return
+
+        with self._lock:
+            manifest = json.loads(raw)
+            generation = manifest["generation"]
+            count = manifest["count"]
+            dim = manifest["dim"]
+
+            if count:
+                vectors = np.memmap(
+                    self._vectors_path(generation), dtype=np.float32,
+                    mode="r", shape=(count, dim),
+                )
+            else:
+                vectors = np.empty((0, dim), dtype=np.float32)
+
+            ids: list[str] = []
+            offsets: list[int] = []
+            meta_path = self._meta_path(generation)
+            if count:
+                with open(meta_path, "rb") as f:
+                    offset = 0
+                    for line in f:
+                        if len(ids) == count:
+                            break
+                        ids.append(json.loads(line)["id"])
+                        offsets.append(offset)
+                        offset += len(line)
+
+            self._generation = generation
+            self._dim = dim
+            self._meta_bytes = manifest.get("meta_bytes", 0)
+            self._vectors = vectors
+            self._codes, self._scales = self._load_codes(generation, count, dim)
+            self._ids = ids
+            self._offsets = offsets
+            self._id_to_row = {doc_id: row for row, doc_id in enumerate(ids)}
+            self._manifest_raw = raw
+
+    def _load_codes(self, generation: int, count: int,
+                    dim: int) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """Map persisted codes, or quantize in memory if they were never written."""
+        if self.quantization == "none" or not count:
+            return None, None
+
+        row_bytes = self._code_row_bytes(dim)
+        codes_path = self._codes_path(generation)
+        scales_path = self._scales_path(generation)
+        codes_ok = codes_path.exists() and codes_path.stat().st_size >= count * row_bytes
+        scales_ok = self.quantization != "int8" or (
+            scales_path.exists() and scales_path.stat().st_size >= count * 4
+        )
+        if codes_ok and scales_ok:
+            dtype = np.int8 if self.quantization == "int8" else np.uint8
+            codes = np.memmap(codes_path, dtype=dtype, mode="r", shape=(count, row_bytes))
+            scales = (
+                np.memmap(scales_path, dtype=np.float32, mode="r", shape=(count,))
+                if self.quantization == "int8" else None
+            )
+            return codes, scales
+
+        logger.info(
+            "Quantizing %d vectors (%s) in memory for %s",
+            count, self.quantization, self.directory,
+        )
+        parts = [
+            quantize(self._vectors[start: start + _BLOCK_ROWS], self.quantization)
+            for start in range(0, count, _BLOCK_ROWS)
+        ]
+        codes = np.concatenate([codes for codes, _ in parts])
+        scales = (
+            np.concatenate([scales for _, scales in parts])
+            if self.quantization == "int8" else None
+        )
+        return codes, scales
+
+    def _write_codes(self, generation: int, count: int, matrix: np.ndarray) -> None:
+        """Append codes for ``matrix`` after the ``count`` committed rows."""
+        row_bytes = self._code_row_bytes(matrix.shape[1])
+        codes_path = self._codes_path(generation)
+        scales_path = self._scales_path(generation)
+
+        persisted = codes_path.exists() and codes_path.stat().st_size >= count * row_bytes
+        if count and not persisted and self._codes is not None:
+            # Codes for existing rows only lived in memory; write them out first.
+            codes_path.write_bytes(np.ascontiguousarray(self._codes[:count]).tobytes())
+            if self._scales is not None:
+                scales_path.write_bytes(np.ascontiguousarray(self._scales[:count]).tobytes())
+
+        codes, scales = quantize(matrix, self.quantization)
+        with open(codes_path, "ab") as f:
+            f.truncate(count * row_bytes)
+            f.write(codes.tobytes())
+        if scales is not None:
+            with open(scales_path, "ab") as f:
+                f.truncate(count * 4)
+                f.write(scales.tobytes())
+
+    def _read_rows(self, rows: Iterable[int]) -> list[dict]:
+        records = []
+        with open(self._meta_path(self._generation), "rb") as f:
+            for row in rows:
+                f.seek(self._offsets[row])
+                records.append(json.loads(f.readline()))
+        return records
+
+    # ── LangChain VectorStore API ─────────────────────────────────────────
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def add_texts(self, texts: Iterable[str], metadatas: list[dict] | None = None,
+                  ids: list[str] | None = None, **kwargs: Any) -> list[str]:
+        texts = list(texts)
+        if ids is None:
+            raise ValueError("FlatIndex requires explicit document IDs")
+        vectors = self._embedding_function.embed_documents(texts)
+        self.add_vectors(ids, vectors, texts, metadatas or [{} for _ in texts])
+        return list(ids)
+
+    def add_vectors(self, ids: list[str], vectors: list[list[float]],
+                    texts: list[str], metadatas: list[dict]) -> None:
+        """Append pre-computed embeddings; existing IDs are replaced."""
+        if not ids:
+            return
+        matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            self._refresh()
+            if self._dim and matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Embedding dimension {matrix.shape[1]} does not match index dimension {self._dim}"
+                )
+            replaced = [doc_id for doc_id in ids if doc_id in self._id_to_row]
+            if replaced:
+                self.delete(replaced)
+
+            generation = self._generation
+            count = len(self._ids)
+            lines = [
+                (json.dumps({"id": doc_id, "text": text, "metadata": metadata},
+                            ensure_ascii=False) + "\n").encode("utf-8")
+                for doc_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            with open(self._vectors_path(generation), "ab") as f:
+                f.truncate(count * self._dim * 4)
+                f.write(matrix.tobytes())
+            with open(self._meta_path(generation), "ab") as f:
+                f.truncate(self._meta_bytes)
+                f.writelines(lines)
+            if self.quantization != "none":
+                self._write_codes(generation, count, matrix)
+            self._write_manifest(
+                generation, count + len(ids), matrix.shape[1],
+                self._meta_bytes + sum(len(line) for line in lines),
+            )
+            self._refresh()
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> bool:
+        """Remove IDs by compacting the surviving rows into a new generation."""
+        if not ids:
+            return False
+        with self._lock:
+            self._refresh()
+            drop = {self._id_to_row[doc_id] for doc_id in ids if doc_id in self._id_to_row}
+            if not drop:
+                return False
+
+            keep = [row for row in range(len(self._ids)) if row not in drop]
+            old_generation = self._generation
+            generation = old_generation + 1
+            with open(self._vectors_path(generation), "wb") as f:
+                f.writelines(
+                    np.ascontiguousarray(self._vectors[keep[start: start + 65536]]).tobytes()
+                    for start in range(0, len(keep), 65536)
+                )
+            meta_bytes = 0
+            with open(self._meta_path(old_generation), "rb") as src, \
+                    open(self._meta_path(generation), "wb") as dst:
+                for row in keep:
+                    src.seek(self._offsets[row])
+                    line = src.readline()
+                    dst.write(line)
+                    meta_bytes += len(line)
+            if self._codes is not None:
+                self._codes_path(generation).write_bytes(
+                    np.ascontiguousarray(self._codes[keep]).tobytes()
+                )
+            if self._scales is not None:
+                self._scales_path(generation).write_bytes(
+                    np.ascontiguousarray(self._scales[keep]).tobytes()
+                )
+            self._write_manifest(generation, len(keep), self._dim, meta_bytes)
+            self._refresh()
+
+            # Readers that still map the old generation keep working on POSIX;
+            # elsewhere the files are removed on a later compaction.
+            old_files = (
+                self._vectors_path(old_generation), self._meta_path(old_generation),
+                self._codes_path(old_generation), self._scales_path(old_generation),
+            )
+            for path in old_files:
+                if not path.exists():
+                    continue
+                try:
+                    path.unlink()
+                except OSError:
+                    logger.debug("Could not remove %s yet", path)
+        logger.info("Removed %d rows from flat index %s", len(drop), self.directory)
+        return True
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     **kwargs: Any) -> list[tuple[Document, float]]:
+        """Return ``(document, cosine similarity)`` pairs, most similar first."""
+        return self.similarity_search_by_vector_with_score(
+            self._embedding_function.embed_query(query), k=k
+        )
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4,
+                                    **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k)]
+
+    def similarity_search_by_vector_with_score(self, embedding: list[float],
+                                               k: int = 4) -> list[tuple[Document, float]]:
+        self._refresh()
+        with self._lock:
+            rows, scores = self._top_k(np.asarray(embedding, dtype=np.float32), k)
+            records = self._read_rows(rows)
+        return [
+            (Document(page_content=r["text"], metadata=r["metadata"], id=r["id"]), float(score))
+            for r, score in zip(records, scores)
+        ]
+
+    def _top_k(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return row indices and cosine scores of the best ``k`` rows."""
+        count = len(self._ids)
+        if not count or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalize_rows(query)
+        k = min(k, count)
+        if self._codes is None:
+            return self._exact_top_k(query, k)
+
+        # Quantized first pass, then exact rescoring of the candidates only.
+        n_candidates = min(count, k * self.rerank_factor)
+        approx = self._approximate_scores(query)
+        candidates = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+        candidates.sort()  # sequential reads from the float32 file
+        exact = self._vectors[candidates] @ query
+        order = np.argsort(-exact, kind="stable")[:k]
+        return candidates[order], exact[order]
+
+    def _exact_top_k(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        scores = self._vectors @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top, scores[top]
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        count = len(self._ids)
+        scores = np.empty(count, dtype=np.float32)
+        if self.quantization == "int8":
+            for start in range(0, count, _BLOCK_ROWS):
+                end = start + _BLOCK_ROWS
+                block = self._codes[start:end].astype(np.float32)
+                scores[start:end] = (block @ query) * self._scales[start:end]
+        else:
+            query_bits = np.packbits(query > 0)
+            for start in range(0, count, _BLOCK_ROWS):
+                end = start + _BLOCK_ROWS
+                distance = _POPCOUNT[np.bitwise_xor(self._codes[start:end], query_bits)].sum(axis=1)
+                scores[start:end] = -distance.astype(np.float32)
+        return scores
+
+    def recall_at_k(self, queries: np.ndarray, k: int = 10) -> float:
+        """Fraction of the exact float32 top-k that the configured search returns.
+
+        Useful to check what a quantization setting costs on a real corpus;
+        always 1.0 without quantization.
+        """
+        self._refresh()
+        count = len(self._ids)
+        if not count:
+            return 1.0
+        k = min(k, count)
+        hits = total = 0
+        with self._lock:
+            for query in np.atleast_2d(np.asarray(queries, dtype=np.float32)):
+                query = _normalize_rows(query)
+                expected, _ = self._exact_top_k(query, k)
+                found, _ = self._top_k(query, k)
+                hits += len(set(expected.tolist()) & set(found.tolist()))
+                total += len(expected)
+        return hits / total if total else 1.0
+
+    def memory_footprint(self) -> dict[str, int]:
+        """Bytes of full-precision rows vs. bytes scanned by the first pass."""
+        self._refresh()
+        float_bytes = int(self._vectors.nbytes)
+        search_bytes = float_bytes
+        if self._codes is not None:
+            search_bytes = int(self._codes.nbytes)
+            if self._scales is not None:
+                search_bytes += int(self._scales.nbytes)
+        return {"float32_bytes": float_bytes, "search_bytes": search_bytes}
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities in [-1, 1].
+        return lambda score: (score + 1.0) / 2.0
+
+    def get_by_ids(self, ids, /) -> list[Document]:
+        self._refresh()
+        with self._lock:
+            rows = [self._id_to_row[doc_id] for doc_id in ids if doc_id in self._id_to_row]
+            records = self._read_rows(rows)
+        return [
+            Document(page_content=r["text"], metadata=r["metadata"], id=r["id"])
+            for r in records
+        ]
+
+    def get(self, ids: list[str] | None = None, where: dict | None = None,
+            include: list[str] | None = None, **kwargs: Any) -> dict[str, list]:
+        """Chroma-compatible subset of ``get`` used by ``VectorStore``.
+
+        ``where`` supports ``{"key": value}`` metadata equality and ``$and``
+        of such clauses only.
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        self._refresh()
+        with self._lock:
+            if ids is None:
+                rows = list(range(len(self._ids)))
+            else:
+                rows = [self._id_to_row[doc_id] for doc_id in ids if doc_id in self._id_to_row]
+            if where:
+                rows = [
+                    row for row, r in zip(rows, self._read_rows(rows))
+                    if _matches(r["metadata"], where)
+                ]
+            result: dict[str, list] = {"ids": [self._ids[row] for row in rows]}
+            if include:
+                records = self._read_rows(rows)
+                if "documents" in include:
+                    result["documents"] = [r["text"] for r in records]
+                if "metadatas" in include:
+                    result["metadatas"] = [r["metadata"] for r in records]
+            if "embeddings" in include:
+                # Stored rows are unit-normalized.
+                result["embeddings"] = np.asarray(self._vectors[rows], dtype=np.float32)
+        return result
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._ids)
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings,
+                   metadatas: list[dict] | None = None, *,
+                   ids: list[str] | None = None, directory: str = "./flat_index",
+                   **kwargs: Any) -> "FlatIndex":
+        index = cls(directory, embedding_function=embedding)
+        index.add_texts(texts, metadatas=metadatas, ids=ids)
+        return index
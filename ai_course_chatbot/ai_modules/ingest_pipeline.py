@@ -0,0 +1,65 @@
+"""
+Ingest Pipeline Module
+Bounded hand-off between ingestion stages: each stage runs in its own
+thread and blocks once the queue to the next stage is full, so parsing,
+hashing, the stored-ID check and embedding overlap without any stage
+running ahead of the others by more than ``maxsize`` items.
+"""
+import logging
+import queue
+import threading
+from collections.abc import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def prefetch(iterable: Iterable, maxsize: int, name: str = "ingest-stage") -> Iterator:
+    """Iterate ``iterable`` in a background thread, buffering at most ``maxsize`` items.
+
+    Exceptions raised by the producer are re-raised in the consumer. If the
+    consumer stops early the producer is told to stop at its next item.
+    """
+    items: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:  # noqa: BLE001 - re-raised in the consumer
+            put(_Failure(e))
+        else:
+            put(_DONE)
+
+    threading.Thread(target=produce, name=name, daemon=True).start()
+    return _consume(items, stop)
+
+
+def _consume(items: queue.Queue, stop: threading.Event) -> Iterator:
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,92 @@
+"""
+Model Router Module
+Switches generation to a smaller, faster model while the service is under
+load (deep generation queue or slow recent answers) and back once it has
+drained.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRouter:
+    """Choose between the primary and the fast model for each generation.
+
+    The router degrades to ``fast_model`` when ``queue_depth()`` reaches
+    ``queue_threshold`` or the p95 of the primary model's last ``window``
+    generation times reaches ``p95_threshold`` seconds. It returns to the
+    primary model once at least ``cooldown`` seconds have passed and the
+    queue is back under ``recovery_ratio`` of its threshold. That hysteresis
+    keeps it from flapping between models. Without a fast model every call
+    gets the primary one.
+    """
+
+    def __init__(self, primary_model: str, fast_model: str | None = None,
+                 queue_depth: Callable[[], int] = lambda: 0,
+                 queue_threshold: int = 8, p95_threshold: float = 20.0,
+                 window: int = 50, recovery_ratio: float = 0.5,
+                 cooldown: float = 30.0, timer=time.monotonic):
+        self.primary_model = primary_model
+        self.fast_model = fast_model if fast_model and fast_model != primary_model else None
+        self.queue_depth = queue_depth
+        self.queue_threshold = queue_threshold
+        self.p95_threshold = p95_threshold
+        self.recovery_ratio = recovery_ratio
+        self.cooldown = cooldown
+        self._timer = timer
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.degraded = False
+        self._degraded_since = 0.0
+        self.switches = 0
+
+    def record(self, model: str, seconds: float) -> None:
+        """Record how long a generation took (only the primary model counts)."""
+        if model == self.primary_model:
+            with self._lock:
+                self._latencies.append(seconds)
+
+    def _p95_locked(self) -> float | None:
+        if len(self._latencies) < 5:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+    def choose(self) -> str:
+        """Return the model the next generation should use."""
+        if self.fast_model is None:
+            return self.primary_model
+
+        depth = self.queue_depth()
+        with self._lock:
+            now = self._timer()
+            p95 = self._p95_locked()
+            if not self.degraded:
+                if depth >= self.queue_threshold or (p95 is not None and p95 >= self.p95_threshold):
+                    self.degraded = True
+                    self._degraded_since = now
+                    self.switches += 1
+                    logger.warning("Load high (queue %d, p95 %s s); routing to %s",
+                                   depth, f"{p95:.1f}" if p95 is not None else "n/a", self.fast_model)
+            elif (now - self._degraded_since >= self.cooldown
+                  and depth <= self.queue_threshold * self.recovery_ratio):
+                self.degraded = False
+                # Samples from the overload would switch straight back.
+                self._latencies.clear()
+                logger.info("Load back to normal (queue %d); routing to %s",
+                            depth, self.primary_model)
+            return self.fast_model if self.degraded else self.primary_model
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "model": self.fast_model if self.degraded else self.primary_model,
+                "degraded": self.degraded,
+                "switches": self.switches,
+                "p95_seconds": self._p95_locked(),
+            }
@@ -0,0 +1,251 @@
+"""
+Ollama Pool Module
+Spreads chat and embedding traffic over several Ollama hosts: each call goes
+to the healthy backend with the fewest outstanding requests, and backends
+that keep failing are ejected until a health check (or a later retry)
+succeeds.
+"""
+import logging
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+from ai_course_chatbot.config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def chat_backend_urls(settings: Settings | None = None) -> list[str]:
+    """Ollama hosts for generation (``OLLAMA_CHAT_URLS`` or the base URL)."""
+    settings = settings or get_settings()
+    return settings.ollama_chat_urls or [settings.ollama_base_url]
+
+
+def embedding_backend_urls(settings: Settings | None = None) -> list[str]:
+    """Ollama hosts for embeddings (``OLLAMA_EMBEDDING_URLS`` or the chat hosts)."""
+    settings = settings or get_settings()
+    return settings.ollama_embedding_urls or chat_backend_urls(settings)
+
+
+def is_backend_error(error: BaseException) -> bool:
+    """True for failures of the host itself rather than of the request."""
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and status_code >= 500
+
+
+class Backend:
+    """One Ollama host, its client and its routing counters."""
+
+    def __init__(self, url: str, client: Any):
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0  # consecutive
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+
+class OllamaPool:
+    """Least-outstanding-requests routing over a list of Ollama hosts.
+
+    ``factory(url)`` builds the client for each host (a ``ChatOllama`` or
+    ``OllamaEmbeddings``), so connection pools stay per host. After
+    ``failure_threshold`` consecutive host failures a backend is ejected for
+    ``ejection_seconds``; afterwards a single further failure ejects it
+    again, while a success or a passing health check readmits it. If every
+    backend is ejected, the one due back first is used rather than failing.
+    """
+
+    def __init__(self, urls: list[str], factory: Callable[[str], Any],
+                 failure_threshold: int = 3, ejection_seconds: float = 30.0,
+                 health_interval: float = 0.0, timer=time.monotonic):
+        urls = list(dict.fromkeys(url.rstrip("/") for url in urls))
+        if not urls:
+            raise ValueError("At least one Ollama URL is required")
+        self.backends = [Backend(url, factory(url)) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._rotation = 0
+        self._closed = threading.Event()
+
+        if health_interval > 0 and len(self.backends) > 1:
+            threading.Thread(
+                target=self._health_loop, args=(health_interval,),
+                name="ollama-health", daemon=True,
+            ).start()
+
+    @classmethod
+    def from_settings(cls, urls: list[str], factory: Callable[[str], Any]) -> "OllamaPool":
+        settings = get_settings()
+        return cls(
+            urls, factory,
+            failure_threshold=settings.ollama_failure_threshold,
+            ejection_seconds=settings.ollama_ejection_seconds,
+            health_interval=settings.ollama_health_interval,
+        )
+
+    # ── Routing ────────────────────────────────────────────────────────────
+
+    def _acquire(self, exclude: list[Backend]) -> Backend:
+        with self._lock:
+            now = self._timer()
+            candidates = [b for b in self.backends if b not in exclude]
+            live = [b for b in candidates if b.ejected_until <= now]
+            if not live:
+                live = [min(candidates, key=lambda b: b.ejected_until)]
+            # Rotate the starting point so ties do not all land on one host.
+            start = self._rotation % len(live)
+            self._rotation += 1
+            backend = min(live[start:] + live[:start], key=lambda b: b.outstanding)
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def _finish(self, backend: Backend, error: BaseException | None = None) -> None:
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.failures = 0
+                backend.ejected_until = 0.0
+                return
+            if not is_backend_error(error):
+                return
+            backend.errors += 1
+            backend.failures += 1
+            if backend.failures >= self.failure_threshold:
+                self._eject_locked(backend, repr(error))
+
+    def _eject_locked(self, backend: Backend, reason: str) -> None:
+        now = self._timer()
+        if backend.ejected_until > now:
+            return
+        backend.ejected_until = now + self.ejection_seconds
+        backend.ejections += 1
+        logger.warning("Ejecting Ollama backend %s for %.0fs: %s",
+                       backend.url, self.ejection_seconds, reason)
+
+    def _should_retry(self, error: BaseException, backend: Backend, tried: list[Backend]) -> bool:
+        tried.append(backend)
+        if not isinstance(error, Exception) or not is_backend_error(error):
+            return False
+        if len(tried) >= len(self.backends):
+            return False
+        logger.warning("Ollama backend %s failed (%s); retrying on another host", backend.url, error)
+        return True
+
+    @contextmanager
+    def lease(self) -> Iterator[Backend]:
+        """Hold the least-loaded backend for a call that cannot be retried
+        transparently (e.g. a token stream already sent to a client)."""
+        backend = self._acquire([])
+        try:
+            yield backend
+        except BaseException as e:
+            self._finish(backend, e)
+            raise
+        self._finish(backend)
+
+    def run(self, call: Callable[[Any], Any]) -> Any:
+        """Call ``call(client)`` on the least-loaded backend, moving to
+        another host when the chosen one fails."""
+        tried: list[Backend] = []
+        while True:
+            backend = self._acquire(tried)
+            try:
+                result = call(backend.client)
+            except BaseException as e:
+                self._finish(backend, e)
+                if self._should_retry(e, backend, tried):
+                    continue
+                raise
+            self._finish(backend)
+            return result
+
+    async def arun(self, call: Callable[[Any], Awaitable[Any]]) -> Any:
+        """Async ``run``: ``call(client)`` returns an awaitable."""
+        tried: list[Backend] = []
+        while True:
+            backend = self._acquire(tried)
+            try:
+                result = await call(backend.client)
+            except BaseException as e:
+                self._finish(backend, e)
+                if self._should_retry(e, backend, tried):
+                    continue
+                raise
+            self._finish(backend)
+            return result
+
+    # ── Health checks ──────────────────────────────────────────────────────
+
+    def check_health(self, timeout: float = 2.0) -> None:
+        """Probe every backend; eject unreachable ones, readmit recovered ones."""
+        for backend in self.backends:
+            try:
+                httpx.get(f"{backend.url}/api/version", timeout=timeout).raise_for_status()
+            except httpx.HTTPError as e:
+                with self._lock:
+                    backend.failures = max(backend.failures, self.failure_threshold)
+                    self._eject_locked(backend, f"health check failed: {e!r}")
+                continue
+            with self._lock:
+                if backend.failures or backend.ejected_until:
+                    logger.info("Ollama backend %s passed its health check", backend.url)
+                backend.failures = 0
+                backend.ejected_until = 0.0
+
+    def _health_loop(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            try:
+                self.check_health()
+            except Exception:
+                logger.exception("Ollama health check failed")
+
+    def close(self) -> None:
+        """Stop the background health checks."""
+        self._closed.set()
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            now = self._timer()
+            return [
+                {
+                    "url": b.url,
+                    "outstanding": b.outstanding,
+                    "requests": b.requests,
+                    "errors": b.errors,
+                    "ejections": b.ejections,
+                    "ejected": b.ejected_until > now,
+                }
+                for b in self.backends
+            ]
+
+
+class PooledEmbeddings(Embeddings):
+    """``Embeddings`` that route each call through an ``OllamaPool``."""
+
+    def __init__(self, pool: OllamaPool):
+        self.pool = pool
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.pool.run(lambda client: client.embed_documents(texts))
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.pool.run(lambda client: client.embed_query(text))
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.pool.arun(lambda client: client.aembed_documents(texts))
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.pool.arun(lambda client: client.aembed_query(text))
@@ -0,0 +1,174 @@
+"""
+Parse Cache Module
+Stores the split chunks of a PDF on disk keyed by the file's content hash
+and the chunking parameters, so re-ingesting an unchanged file (re-uploads,
+repeated scrape downloads) skips text extraction entirely.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import uuid
+import zlib
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import pypdf
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached chunk format or the extraction logic changes.
+_FORMAT_VERSION = 1
+
+
+def file_hash(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Directory of gzip-compressed JSON-lines files, one per parsed PDF.
+
+    Each line holds one chunk's text and metadata. Entries are written to a
+    temporary file and renamed into place only once the whole PDF has been
+    parsed, so a partial parse is never served. When the directory grows
+    beyond ``max_bytes`` the least recently used entries are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, pdf_path: str, chunk_size: int, chunk_overlap: int) -> str:
+        """Cache key for a file's current contents and the chunking parameters."""
+        return (
+            f"{file_hash(pdf_path)}-{chunk_size}-{chunk_overlap}"
+            f"-pypdf{pypdf.__version__}-v{_FORMAT_VERSION}"
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.jsonl.gz"
+
+    def load(self, key: str, source: str) -> list[Document] | None:
+        """Return the cached chunks for ``key`` re-stamped with ``source``, or None."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                chunks = [self._decode(line, source) for line in f]
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, EOFError):
+            logger.warning("Discarding unreadable parse cache entry %s", path, exc_info=True)
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        return chunks
+
+    @staticmethod
+    def _decode(line: str, source: str) -> Document:
+        record = json.loads(line)
+        metadata = record["metadata"]
+        # The same bytes may arrive under another name (e.g. a re-download).
+        metadata["source"] = source
+        return Document(page_content=record["text"], metadata=metadata)
+
+    def writer(self, key: str) -> "_EntryWriter":
+        """Return a writer that stores chunks for ``key`` once committed."""
+        return _EntryWriter(self, key)
+
+    def record(self, key: str, chunks: Iterable[Document]) -> Iterator[Document]:
+        """Pass ``chunks`` through while storing them under ``key``.
+
+        Each chunk is serialized before it is yielded, so later in-place
+        normalization by the consumer does not leak into the cache. The
+        entry is published only if ``chunks`` is exhausted without error;
+        closing the generator early discards it.
+        """
+        writer = self.writer(key)
+        try:
+            for chunk in chunks:
+                writer.write([chunk])
+                yield chunk
+            writer.commit()
+        finally:
+            writer.abort()  # no-op once committed
+
+    def _prune(self) -> None:
+        entries = []
+        for path in self.directory.glob("*.jsonl.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.debug("Evicted parse cache entry %s", path.name)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+class _EntryWriter:
+    """Streams chunks into a temporary file and publishes it on ``commit``.
+
+    Chunks are gzip-compressed incrementally and appended to the temporary
+    file, which is only open while compressed bytes are written, so no file
+    handle outlives a ``write`` call.
+    """
+
+    def __init__(self, cache: ParseCache, key: str):
+        self._cache = cache
+        self._target = cache._path(key)
+        self._tmp = self._target.with_name(f".{uuid.uuid4().hex}.tmp")
+        self._compressor = None
+
+    def write(self, chunks: Iterable[Document]) -> None:
+        if self._compressor is None:
+            self._cache.directory.mkdir(parents=True, exist_ok=True)
+            self._compressor = zlib.compressobj(wbits=31)  # gzip container
+        lines = "".join(
+            json.dumps({"text": chunk.page_content, "metadata": chunk.metadata},
+                       ensure_ascii=False, default=str) + "\n"
+            for chunk in chunks
+        )
+        self._append(self._compressor.compress(lines.encode("utf-8")))
+
+    def _append(self, data: bytes) -> None:
+        if data:
+            with open(self._tmp, "ab") as f:
+                f.write(data)
+
+    def commit(self) -> None:
+        self.write(())
+        self._append(self._compressor.flush())
+        os.replace(self._tmp, self._target)
+        self._compressor = None
+        self._cache._prune()
+
+    def abort(self) -> None:
+        self._compressor = None
+        self._tmp.unlink(missing_ok=True)
+
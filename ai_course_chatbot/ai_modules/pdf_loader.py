@@ -4,50 +4,264 @@ Loads PDF files and splits them into chunks for vector storage.
 """
 
 import logging
+import multiprocessing
 import os
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
 from typing import List, Optional
 
-from langchain_community.document_loaders import PyPDFLoader
+import pypdf
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 
 from ai_course_chatbot.config import get_settings
 
+from .parse_cache import ParseCache
+
 logger = logging.getLogger(__name__)
 
 
+def _normalize_metadata(metadata: dict) -> dict:
+    """Normalize PDF info metadata the way ``PyPDFLoader`` does.
+
+    Keys lose their leading ``/`` and are lower-cased, PDF dates become ISO
+    8601, and other values become stripped strings (ints are kept).
+    """
+    normalized = {}
+    for key, value in metadata.items():
+        if type(value) not in (str, int):
+            value = str(value)
+        key = key.removeprefix("/").lower()
+        if key in ("creationdate", "moddate"):
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                pass
+        elif isinstance(value, str):
+            value = value.strip()
+        normalized[key] = value
+    return normalized
+
+
+def _parse_page_range(pdf_path: str, start: int, stop: int,
+                      chunk_size: int, chunk_overlap: int) -> List:
+    """Extract and split pages ``[start, stop)`` of one PDF (runs in a worker process).
+
+    Pages are produced the same way ``PyPDFLoader`` does in page mode, so
+    chunk text, and therefore chunk IDs, match the sequential path.
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    base_metadata = _normalize_metadata(
+        {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+        | dict(reader.metadata or {})
+        | {"source": pdf_path, "total_pages": len(reader.pages)}
+    )
+
+    pages = []
+    for page_number in range(start, min(stop, len(reader.pages))):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain").strip()
+        metadata = dict(base_metadata, page=page_number,
+                        page_label=reader.page_labels[page_number])
+        pages.append(Document(page_content=text, metadata=metadata))
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    return splitter.split_documents(pages)
+
+
+@dataclass
+class _RangeTask:
+    pdf_path: str
+    start: int
+    stop: int
+    page_count: int
+    cache_key: str | None = None
+    cached: List | None = None
+
+
 class PDFLoader:
     """Handles loading and processing PDF files."""
 
-    def __init__(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None):
+    def __init__(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None,
+                 workers: Optional[int] = None, pages_per_task: Optional[int] = None,
+                 use_cache: Optional[bool] = None, cache_dir: Optional[str] = None):
         settings = get_settings()
         self.chunk_size = chunk_size if chunk_size is not None else settings.chunk_size
         self.chunk_overlap = chunk_overlap if chunk_overlap is not None else settings.chunk_overlap
+        workers = workers if workers is not None else settings.pdf_parse_workers
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.pages_per_task = max(1, pages_per_task or settings.pdf_pages_per_task)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
             chunk_overlap=self.chunk_overlap,
             length_function=len,
         )
 
+        self.parse_cache = None
+        if use_cache if use_cache is not None else settings.parse_cache_enabled:
+            self.parse_cache = ParseCache(
+                cache_dir or settings.parse_cache_dir
+                or os.path.join(settings.chroma_persist_dir, "parse_cache"),
+                max_bytes=settings.parse_cache_max_mb * 1024 * 1024,
+            )
+        # Paths that failed during the last ``iter_chunks`` run; their
+        # chunks may be incomplete.
+        self.failed_sources: set[str] = set()
+
     def load_pdf(self, pdf_path: str) -> List:
+        return list(self._iter_file(pdf_path))
+
+    def load_and_chunk_pdfs(self, pdf_paths: List[str]) -> List:
+        return list(self.iter_chunks(pdf_paths))
+
+    def iter_chunks(self, pdf_paths: Iterable[str]) -> Iterator:
+        """Yield chunks page by page, file by file, without loading whole files.
+
+        Errors are logged per file and the file is skipped from that point
+        on; chunks it produced before the error have already been yielded,
+        so the path is added to ``failed_sources``.
+        """
+        self.failed_sources.clear()
+        if self.workers > 1:
+            if not multiprocessing.current_process().daemon:
+                yield from self._iter_parallel(pdf_paths)
+                return
+            # Celery prefork children are daemonic and may not spawn processes.
+            logger.info("Running inside a daemon process; parsing PDFs sequentially")
+
+        for pdf_path in pdf_paths:
+            try:
+                yield from self._iter_file(pdf_path)
+            except Exception as e:
+                self.failed_sources.add(pdf_path)
+                logger.error("Error loading %s: %s", pdf_path, e)
+
+    def _iter_file(self, pdf_path: str) -> Iterator:
+        """Yield one PDF's chunks from the parse cache or by parsing it."""
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-        chunks = self.text_splitter.split_documents(documents)
+        cache_key, cached = self._cache_lookup(pdf_path)
+        if cached is not None:
+            yield from cached
+            return
 
-        logger.info("Loaded %d pages from %s", len(documents), pdf_path)
-        logger.info("Split into %d chunks", len(chunks))
+        chunks = self._parse_file(pdf_path)
+        if cache_key is not None:
+            chunks = self.parse_cache.record(cache_key, chunks)
+        yield from chunks
 
-        return chunks
+    def _parse_file(self, pdf_path: str) -> Iterator:
+        pages = chunk_count = 0
+        for page in PyPDFLoader(pdf_path).lazy_load():
+            chunks = self.text_splitter.split_documents([page])
+            pages += 1
+            chunk_count += len(chunks)
+            yield from chunks
+        logger.info("Loaded %d pages from %s", pages, pdf_path)
+        logger.info("Split into %d chunks", chunk_count)
 
-    def load_and_chunk_pdfs(self, pdf_paths: List[str]) -> List:
-        all_chunks = []
+    def _cache_lookup(self, pdf_path: str):
+        """Return ``(cache_key, cached_chunks)``; both are None without a cache."""
+        if self.parse_cache is None:
+            return None, None
+        cache_key = self.parse_cache.key(pdf_path, self.chunk_size, self.chunk_overlap)
+        cached = self.parse_cache.load(cache_key, pdf_path)
+        if cached is not None:
+            logger.info("Loaded %d chunks for %s from the parse cache", len(cached), pdf_path)
+        return cache_key, cached
+
+    def _iter_parallel(self, pdf_paths: Iterable[str]) -> Iterator:
+        """Parse page ranges in a process pool and yield chunks in file/page order.
+
+        At most ``2 * workers`` ranges are in flight, so parsed-but-unconsumed
+        chunks stay bounded. A failure in any range skips the rest of that
+        file, matching the sequential path. Files found in the parse cache
+        are not sent to the pool.
+        """
+        window = 2 * self.workers
+        tasks = self._page_ranges(pdf_paths)
+        pending: deque = deque()  # (task, future)
+        failed: set[str] = set()
+        chunk_counts: dict[str, int] = {}
+        writers: dict = {}
+
+        # Spawned, not forked: the pool is created while other threads
+        # (ingestion stages, the embedding scheduler) may hold locks that a
+        # forked child would inherit in the locked state.
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            def refill() -> None:
+                for task in islice(tasks, window - len(pending)):
+                    if task.cached is not None:
+                        future: Future = Future()
+                        future.set_result(task.cached)
+                    else:
+                        future = executor.submit(_parse_page_range, task.pdf_path, task.start,
+                                                 task.stop, self.chunk_size, self.chunk_overlap)
+                    pending.append((task, future))
+
+            try:
+                refill()
+                while pending:
+                    task, future = pending.popleft()
+                    refill()
+                    if task.pdf_path in failed:
+                        future.cancel()
+                        continue
+                    try:
+                        chunks = future.result()
+                    except Exception as e:
+                        failed.add(task.pdf_path)
+                        self.failed_sources.add(task.pdf_path)
+                        logger.error("Error loading %s: %s", task.pdf_path, e)
+                        writer = writers.pop(task.pdf_path, None)
+                        if writer is not None:
+                            writer.abort()
+                        continue
+                    if task.cached is not None:
+                        yield from chunks
+                        continue
+
+                    if task.cache_key is not None:
+                        if task.pdf_path not in writers:
+                            writers[task.pdf_path] = self.parse_cache.writer(task.cache_key)
+                        writers[task.pdf_path].write(chunks)
+                    chunk_counts[task.pdf_path] = chunk_counts.get(task.pdf_path, 0) + len(chunks)
+                    yield from chunks
+                    if task.stop == task.page_count:
+                        logger.info("Loaded %d pages from %s", task.page_count, task.pdf_path)
+                        logger.info("Split into %d chunks", chunk_counts.pop(task.pdf_path))
+                        writer = writers.pop(task.pdf_path, None)
+                        if writer is not None:
+                            writer.commit()
+            finally:
+                for writer in writers.values():
+                    writer.abort()
+
+    def _page_ranges(self, pdf_paths: Iterable[str]) -> Iterator[_RangeTask]:
+        """Yield work items lazily; a cached file becomes one pre-parsed item."""
         for pdf_path in pdf_paths:
             try:
-                chunks = self.load_pdf(pdf_path)
-                all_chunks.extend(chunks)
+                if not os.path.exists(pdf_path):
+                    raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+                cache_key, cached = self._cache_lookup(pdf_path)
+                if cached is not None:
+                    yield _RangeTask(pdf_path, 0, 0, 0, cached=cached)
+                    continue
+                page_count = len(pypdf.PdfReader(pdf_path).pages)
             except Exception as e:
+                self.failed_sources.add(pdf_path)
                 logger.error("Error loading %s: %s", pdf_path, e)
-
-        return all_chunks
+                continue
+            for start in range(0, page_count, self.pages_per_task):
+                stop = min(start + self.pages_per_task, page_count)
+                yield _RangeTask(pdf_path, start, stop, page_count, cache_key)
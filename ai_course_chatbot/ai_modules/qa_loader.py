@@ -0,0 +1,55 @@
+"""
+Q/A Loader Module
+Parses curated question/answer markdown into documents. Each block has the
+form used by data/sherlock-holmes/cano.md::
+
+    **Question:** ...
+    **Answer:** ...
+    **Page:** 42
+
+The answer is kept in the metadata so the extractive fast path can return
+it verbatim when a user's question matches the stored one.
+"""
+import logging
+import re
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+_QA_PATTERN = re.compile(
+    r"\*\*Question:\*\*\s*(.*?)\n\*\*Answer:\*\*\s*(.*?)\n\*\*Page:\*\*\s*(\d+)", re.DOTALL
+)
+_BOLD = re.compile(r"\*\*(.*?)\*\*", re.DOTALL)
+
+
+def _plain(text: str) -> str:
+    return re.sub(r"\s+", " ", _BOLD.sub(r"\1", text)).strip()
+
+
+def load_qa_markdown(path: str) -> list[Document]:
+    """Return one document per Q/A block in the markdown file at ``path``.
+
+    The document text holds both question and answer (so the pair is also
+    useful as ordinary retrieval context); ``source_type`` is ``"qa"`` and
+    ``question``/``answer`` carry the plain-text fields.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    documents = []
+    for match in _QA_PATTERN.finditer(text):
+        question, answer = _plain(match.group(1)), _plain(match.group(2))
+        documents.append(Document(
+            page_content=f"Question: {question}\nAnswer: {answer}",
+            metadata={
+                "source": path,
+                "page": int(match.group(3)),
+                "source_type": "qa",
+                "question": question,
+                "answer": answer,
+            },
+        ))
+
+    logger.info("Loaded %d Q/A pairs from %s", len(documents), path)
+    return documents
@@ -3,21 +3,80 @@ RAG Chatbot Module
 Implements a Retrieval-Augmented Generation chatbot using Ollama.
 """
 
+import asyncio
+import contextlib
+import functools
 import logging
 import os
+import time
+from collections.abc import AsyncIterator, Callable
 from typing import AsyncGenerator
 
-from langchain_community.llms import Ollama
+import httpx
 from langchain_ollama import ChatOllama
-from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
 
+from .context_compressor import ContextCompressor
+from .context_packer import ContextPacker
+from .model_router import ModelRouter
+from .ollama_pool import OllamaPool, chat_backend_urls
 from .vector_store import VectorStore
 from ai_course_chatbot.config import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Returned instead of raising when an answer cannot be generated; callers
+# compare against these so failures are never cached.
+FALLBACK_ANSWER = (
+    "Unable to generate an answer. Please try rephrasing your question "
+    "or check if the vector store is properly initialized."
+)
+STREAM_FALLBACK_ANSWER = "Unable to generate an answer. Please try rephrasing your question."
+
+
+class GenerationTimeout(Exception):
+    """An answer ran past ``generation_timeout`` and was aborted.
+
+    Deliberately not a ``TimeoutError``: the host did nothing wrong, so the
+    Ollama pool must not count it as a backend failure.
+    """
+
+
+async def _within(awaitable, timeout: float | None):
+    """Await ``awaitable``, cancelling it and raising ``GenerationTimeout``
+    after ``timeout`` seconds (None for no limit).
+
+    Like ``asyncio.wait_for``, whose asyncio.TimeoutError is only the
+    builtin TimeoutError from Python 3.11 on.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        done, _ = await asyncio.wait((task,), timeout=timeout)
+    finally:
+        if not task.done():
+            task.cancel()
+            # Let the cancellation land before the caller moves on (e.g.
+            # closes the stream the task is reading).
+            await asyncio.wait((task,))
+    if not done:
+        raise GenerationTimeout("Generation exceeded its deadline")
+    return task.result()
+
+
+async def _until_deadline(stream: AsyncIterator, deadline: float | None) -> AsyncIterator:
+    """Yield from ``stream`` until ``deadline`` (``time.monotonic``, None for
+    no limit), then raise ``GenerationTimeout``; the stream is closed either
+    way."""
+    async with contextlib.aclosing(stream):
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                item = await _within(stream.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            yield item
+
 
 class RAGChatbot:
     """RAG-based chatbot using Ollama for LLM."""
@@ -25,7 +84,10 @@ class RAGChatbot:
     def __init__(self, vector_store: VectorStore,
                  model_name: str | None = None,
                  num_ctx: int | None = None,
-                 temperature: float | None = None):
+                 temperature: float | None = None,
+                 context_budget_ratio: float | None = None,
+                 fast_model_name: str | None = None,
+                 queue_depth: Callable[[], int] | None = None):
         settings = get_settings()
 
         self.vector_store = vector_store
@@ -33,13 +95,30 @@ class RAGChatbot:
         self.num_ctx = num_ctx if num_ctx is not None else settings.llm_num_ctx
         self.temperature = temperature if temperature is not None else settings.llm_temperature
         self.retriever_k = settings.retriever_k
-        self.base_url = settings.ollama_base_url
 
-        self.llm = Ollama(
-            model=self.model_name,
-            base_url=self.base_url,
-            num_ctx=self.num_ctx,
-            temperature=self.temperature,
+        self.fast_model_name = (
+            fast_model_name if fast_model_name is not None else settings.ollama_fast_model
+        ) or None
+
+        # One long-lived client per Ollama host and model, shared by every
+        # path; each call goes to the least-loaded healthy host.
+        urls = chat_backend_urls(settings)
+        models = dict.fromkeys(m for m in (self.model_name, self.fast_model_name) if m)
+        self.llm_pools = {
+            model: OllamaPool.from_settings(urls, functools.partial(self._make_llm, model=model))
+            for model in models
+        }
+        self.llm_pool = self.llm_pools[self.model_name]
+
+        # Under load, generation moves to the fast model. ``queue_depth``
+        # defaults to the generations in flight on this instance; the API
+        # passes its admission queue instead.
+        self.model_router = ModelRouter(
+            self.model_name, self.fast_model_name,
+            queue_depth=queue_depth or self._generations_in_flight,
+            queue_threshold=settings.model_routing_queue_depth,
+            p95_threshold=settings.model_routing_p95_seconds,
+            cooldown=settings.model_routing_cooldown,
         )
 
         self.prompt_template = """Use the following pieces of context to answer the question at the end.  
@@ -53,80 +132,369 @@ class RAGChatbot:
             input_variables=["context", "question"],
         )
 
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=self.vector_store.get_retriever(k=self.retriever_k),
-            return_source_documents=True,
-            chain_type_kwargs={"prompt": self.prompt},
+        self.retriever = self.vector_store.get_retriever(k=self.retriever_k)
+
+        # The prompt may use this share of the context window; retrieved
+        # chunks are packed into it in relevance order.
+        self.context_budget_ratio = (
+            context_budget_ratio if context_budget_ratio is not None
+            else settings.context_budget_ratio
+        )
+        self.context_packer = ContextPacker(
+            budget_tokens=int(self.num_ctx * self.context_budget_ratio),
+            chars_per_token=settings.context_chars_per_token,
+        )
+        # Before packing, chunks over a share of that budget are cut down to
+        # the sentences that best match the question.
+        self.context_compressor = ContextCompressor(
+            budget_tokens=(
+                settings.context_compression_tokens
+                if settings.context_compression_tokens is not None
+                else int(self.context_packer.budget_tokens * settings.context_compression_ratio)
+            ),
+            chars_per_token=settings.context_chars_per_token,
+        )
+
+        self.fast_path_enabled = settings.fast_path_enabled
+        self.fast_path_qa_threshold = settings.fast_path_qa_threshold
+        self.fast_path_chunk_threshold = settings.fast_path_chunk_threshold
+        self.batch_concurrency = settings.batch_concurrency
+        self.generation_timeout = settings.generation_timeout
+        self.generation_timeouts = 0
+
+    def _make_llm(self, base_url: str, model: str | None = None) -> ChatOllama:
+        """Chat client for one host and model.
+
+        ChatOllama owns a sync and an async httpx client sharing these pool
+        limits, so connections are reused across requests, and keep_alive
+        stops Ollama unloading the model between questions.
+        """
+        settings = get_settings()
+        return ChatOllama(
+            model=model or self.model_name,
+            base_url=base_url,
+            num_ctx=self.num_ctx,
+            temperature=self.temperature,
+            keep_alive=settings.ollama_keep_alive,
+            # Bounds the wait for each response chunk (e.g. the first token)
+            # of a sync answer; async answers are bounded by ``_within``.
+            sync_client_kwargs={"timeout": settings.generation_timeout or None},
+            client_kwargs={
+                "limits": httpx.Limits(
+                    max_connections=settings.ollama_max_connections,
+                    max_keepalive_connections=settings.ollama_keepalive_connections,
+                    keepalive_expiry=settings.ollama_keepalive_expiry,
+                ),
+            },
+        )
+
+    def _generations_in_flight(self) -> int:
+        return sum(
+            backend.outstanding for pool in self.llm_pools.values() for backend in pool.backends
         )
 
-    def ask(self, question: str, show_sources: bool = True) -> str:
+    def choose_model(self) -> str:
+        """Model the next answer should be generated with, given current load."""
+        return self.model_router.choose()
+
+    def refresh_collection(self) -> bool:
+        """Switch to a collection rebuilt by another process, if any."""
+        return self.vector_store.refresh()
+
+    def _pool_for(self, model: str) -> OllamaPool:
         try:
-            result = self.qa_chain.invoke({"query": question})
-            answer = result["result"]
-
-            if show_sources and "source_documents" in result:
-                sources = result["source_documents"]
-                if sources:
-                    answer += "\n\nSources:"
-                    seen: set[tuple[str, str]] = set()
-                    idx = 1
-                    for doc in sources:
-                        source = doc.metadata.get("source", "Unknown")
-                        page = doc.metadata.get("page", "N/A")
-                        display_source = os.path.splitext(os.path.basename(source))[0]
-                        key = (display_source, str(page))
-                        if key in seen:
-                            continue
-                        seen.add(key)
-                        answer += f"\n{idx}. {display_source} (Page {page})"
-                        idx += 1
+            return self.llm_pools[model]
+        except KeyError:
+            raise ValueError(f"Model {model!r} is not configured for this chatbot") from None
+
+    def _extractive_answer(self, question: str, docs, show_sources: bool) -> str | None:
+        """Turn the best-scoring retrieved chunk into an answer, or return None."""
+        scored = [doc for doc in docs if "score" in doc.metadata]
+        if not scored:
+            return None
+        doc = max(scored, key=lambda d: d.metadata["score"])
+        score = doc.metadata["score"]
+        if doc.metadata.get("source_type") == "qa" and doc.metadata.get("answer"):
+            if score < self.fast_path_qa_threshold:
+                return None
+            answer = doc.metadata["answer"]
+        elif score >= self.fast_path_chunk_threshold:
+            # The sentences answering the question, not the whole chunk.
+            answer = self.context_compressor.best_sentences(question, doc.page_content)
+            if answer is None:
+                return None
+        else:
+            return None
+        logger.debug("Fast path answer (similarity %.3f) from %s",
+                     score, doc.metadata.get("source"))
+        if show_sources:
+            answer += self._format_sources([doc])
+        return answer
+
+    def fast_answer(self, question: str, docs, show_sources: bool = True) -> str | None:
+        """Return a stored answer when the retrieved ``docs`` are confident, else None.
+
+        Uses the similarity scores retrieval put on ``docs``, so no extra
+        lookup is made. Never raises: any failure just means the LLM path
+        is taken.
+        """
+        if not self.fast_path_enabled or not docs:
+            return None
+        try:
+            return self._extractive_answer(question, docs, show_sources)
+        except Exception:
+            logger.warning("Fast path lookup failed", exc_info=True)
+            return None
+
+    async def aretrieve(self, question: str) -> list | None:
+        """Retrieve the chunks for ``question``, or None if retrieval failed.
+
+        The result serves both ``fast_answer`` and generation (``aask`` and
+        ``ask_stream`` take it as ``docs``); with None they retrieve again
+        and fall back to the error answer if that fails too.
+        """
+        try:
+            return await self.retriever.ainvoke(question)
+        except Exception:
+            logger.warning("Retrieval failed", exc_info=True)
+            return None
+
+    def _build_prompt(self, question: str, docs) -> tuple[str, list]:
+        """Format the prompt for ``question`` within the context budget.
+
+        Returns the prompt and the chunks that made it into the context
+        (compressed to their best sentences, possibly truncated), which are
+        the ones to cite as sources.
+        """
+        overhead = self.context_packer.estimate_tokens(
+            self.prompt.format(context="", question=question)
+        )
+        docs = self.context_compressor.compress(question, docs, reserved_tokens=overhead)
+        packed = self.context_packer.pack(docs, reserved_tokens=overhead)
+        return self.prompt.format(context=packed.text, question=question), packed.documents
+
+    def ask(self, question: str, show_sources: bool = True, model: str | None = None,
+            fast_path: bool = True, docs: list | None = None) -> str:
+        """Answer ``question``; ``model`` defaults to ``choose_model()``.
+
+        With ``fast_path`` a stored answer is returned without generation
+        when retrieval is confident enough (see ``fast_answer``). ``docs``
+        are chunks already retrieved for ``question``.
+        """
+        try:
+            if docs is None:
+                docs = self.retriever.invoke(question)
+            if fast_path:
+                answer = self.fast_answer(question, docs, show_sources)
+                if answer is not None:
+                    return answer
+            model = model or self.choose_model()
+            prompt, docs = self._build_prompt(question, docs)
+            messages = [HumanMessage(content=prompt)]
+            started = time.perf_counter()
+            deadline = (
+                time.monotonic() + self.generation_timeout if self.generation_timeout else None
+            )
+            answer = self._pool_for(model).run(
+                lambda llm: self._invoke_until(llm, messages, deadline)
+            )
+            self.model_router.record(model, time.perf_counter() - started)
+            if show_sources:
+                answer += self._format_sources(docs)
             return answer
-        except Exception as e:
-            logger.exception("Error generating answer: %s", e)
-            return "Unable to generate an answer. Please try rephrasing your question or check if the vector store is properly initialized."
+        except GenerationTimeout:
+            self.generation_timeouts += 1
+            logger.warning("No answer from %s within %.0fs", model, self.generation_timeout)
+            return FALLBACK_ANSWER
+        except Exception:
+            logger.exception("Error generating answer")
+            return FALLBACK_ANSWER
 
-    async def ask_stream(self, question: str, show_sources: bool = True) -> AsyncGenerator[str, None]:
-        """Async generator that streams tokens from the LLM."""
+    @staticmethod
+    def _invoke_until(llm: ChatOllama, messages, deadline: float | None) -> str:
+        """``llm.invoke`` that raises ``GenerationTimeout`` past ``deadline``.
+
+        The answer is streamed so the deadline is checked between chunks;
+        the sync client's timeout bounds the wait for any one chunk.
+        """
+        parts = []
         try:
-            retriever = self.vector_store.get_retriever(k=self.retriever_k)
-            docs = retriever.invoke(question)
+            with contextlib.closing(llm.stream(messages)) as chunks:
+                for chunk in chunks:
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise GenerationTimeout("Generation exceeded its deadline")
+                    parts.append(chunk.content)
+        except httpx.TimeoutException:
+            raise GenerationTimeout("Generation exceeded its deadline") from None
+        return "".join(parts)
 
-            context = "\n\n".join(doc.page_content for doc in docs)
-            formatted_prompt = self.prompt.format(context=context, question=question)
+    async def aask(self, question: str, show_sources: bool = True,
+                   model: str | None = None, fast_path: bool = True,
+                   docs: list | None = None) -> str:
+        """Async ``ask``: retrieval and generation are awaited, so a pending
+        answer holds no thread while Ollama generates.
+        """
+        try:
+            if docs is None:
+                docs = await self.retriever.ainvoke(question)
+            if fast_path:
+                answer = self.fast_answer(question, docs, show_sources)
+                if answer is not None:
+                    return answer
+            model = model or self.choose_model()
+            return await self._agenerate(question, docs, show_sources, model)
+        except GenerationTimeout as e:
+            logger.warning("%s", e)
+            return FALLBACK_ANSWER
+        except Exception:
+            logger.exception("Error generating answer")
+            return FALLBACK_ANSWER
 
-            chat_llm = ChatOllama(
-                model=self.model_name,
-                base_url=self.base_url,
-                num_ctx=self.num_ctx,
-                temperature=self.temperature,
+    async def _agenerate(self, question: str, docs, show_sources: bool, model: str) -> str:
+        """Generate the answer to ``question`` from retrieved ``docs``."""
+        prompt, docs = self._build_prompt(question, docs)
+        messages = [HumanMessage(content=prompt)]
+        started = time.perf_counter()
+        pool = self._pool_for(model)
+        try:
+            result = await _within(
+                pool.arun(lambda llm: llm.ainvoke(messages)), self.generation_timeout or None
             )
+        except GenerationTimeout:
+            self.generation_timeouts += 1
+            raise GenerationTimeout(
+                f"No answer from {model} within {self.generation_timeout:.0f}s"
+            ) from None
+        answer = result.content
+        self.model_router.record(model, time.perf_counter() - started)
+        if show_sources:
+            answer += self._format_sources(docs)
+        return answer
 
-            async for chunk in chat_llm.astream([HumanMessage(content=formatted_prompt)]):
-                token = chunk.content
-                if token:
-                    yield token
+    async def ask_many(
+        self, questions: list[str], show_sources: bool = True,
+        concurrency: int | None = None,
+        gate: Callable[[], contextlib.AbstractAsyncContextManager] | None = None,
+    ) -> AsyncIterator[tuple[int, str, str | None]]:
+        """Answer several questions, yielding ``(index, answer, model)`` as
+        each one completes (``model`` is None for fast-path answers).
+
+        All questions are embedded in one batched call and retrieved
+        together; at most ``concurrency`` generations (``batch_concurrency``
+        by default) run at once, each inside ``gate()`` if given, e.g. an
+        admission slot. A failed question yields ``FALLBACK_ANSWER``.
+        """
+        if not questions:
+            return
+        try:
+            retrieved = await self.vector_store.asearch_many(questions, k=self.retriever_k)
+        except Exception:
+            logger.exception("Batch retrieval failed")
+            for index in range(len(questions)):
+                yield index, FALLBACK_ANSWER, None
+            return
+
+        limit = asyncio.Semaphore(max(1, concurrency or self.batch_concurrency))
+        gate = gate or contextlib.nullcontext
+
+        async def answer(index: int) -> tuple[int, str, str | None]:
+            question = questions[index]
+            try:
+                fast = self.fast_answer(question, retrieved[index], show_sources)
+                if fast is not None:
+                    return index, fast, None
+                async with limit, gate():
+                    model = self.choose_model()
+                    return index, await self._agenerate(
+                        question, retrieved[index], show_sources, model
+                    ), model
+            except Exception:
+                logger.exception("Error generating batch answer")
+                return index, FALLBACK_ANSWER, None
+
+        tasks = [asyncio.ensure_future(answer(index)) for index in range(len(questions))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer went away (e.g. a closed stream): stop the rest.
+            for task in tasks:
+                task.cancel()
+
+    async def aembed_query(self, question: str) -> list[float]:
+        """Embed ``question`` through the store's query-embedding cache.
+
+        Retrieval for the same question then reuses this vector instead of
+        calling Ollama again.
+        """
+        return await self.vector_store.embeddings.aembed_query(question)
+
+    @staticmethod
+    def _format_sources(docs) -> str:
+        """Return the numbered "Sources:" suffix for ``docs`` (empty if none)."""
+        if not docs:
+            return ""
+        sources_text = "\n\nSources:"
+        seen: set[tuple[str, str]] = set()
+        idx = 1
+        for doc in docs:
+            source = doc.metadata.get("source", "Unknown")
+            page = doc.metadata.get("page", "N/A")
+            display_source = os.path.splitext(os.path.basename(source))[0]
+            key = (display_source, str(page))
+            if key in seen:
+                continue
+            seen.add(key)
+            sources_text += f"\n{idx}. {display_source} (Page {page})"
+            idx += 1
+        return sources_text
+
+    async def ask_stream(self, question: str, show_sources: bool = True,
+                         model: str | None = None, fast_path: bool = True,
+                         docs: list | None = None) -> AsyncGenerator[str, None]:
+        """Async generator that streams tokens from the LLM (or, on the fast
+        path, yields the stored answer in one piece)."""
+        try:
+            if docs is None:
+                # Awaited so other streams keep flushing tokens while this
+                # question is embedded and searched.
+                docs = await self.retriever.ainvoke(question)
+            if fast_path:
+                answer = self.fast_answer(question, docs, show_sources)
+                if answer is not None:
+                    yield answer
+                    return
+            model = model or self.choose_model()
+
+            formatted_prompt, docs = self._build_prompt(question, docs)
+
+            # Tokens already sent cannot be replayed, so a stream stays on
+            # the host it started on (failures still count towards ejection).
+            messages = [HumanMessage(content=formatted_prompt)]
+            started = time.perf_counter()
+            deadline = (
+                time.monotonic() + self.generation_timeout if self.generation_timeout else None
+            )
+            with self._pool_for(model).lease() as backend:
+                async for chunk in _until_deadline(backend.client.astream(messages), deadline):
+                    token = chunk.content
+                    if token:
+                        yield token
+            self.model_router.record(model, time.perf_counter() - started)
 
             if show_sources and docs:
-                sources_text = "\n\nSources:"
-                seen: set[tuple[str, str]] = set()
-                idx = 1
-                for doc in docs:
-                    source = doc.metadata.get("source", "Unknown")
-                    page = doc.metadata.get("page", "N/A")
-                    display_source = os.path.splitext(os.path.basename(source))[0]
-                    key = (display_source, str(page))
-                    if key in seen:
-                        continue
-                    seen.add(key)
-                    sources_text += f"\n{idx}. {display_source} (Page {page})"
-                    idx += 1
-                yield sources_text
-
-        except Exception as e:
-            logger.exception("Error during streaming answer: %s", e)
-            yield "Unable to generate an answer. Please try rephrasing your question."
+                yield self._format_sources(docs)
+
+        except GenerationTimeout:
+            # Tokens were already sent, so this ends the stream with an
+            # error rather than appending a fallback to a partial answer.
+            self.generation_timeouts += 1
+            logger.warning("Stopped a streaming answer after %.0fs (model %s)",
+                           self.generation_timeout, model)
+            raise
+        except Exception:
+            logger.exception("Error during streaming answer")
+            yield STREAM_FALLBACK_ANSWER
 
     def chat(self) -> None:
         logger.info("Starting interactive chat session (Model: %s)", self.model_name)
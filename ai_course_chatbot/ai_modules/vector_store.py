@@ -1,121 +1,634 @@
 ﻿"""
 Vector Store Module
-Manages document embeddings and vector storage using ChromaDB.
+Manages document embeddings and vector storage using ChromaDB (or the
+in-process NumPy flat index), with an optional BM25 index for hybrid
+(lexical + dense) retrieval.
 """
+import asyncio
 import os
-import hashlib
 import logging
+import shutil
+import threading
 import time
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import numpy as np
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
-
-from typing import List, Tuple
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any, List, Tuple
 from pathlib import Path
 
 from ai_course_chatbot.config import get_settings
 
+from .bm25_index import BM25Index
+from .collection_alias import CollectionAlias
+from .embedding_cache import CachedEmbeddings, EmbeddingCache, content_hash
+from .embedding_scheduler import EmbeddingBatchScheduler
+from .flat_index import FlatIndex
+from .ingest_pipeline import prefetch
+from .ollama_pool import OllamaPool, PooledEmbeddings, embedding_backend_urls
+
 os.environ.setdefault("LANGCHAIN_TELEMETRY", "false")
 os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
 
 logger = logging.getLogger(__name__)
 
+# Shared by all stores: dense and lexical searches for one query run side by side.
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+# Chunk IDs checked against the store per lookup during ingestion.
+_DEDUP_BATCH = 256
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked ID lists; each list contributes ``1 / (k + rank)`` per ID.
+
+    RRF only looks at ranks, so BM25 scores and vector distances never have
+    to be calibrated against each other.
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def chroma_similarity(distance: float, space: str) -> float:
+    """Cosine similarity from a Chroma distance in the collection's ``space``.
+
+    ``cosine`` and ``ip`` distances are one minus the similarity. ``l2`` (the
+    default for collections created before the store chose ``cosine``) is
+    the squared Euclidean distance, ``2 - 2 cos`` for the unit-length
+    vectors Ollama's embed endpoint returns.
+    """
+    if space == "l2":
+        return 1.0 - distance / 2.0
+    return 1.0 - distance
+
+
+def select_by_score(hits: List[Tuple[Document, float]], min_k: int = 1, max_k: int = 6,
+                    min_score: float = 0.0, relative: float = 0.0) -> List[Document]:
+    """Keep ranked hits whose score reaches ``min_score`` and ``relative``
+    times the best score, but at least ``min_k`` and at most ``max_k``.
+
+    A sharp question has one or two hits well above the rest and gets a
+    short context; a vague one has a flat score curve and gets more chunks.
+    """
+    if not hits:
+        return []
+    best = max(score for _, score in hits)
+    floor = max(min_score, best * relative)
+    kept = [doc for rank, (doc, score) in enumerate(hits) if rank < min_k or score >= floor]
+    return kept[:max_k]
+
+
+@dataclass
+class IngestReport:
+    """Chunk counts for one ``add_documents`` call.
+
+    ``kept`` chunks were already stored under the same ID and were not
+    re-embedded; ``deleted`` chunks belonged to a replaced source but are
+    no longer produced by it.
+    """
+
+    added: int = 0
+    kept: int = 0
+    deleted: int = 0
+    failed: int = 0
+
+
+class StoreRetriever(BaseRetriever):
+    """LangChain retriever that delegates to ``VectorStore.search``."""
+
+    store: Any
+    k: int = 2
+    adaptive: bool = False  # score-based k (``VectorStore.search_adaptive``)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.adaptive:
+            return self.store.search_adaptive(query)
+        return self.store.search(query, k=self.k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.adaptive:
+            return await self.store.asearch_adaptive(query)
+        return await self.store.asearch(query, k=self.k)
+
 
 class VectorStore:
-    """Manages vector storage for document embeddings."""
+    """Manages vector storage for document embeddings.
+
+    ``collection_name`` is an alias: the physical collection is looked up in
+    the alias file (see ``CollectionAlias``) and re-checked before every
+    search, so a ``rebuild()`` in another process is picked up without
+    restarting. Pass ``resolve_alias=False`` to open a physical collection
+    directly. ``on_swap`` is called after the store switches collections,
+    e.g. to drop answers cached from the old one.
+    """
 
     def __init__(self, collection_name: str | None = None,
                  persist_directory: str | None = None,
                  embedding_model: str | None = None,
                  normalize_lower: bool = False,
-                 default_lang: str = "en"):
+                 default_lang: str = "en",
+                 backend: str | None = None,
+                 embeddings: Embeddings | None = None,
+                 resolve_alias: bool = True,
+                 on_swap: Callable[[], None] | None = None):
         settings = get_settings()
 
-        self.collection_name = collection_name or settings.chroma_collection
+        self.alias = collection_name or settings.chroma_collection
         self.persist_directory = persist_directory or settings.chroma_persist_dir
         self.embedding_model = embedding_model or settings.embedding_model
         self.embedding_model_version = self.embedding_model
         self.normalize_lower = normalize_lower
         self.default_lang = default_lang
+        self.backend = backend or settings.vector_backend
 
         Path(self.persist_directory).mkdir(parents=True, exist_ok=True)
 
-        embeddings = OllamaEmbeddings(model=self.embedding_model)
+        if self.backend not in ("chroma", "flat"):
+            raise ValueError(f"Unknown vector backend: {self.backend!r} (expected 'chroma' or 'flat')")
+
+        if embeddings is not None:
+            # Shared with another store (e.g. a shadow collection being rebuilt).
+            self.embeddings = embeddings
+            self.embedding_cache = getattr(embeddings, "cache", None)
+        else:
+            self.embedding_cache = None
+            if settings.embedding_cache_enabled:
+                cache_path = settings.embedding_cache_path or os.path.join(
+                    self.persist_directory, "embedding_cache.sqlite"
+                )
+                self.embedding_cache = EmbeddingCache(
+                    cache_path, max_entries=settings.embedding_cache_max_entries
+                )
 
-        self.vectorstore = Chroma(
-            collection_name=self.collection_name,
-            embedding_function=embeddings,
-            persist_directory=self.persist_directory
+            self.embeddings = CachedEmbeddings(
+                PooledEmbeddings(OllamaPool.from_settings(
+                    embedding_backend_urls(settings),
+                    lambda url: OllamaEmbeddings(model=self.embedding_model, base_url=url),
+                )),
+                model=self.embedding_model_version,
+                cache=self.embedding_cache,
+                query_cache_size=settings.query_embedding_cache_size,
+            )
+
+        self.hybrid_enabled = settings.hybrid_search_enabled
+        self.hybrid_candidates = settings.hybrid_candidates
+        self.rrf_k = settings.hybrid_rrf_k
+        self.adaptive_k = settings.retriever_adaptive_k
+        self.min_k = settings.retriever_min_k
+        self.max_k = settings.retriever_max_k
+        self.score_threshold = settings.retriever_score_threshold
+        self.relative_score = settings.retriever_relative_score
+        self._lexical_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._lexical_sync_lock = threading.Lock()
+        self._lexical_sync_thread: threading.Thread | None = None
+        self._lexical_retry_at = 0.0
+        self._on_swap = on_swap
+
+        self._alias = CollectionAlias(self.persist_directory, self.alias) if resolve_alias else None
+        self.collection_name = self._alias.resolve() if self._alias else self.alias
+        self.vectorstore, self.lexical_index = self._open_collection(self.collection_name)
+        self._lexical_synced = False
+
+    def _open_collection(self, name: str):
+        """Open the vector backend and BM25 index of a physical collection."""
+        settings = get_settings()
+        if self.backend == "chroma":
+            vectorstore = Chroma(
+                collection_name=name,
+                embedding_function=self.embeddings,
+                persist_directory=self.persist_directory,
+                # Applies to new collections; existing ones keep their space.
+                collection_configuration={"hnsw": {"space": "cosine"}},
+            )
+        else:
+            vectorstore = FlatIndex(
+                self._flat_path(name),
+                embedding_function=self.embeddings,
+                quantization=settings.flat_quantization,
+                rerank_factor=settings.flat_rerank_factor,
+            )
+
+        lexical_index = None
+        if self.hybrid_enabled:
+            lexical_index = BM25Index(self._bm25_path(name))
+        return vectorstore, lexical_index
+
+    def _flat_path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, f"{name}.flat")
+
+    def _bm25_path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, f"{name}.bm25.sqlite")
+
+    def refresh(self) -> bool:
+        """Switch to the collection the alias points at; return True if it changed."""
+        if self._alias is None:
+            return False
+        target = self._alias.resolve()
+        if target == self.collection_name:
+            return False
+        with self._swap_lock:
+            if target == self.collection_name:
+                return False
+            vectorstore, lexical_index = self._open_collection(target)
+            # Searches already running keep the objects they hold; the old
+            # collection is retained as the alias's previous generation.
+            with self._lexical_lock:
+                self.vectorstore, self.lexical_index = vectorstore, lexical_index
+                self.collection_name = target
+                self._lexical_synced = False
+        logger.info("Switched collection alias %s to %s", self.alias, target)
+        if self._on_swap is not None:
+            self._on_swap()
+        return True
+
+    def rebuild(self, documents: List) -> IngestReport:
+        """Re-ingest ``documents`` into a shadow collection and swap it in.
+
+        The serving collection stays untouched until the shadow holds every
+        document; the alias is then repointed atomically. The replaced
+        collection is kept for rollback and the one before it survives one
+        more swap, so other processes still searching it can switch over
+        first; the generation before that is dropped.
+        """
+        if self._alias is None:
+            raise RuntimeError("rebuild() requires a store opened through its collection alias")
+
+        shadow_name = self._alias.new_collection_name()
+        shadow = self._physical_store(shadow_name)
+        logger.info("Rebuilding collection %s into %s", self.alias, shadow_name)
+        try:
+            report = shadow.add_documents(documents)
+            count = shadow.document_count()
+            if report.failed or not count or count != report.added + report.kept:
+                raise RuntimeError(
+                    f"Shadow collection {shadow_name} failed validation: {count} stored, "
+                    f"{report.added} added, {report.kept} kept, {report.failed} failed"
+                )
+        except Exception:
+            shadow.drop()
+            raise
+
+        retired = self._alias.swap(shadow_name)
+        self.refresh()
+        if retired:
+            self._physical_store(retired).drop()
+        return report
+
+    def _physical_store(self, name: str) -> "VectorStore":
+        return VectorStore(
+            collection_name=name,
+            persist_directory=self.persist_directory,
+            embedding_model=self.embedding_model,
+            normalize_lower=self.normalize_lower,
+            default_lang=self.default_lang,
+            backend=self.backend,
+            embeddings=self.embeddings,
+            resolve_alias=False,
         )
 
-    def add_documents(self, documents: List) -> None:
-        if not documents:
+    def drop(self) -> None:
+        """Delete this physical collection and its BM25 index from disk."""
+        name = self.collection_name
+        if isinstance(self.vectorstore, FlatIndex):
+            shutil.rmtree(self._flat_path(name), ignore_errors=True)
+        else:
+            self.vectorstore.delete_collection()
+        if self.lexical_index is not None:
+            self.lexical_index.close()
+            for suffix in ("", "-wal", "-shm"):
+                Path(self._bm25_path(name) + suffix).unlink(missing_ok=True)
+        logger.info("Dropped collection %s", name)
+
+    def add_documents(self, documents: Iterable, replace_sources: bool = False,
+                      keep_sources: Iterable[str] = ()) -> IngestReport:
+        """Embed and store documents whose deterministic ID is not stored yet.
+
+        ``documents`` may be any iterable, including a generator that is
+        still parsing PDFs. Parsing, normalization/hashing, the stored-ID
+        check and embedding run as overlapping stages connected by bounded
+        queues (``INGEST_QUEUE_SIZE``), so memory depends on the queue and
+        batch sizes rather than on the size of the corpus.
+
+        With ``replace_sources`` the documents are treated as the complete,
+        current chunk set of every source they mention: stored chunks of
+        those sources that are not in the incoming set are deleted once the
+        new chunks have been added, so an overwritten PDF does not leave its
+        old text behind. Sources listed in ``keep_sources`` (e.g. the
+        loader's ``failed_sources``, which is read only after ``documents``
+        is exhausted) delivered an incomplete chunk set, so their stored
+        chunks are never deleted.
+        """
+        ingest = IngestReport()
+        self.sync_lexical_index()
+
+        queue_size = get_settings().ingest_queue_size
+        seen_ids: set[str] = set()
+        sources: set[Tuple[str, str]] = set()
+        parsed = prefetch(documents, queue_size, name="ingest-parse")
+        prepared = prefetch(self._prepare_documents(parsed), queue_size, name="ingest-normalize")
+        fresh = prefetch(
+            self._new_documents(prepared, seen_ids, sources, ingest), queue_size, name="ingest-dedup"
+        )
+
+        scheduler = EmbeddingBatchScheduler.from_settings()
+        report = scheduler.run(fresh, self._add_batch)
+
+        if not seen_ids:
             logger.warning("Empty document list provided, no documents will be added")
-            return
+            return ingest
 
-        normalized_docs, candidate_ids = self._prepare_documents(documents)
+        logger.info(
+            "Embedded %d documents in %.2f seconds (%.1f docs/sec, %d retries, final batch size %d)",
+            report.processed, report.elapsed, report.docs_per_second,
+            report.retries, report.final_batch_size,
+        )
 
-        existing_ids = self._get_existing_ids(candidate_ids)
-        filtered_docs = []
-        filtered_ids = []
-        skipped = 0
-        seen_ids = set()
+        self._persist_vectorstore()
 
-        for doc_id, doc in zip(candidate_ids, normalized_docs):
-            if doc_id in existing_ids or doc_id in seen_ids:
-                skipped += 1
+        if ingest.kept:
+            logger.info("Skipped %d duplicate documents based on deterministic IDs.", ingest.kept)
+        if not report.processed and not report.failed:
+            logger.info("All provided documents already exist in the vector store; nothing to add.")
+        else:
+            logger.info("Added %d new documents to vector store", report.processed)
+        if self.embedding_cache is not None:
+            stats = self.embedding_cache.stats()
+            logger.info(
+                "Embedding cache: %d hits, %d misses, %d entries",
+                stats["hits"], stats["misses"], stats["entries"],
+            )
+
+        stale_ids: List[str] = []
+        if replace_sources:
+            incomplete = {self._normalize_source(source) for source in keep_sources}
+            kept_sources = {source for source, _ in sources} & incomplete
+            if kept_sources:
+                logger.warning("Keeping stored chunks of partially loaded sources: %s",
+                               ", ".join(sorted(kept_sources)))
+            stale_ids = self._find_stale_ids(
+                {(source, kind) for source, kind in sources if source not in incomplete}, seen_ids
+            )
+
+        ingest.added = report.processed
+        ingest.failed = report.failed
+        if report.failed:
+            logger.error("Failed to add %d documents after retries", report.failed)
+            if stale_ids:
+                # The replaced sources are only partially re-embedded; keep
+                # their old chunks so a re-run can finish the replacement.
+                logger.warning("Keeping %d stale chunks until ingestion succeeds", len(stale_ids))
+            if not report.processed:
+                raise RuntimeError(f"Failed to add all {report.failed} documents to the vector store")
+        else:
+            ingest.deleted = self.delete_documents(stale_ids)
+
+        self._log_ingest_report(ingest)
+        return ingest
+
+    def _new_documents(self, prepared: Iterable[Tuple[Any, str]], seen_ids: set,
+                       sources: set, ingest: IngestReport) -> Iterator[Tuple[Any, str]]:
+        """Yield ``(document, id)`` pairs that are neither repeated nor already stored.
+
+        Stored IDs are looked up one batch at a time; ``seen_ids``,
+        ``sources`` and ``ingest.kept`` are filled in as a side effect.
+        """
+        batch: List[Tuple[Any, str]] = []
+        for doc, doc_id in prepared:
+            if doc_id in seen_ids:
                 continue
             seen_ids.add(doc_id)
-            filtered_ids.append(doc_id)
-            filtered_docs.append(doc)
-
-        if not filtered_docs:
-            logger.info("All provided documents already exist in the vector store; nothing to add.")
-            return
-
-        batch_size = 128
-        batches = [
-            (filtered_docs[i: i + batch_size], filtered_ids[i: i + batch_size])
-            for i in range(0, len(filtered_docs), batch_size)
-        ]
-
-        processed = 0
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            futures = {}
-            for idx, (batch_docs, batch_ids) in enumerate(batches):
-                future = executor.submit(self._add_batch, batch_docs, batch_ids)
-                futures[future] = (idx, len(batch_docs))
-
-            for future in as_completed(futures):
-                idx, count = futures[future]
-                elapsed = future.result()
-                processed += count
-                logger.info(
-                    "Processed %d / %d documents; in %.2f seconds",
-                    processed, len(documents), elapsed,
-                )
-
+            sources.add((doc.metadata.get("source", "unknown"), doc.metadata.get("source_type", "pdf")))
+            batch.append((doc, doc_id))
+            if len(batch) >= _DEDUP_BATCH:
+                yield from self._drop_existing(batch, ingest)
+                batch = []
+        yield from self._drop_existing(batch, ingest)
+
+    def _drop_existing(self, batch: List[Tuple[Any, str]], ingest: IngestReport) -> List[Tuple[Any, str]]:
+        if not batch:
+            return []
+        existing_ids = self._get_existing_ids([doc_id for _, doc_id in batch])
+        ingest.kept += len(existing_ids)
+        return [(doc, doc_id) for doc, doc_id in batch if doc_id not in existing_ids]
+
+    def delete_documents(self, ids: List[str]) -> int:
+        """Remove chunks from the vector store and the BM25 index by ID."""
+        if not ids:
+            return 0
+        for start in range(0, len(ids), 1000):
+            batch = ids[start: start + 1000]
+            self.vectorstore.delete(ids=batch)
+            if self.lexical_index is not None:
+                self.lexical_index.delete(batch)
         self._persist_vectorstore()
-
-        if skipped:
-            logger.info("Skipped %d duplicate documents based on deterministic IDs.", skipped)
-        logger.info("Added %d new documents to vector store", len(filtered_docs))
+        logger.info("Deleted %d documents from vector store", len(ids))
+        return len(ids)
+
+    def _find_stale_ids(self, sources: Iterable[Tuple[str, str]], incoming: set) -> List[str]:
+        """Return stored IDs of ``(source, source_type)`` pairs that are not in
+        ``incoming``.
+
+        The type is part of the key because sources are file stems: Q/A pairs
+        from ``cano.md`` and chunks of ``cano.pdf`` are both ``cano``.
+        """
+        stale: List[str] = []
+        for source, source_type in sorted(sources):
+            where = {"$and": [{"source": source}, {"source_type": source_type}]}
+            stored = self.vectorstore.get(where=where, include=[]).get("ids", [])
+            stale.extend(doc_id for doc_id in stored if doc_id not in incoming)
+        return stale
+
+    @staticmethod
+    def _log_ingest_report(ingest: IngestReport) -> None:
+        logger.info(
+            "Ingestion finished: %d added, %d kept, %d deleted, %d failed",
+            ingest.added, ingest.kept, ingest.deleted, ingest.failed,
+        )
 
     def _add_batch(self, batch_docs: List, batch_ids: List[str]) -> float:
         start = time.time()
         self.vectorstore.add_documents(batch_docs, ids=batch_ids)
+        if self.lexical_index is not None:
+            self.lexical_index.add(batch_ids, [doc.page_content for doc in batch_docs])
         return time.time() - start
 
     def similarity_search(self, query: str, k: int = 4) -> List:
+        self.refresh()
         results = self.vectorstore.similarity_search(query, k=k)
         return results
 
+    def search(self, query: str, k: int = 2, embedding: List[float] | None = None) -> List:
+        """Return the ``k`` most relevant chunks for ``query``.
+
+        With hybrid search enabled, dense and BM25 candidates are fetched in
+        parallel and merged with reciprocal-rank fusion; otherwise this is a
+        plain dense similarity search. ``embedding`` is the query vector if
+        the caller already has it. The chunks are copies carrying their
+        cosine similarity to the query as ``metadata["score"]``.
+        """
+        return [doc for doc, _ in self.search_with_scores(query, k, embedding)]
+
+    async def asearch(self, query: str, k: int = 2) -> List:
+        """Async ``search``: the query is embedded with the async Ollama client,
+        and only the (millisecond) index lookups run in a worker thread.
+        """
+        embedding = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self.search, query, k, embedding)
+
+    def search_with_scores(self, query: str, k: int = 2,
+                           embedding: List[float] | None = None) -> List[Tuple[Document, float]]:
+        """``search`` plus each hit's cosine similarity to the query.
+
+        The order is the fused ranking. Dense hits are scored by the dense
+        query itself; lexical-only hits, which are fetched by ID anyway,
+        are scored from the vectors fetched with them.
+        """
+        self.refresh()
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+        lexical_index = self.lexical_index
+        if lexical_index is None:
+            return self._with_scores(self._scored_dense_search(embedding, k))
+        if not self._lexical_synced:
+            # Dense-only until the BM25 backfill has caught up; it runs in
+            # the background, never on the request path.
+            self.start_lexical_sync()
+            return self._with_scores(self._scored_dense_search(embedding, k))
+
+        pool = max(k, self.hybrid_candidates)
+        dense_future = _search_executor.submit(self._scored_dense_search, embedding, pool)
+        lexical_future = _search_executor.submit(lexical_index.search, query, pool)
+
+        dense_hits = dense_future.result()
+        try:
+            lexical_hits = lexical_future.result()
+        except Exception:
+            logger.warning("Lexical search failed; falling back to dense results", exc_info=True)
+            lexical_hits = []
+
+        by_id = {doc.id: (doc, score) for doc, score in dense_hits if doc.id}
+        fused = reciprocal_rank_fusion(
+            [list(by_id), [doc_id for doc_id, _ in lexical_hits]], k=self.rrf_k,
+        )[:k]
+
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if missing:
+            by_id.update(self._scored_by_ids(missing, embedding))
+        return self._with_scores([by_id[doc_id] for doc_id, _ in fused if doc_id in by_id])
+
+    @staticmethod
+    def _with_scores(hits: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """Copy each hit with its score as ``metadata["score"]`` for the chain."""
+        return [
+            (Document(page_content=doc.page_content,
+                      metadata={**doc.metadata, "score": round(score, 4)}, id=doc.id), score)
+            for doc, score in hits
+        ]
+
+    def _scored_by_ids(self, ids: List[str], embedding: List[float]) -> dict:
+        """Fetch chunks by ID, scored by cosine similarity to ``embedding``."""
+        stored = self.vectorstore.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        if not len(stored["ids"]):
+            return {}
+        query = np.asarray(embedding, dtype=np.float32)
+        vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * float(np.linalg.norm(query))
+        scores = (vectors @ query) / np.maximum(norms, 1e-12)
+        return {
+            doc_id: (Document(page_content=text or "", metadata=metadata or {}, id=doc_id),
+                     float(score))
+            for doc_id, text, metadata, score in zip(
+                stored["ids"], stored["documents"], stored["metadatas"], scores
+            )
+        }
+
+    def search_adaptive(self, query: str, embedding: List[float] | None = None) -> List:
+        """Return between ``retriever_min_k`` and ``retriever_max_k`` chunks,
+        keeping those above the absolute and relative score cutoffs."""
+        hits = self.search_with_scores(query, max(self.max_k * 2, self.min_k), embedding)
+        docs = select_by_score(hits, self.min_k, self.max_k,
+                               self.score_threshold, self.relative_score)
+        logger.debug("Adaptive k kept %d of %d candidates", len(docs), len(hits))
+        return docs
+
+    async def asearch_adaptive(self, query: str) -> List:
+        """Async ``search_adaptive`` (async query embedding, lookup in a thread)."""
+        embedding = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self.search_adaptive, query, embedding)
+
+    def search_many(self, queries: List[str], k: int = 2,
+                    embeddings: List[List[float]] | None = None) -> List[List]:
+        """Retrieve for several queries, embedded together in one call.
+
+        Uses ``search_adaptive`` when adaptive k is on and ``search`` with
+        ``k`` otherwise, like the chatbot's retriever.
+        """
+        if embeddings is None:
+            embeddings = self.embeddings.embed_queries(queries)
+        if self.adaptive_k:
+            return [self.search_adaptive(q, e) for q, e in zip(queries, embeddings)]
+        return [self.search(q, k, e) for q, e in zip(queries, embeddings)]
+
+    async def asearch_many(self, queries: List[str], k: int = 2) -> List[List]:
+        """Async ``search_many``: one batched async embedding call, then all
+        lookups in a single worker thread."""
+        embeddings = await self.embeddings.aembed_queries(queries)
+        return await asyncio.to_thread(self.search_many, queries, k, embeddings)
+
+    def _scored_dense_search(self, embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Dense hits with their cosine similarity to ``embedding``.
+
+        The score comes with the query: FlatIndex returns cosine similarity
+        and Chroma distances are converted (see ``chroma_similarity``).
+        """
+        vectorstore = self.vectorstore
+        if isinstance(vectorstore, FlatIndex):
+            return vectorstore.similarity_search_by_vector_with_score(embedding, k=k)
+
+        space = (vectorstore._collection.configuration_json or {}).get("hnsw", {}).get("space", "l2")
+        return [
+            (doc, chroma_similarity(distance, space))
+            for doc, distance in vectorstore.similarity_search_by_vector_with_relevance_scores(
+                embedding, k=k
+            )
+        ]
+
     def get_retriever(self, k: int = 2):
-        return self.vectorstore.as_retriever(search_kwargs={"k": k})
+        """Retriever for the chain; ``k`` applies when adaptive k is off."""
+        return StoreRetriever(store=self, k=k, adaptive=self.adaptive_k)
+
+    def cache_stats(self) -> dict:
+        """Return counters for the query-embedding LRU and the on-disk embedding cache."""
+        return {
+            "query_embeddings": self.embeddings.query_cache_stats(),
+            "document_embeddings": (
+                self.embedding_cache.stats() if self.embedding_cache is not None else None
+            ),
+        }
 
     def document_count(self) -> int:
         try:
+            if isinstance(self.vectorstore, FlatIndex):
+                return len(self.vectorstore)
             collection = getattr(self.vectorstore, "_collection", None)
             if collection is not None:
                 return int(collection.count())
@@ -126,14 +639,56 @@ class VectorStore:
     def has_documents(self) -> bool:
         return self.document_count() > 0
 
-    def _prepare_documents(self, documents: List) -> Tuple[List, List[str]]:
-        normalized_docs = []
-        doc_ids = []
+    def start_lexical_sync(self) -> None:
+        """Run ``sync_lexical_index`` in a background thread unless it is
+        already running (or failed less than a minute ago)."""
+        if self.lexical_index is None or self._lexical_synced:
+            return
+        with self._lexical_sync_lock:
+            running = self._lexical_sync_thread is not None and self._lexical_sync_thread.is_alive()
+            if running or time.monotonic() < self._lexical_retry_at:
+                return
+            self._lexical_sync_thread = threading.Thread(
+                target=self._sync_lexical_in_background, name="bm25-backfill", daemon=True
+            )
+            self._lexical_sync_thread.start()
+
+    def _sync_lexical_in_background(self) -> None:
+        try:
+            self.sync_lexical_index()
+        except Exception:
+            self._lexical_retry_at = time.monotonic() + 60.0
+            logger.exception("BM25 backfill failed; searches stay dense-only")
+
+    def sync_lexical_index(self) -> None:
+        """Backfill the BM25 index from the collection when they disagree.
+
+        Covers collections built before hybrid search existed and ingestion
+        runs that stopped between the Chroma write and the BM25 write. This
+        blocks, so it runs before ingestion and in the background at
+        startup (``start_lexical_sync``); until it has finished, ``search``
+        is dense-only.
+        """
+        if self.lexical_index is None or self._lexical_synced:
+            return
+        with self._lexical_lock:
+            if self._lexical_synced:
+                return
+            if len(self.lexical_index) != self.document_count():
+                stored = set(self.vectorstore.get(include=[]).get("ids", []))
+                indexed = self.lexical_index.doc_ids()
+                self.lexical_index.delete(list(indexed - stored))
+                missing = list(stored - indexed)
+                for start in range(0, len(missing), 1000):
+                    page = self.vectorstore.get(ids=missing[start: start + 1000], include=["documents"])
+                    self.lexical_index.add(page["ids"], page["documents"])
+                logger.info("Backfilled BM25 index with %d documents", len(missing))
+            self._lexical_synced = True
+
+    def _prepare_documents(self, documents: Iterable) -> Iterator[Tuple[Any, str]]:
+        """Normalize each document in place and yield it with its deterministic ID."""
         for doc in documents:
-            doc_id = self._normalize_document(doc)
-            normalized_docs.append(doc)
-            doc_ids.append(doc_id)
-        return normalized_docs, doc_ids
+            yield doc, self._normalize_document(doc)
 
     def _get_existing_ids(self, candidate_ids: List[str]) -> set:
         if self.vectorstore is None:
@@ -151,6 +706,14 @@ class VectorStore:
         text = re.sub(r"\s+", " ", text)
         return text.strip()
 
+    @staticmethod
+    def _normalize_source(source: str) -> str:
+        """Reduce a file path to its stem; bare names are kept as they are."""
+        path = Path(source)
+        if path.is_absolute() or path.name != source:
+            return path.stem
+        return source
+
     def _normalize_document(self, doc) -> str:
         metadata = getattr(doc, "metadata", None)
         if not isinstance(metadata, dict):
@@ -159,9 +722,7 @@ class VectorStore:
 
         source = metadata.get("source")
         if isinstance(source, str) and source:
-            path = Path(source)
-            if path.is_absolute() or path.name != source:
-                metadata["source"] = path.stem
+            metadata["source"] = self._normalize_source(source)
 
         normalized_source = metadata.get("source", "unknown")
 
@@ -171,10 +732,12 @@ class VectorStore:
             normalized_content = normalized_content.lower()
         setattr(doc, "page_content", normalized_content)
 
-        content_hash = hashlib.sha256(normalized_content.encode("utf-8")).hexdigest()
+        # The same digest addresses the embedding cache, so identical text is
+        # embedded once regardless of its source, page or collection.
+        digest = content_hash(normalized_content)
 
         page = metadata.get("page", 0)
-        doc_id = f"{normalized_source}:p{page}:{content_hash[:16]}"
+        doc_id = f"{normalized_source}:p{page}:{digest[:16]}"
 
         metadata.setdefault("title", normalized_source)
         metadata.setdefault("page", page)
@@ -24,21 +24,115 @@ class Settings(BaseSettings):
     ollama_base_url: str = "http://localhost:11434"
     llm_temperature: float = 0.15
     llm_num_ctx: int = 8192
+    # Answers still generating after this many seconds are aborted (0 = no
+    # deadline); streams also stop when the client disconnects, checked at
+    # least every stream_disconnect_poll seconds while waiting for tokens.
+    generation_timeout: float = 180.0
+    stream_disconnect_poll: float = 1.0
+    # Load-adaptive routing: under load (generation queue depth or p95 of
+    # recent generation times over the threshold) answers come from this
+    # smaller model until the queue drains. Empty disables routing.
+    ollama_fast_model: str = ""
+    model_routing_queue_depth: int = 8
+    model_routing_p95_seconds: float = 20.0
+    model_routing_cooldown: float = 30.0  # minimum seconds on the fast model
+    # Shared HTTP connection pool of the chat client (sync and async)
+    ollama_max_connections: int = 32
+    ollama_keepalive_connections: int = 16
+    ollama_keepalive_expiry: float = 120.0  # seconds an idle connection stays open
+    # How long Ollama keeps the model loaded after a request ("-1" pins it)
+    ollama_keep_alive: str = "30m"
+    # Several Ollama hosts (JSON list, e.g. '["http://a:11434","http://b:11434"]'):
+    # each call goes to the healthy host with the fewest requests in flight.
+    # Empty chat list = ollama_base_url; empty embedding list = the chat hosts.
+    ollama_chat_urls: list[str] = []
+    ollama_embedding_urls: list[str] = []
+    ollama_failure_threshold: int = 3  # consecutive failures before ejection
+    ollama_ejection_seconds: float = 30.0
+    ollama_health_interval: float = 10.0  # seconds between probes; 0 disables
+    # Admission control in front of generation: concurrent slots (0 = no
+    # limit), bounded priority wait queue, and how long a request may wait
+    # before it is shed with 503. Retry-After falls back to the last value
+    # until generation times have been observed.
+    admission_max_concurrent: int = 4
+    admission_max_queue: int = 32
+    admission_queue_timeout: float = 30.0
+    admission_retry_after: int = 5
+    # POST /chat/batch: questions per request, and generations one batch
+    # runs at once (each also takes a low-priority admission slot).
+    batch_max_questions: int = 100
+    batch_concurrency: int = 2
 
     # Embeddings
     embedding_model: str = "nomic-embed-text"
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str | None = None  # defaults to <chroma_persist_dir>/embedding_cache.sqlite
+    embedding_cache_max_entries: int = 200_000
+    query_embedding_cache_size: int = 1024  # 0 disables the query LRU
+
+    # Embedding batches (adaptive scheduler used by VectorStore.add_documents)
+    embedding_batch_size: int = 128  # starting size
+    embedding_min_batch_size: int = 8
+    embedding_max_batch_size: int = 512
+    embedding_concurrency: int = 2
+    embedding_target_batch_seconds: float = 15.0
+    embedding_max_retries: int = 3
+    embedding_retry_backoff: float = 2.0  # seconds, doubled per attempt
+    ingest_queue_size: int = 256  # chunks buffered between ingestion pipeline stages
 
     # ChromaDB
     chroma_collection: str = "pdf_documents"
     chroma_persist_dir: str = "./chroma_db"
+    # "chroma" or "flat" (memory-mapped NumPy index stored in the same directory)
+    vector_backend: str = "chroma"
+    # Flat backend only: "none", "int8" (4x smaller) or "binary" (32x smaller)
+    # first-pass vectors; top k * rerank_factor are rescored in float32.
+    flat_quantization: str = "none"
+    flat_rerank_factor: int = 4
 
     # Retrieval
     retriever_k: int = 2
+    hybrid_search_enabled: bool = True
+    hybrid_candidates: int = 20  # candidates per retriever before RRF fusion
+    hybrid_rrf_k: int = 60
+    # Adaptive k: keep the ranked hits whose cosine similarity reaches both
+    # the absolute floor and relative_score x the best hit, bounded by
+    # min/max k. retriever_k is used when this is off.
+    retriever_adaptive_k: bool = True
+    retriever_min_k: int = 2  # never fewer chunks than the fixed retriever_k gave
+    retriever_max_k: int = 6
+    retriever_score_threshold: float = 0.35
+    retriever_relative_score: float = 0.85
+    # Share of llm_num_ctx the prompt (template, question and packed chunks)
+    # may use; the rest is left for the answer. Lower means faster prompt
+    # processing, higher means more context per answer.
+    context_budget_ratio: float = 0.5
+    context_chars_per_token: float = 3.5  # conservative token estimate
+    # Retrieved chunks longer than this in total are reduced to the
+    # sentences sharing the most question terms. Unset uses
+    # context_compression_ratio x the context budget above; 0 disables
+    # compression.
+    context_compression_tokens: int | None = None
+    context_compression_ratio: float = 0.25
+    # Extractive fast path: answer without the LLM when the best retrieved
+    # hit is a stored Q/A pair (or, with a stricter bar, any chunk, which is
+    # cut down to its best sentences) whose cosine similarity to the
+    # question reaches the threshold.
+    fast_path_enabled: bool = True
+    fast_path_qa_threshold: float = 0.80
+    fast_path_chunk_threshold: float = 0.95
 
     # Chunking
     chunk_size: int = 1000
     chunk_overlap: int = 200
 
+    # PDF parsing
+    pdf_parse_workers: int = 1  # >1 parses in a process pool; 0 uses every CPU
+    pdf_pages_per_task: int = 32  # large PDFs are split into page ranges of this size
+    parse_cache_enabled: bool = True
+    parse_cache_dir: str | None = None  # defaults to <chroma_persist_dir>/parse_cache
+    parse_cache_max_mb: int = 512
+
     # Celery
     celery_broker_url: str = "sqla+sqlite:///./celerydb.sqlite"
     celery_result_backend: str = "db+sqlite:///./celery_results.sqlite"
@@ -53,6 +147,11 @@ class Settings(BaseSettings):
     # Cache
     chat_cache_maxsize: int = 128
     chat_cache_ttl: int = 300  # seconds
+    # Semantic answer cache: paraphrases above the cosine threshold reuse an answer
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_maxsize: int = 512
+    semantic_cache_ttl: int = 3600  # seconds
 
     # Chat history
     chat_history_path: str = "./chat_history.json"
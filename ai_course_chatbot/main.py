@@ -33,8 +33,10 @@ async def lifespan(_app: FastAPI):
     _configure_logging()
     logger.info("Initializing chatbot...")
     try:
-        chat_router.get_chatbot()
+        chatbot = chat_router.get_chatbot()
         logger.info("Chatbot initialized successfully")
+        # Hybrid search is dense-only until the BM25 index has caught up.
+        chatbot.vector_store.start_lexical_sync()
     except Exception as e:
         logger.warning("Could not pre-initialize chatbot: %s", e)
         logger.info("Chatbot will be initialized on first request")
@@ -8,3 +8,17 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     sources: List[str] = []
+    model: str | None = None  # model that generated the answer
+    fast_path: bool = False  # stored answer returned without running the LLM
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+    show_sources: bool = True
+    stream: bool = False  # NDJSON lines in completion order instead of one response
+
+class BatchChatResult(ChatResponse):
+    index: int  # position of the question in the request
+    question: str
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult] = []  # in request order
@@ -3,20 +3,40 @@ Chat router for AI RAG Chatbot.
 Provides endpoints for chatting with the chatbot using RAGChatbot and VectorStore.
 """
 import asyncio
+import json
 import logging
 import threading
+import time
+from collections.abc import AsyncIterator
+from contextlib import aclosing, asynccontextmanager, suppress
 
 from cachetools import TTLCache
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from starlette import status
+from starlette.requests import ClientDisconnect
 
 from fastapi.responses import StreamingResponse
 
 from ai_course_chatbot.config import get_settings
-from ai_course_chatbot.models.chat_request import ChatRequest, ChatResponse
+from ai_course_chatbot.models.chat_request import (
+    BatchChatRequest,
+    BatchChatResponse,
+    BatchChatResult,
+    ChatRequest,
+    ChatResponse,
+)
 from ai_course_chatbot.models.chat_history import ChatHistory
 from ai_course_chatbot.ai_modules import VectorStore, RAGChatbot
+from ai_course_chatbot.ai_modules import rag_chatbot
 from ai_course_chatbot.services import chat_history_service
+from ai_course_chatbot.services.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    AdmissionTicket,
+    Priority,
+)
+from ai_course_chatbot.services.semantic_cache import SemanticCache
+from ai_course_chatbot.services.single_flight import SingleFlight, StreamFlight
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +57,33 @@ _response_cache: TTLCache = TTLCache(
 )
 _cache_lock = threading.Lock()
 
+# Paraphrase-tolerant layer behind the exact-match cache, shared by /chat/
+# and /chat/stream.
+_semantic_cache: SemanticCache | None = (
+    SemanticCache(
+        threshold=_settings.semantic_cache_threshold,
+        maxsize=_settings.semantic_cache_maxsize,
+        ttl=_settings.semantic_cache_ttl,
+    )
+    if _settings.semantic_cache_enabled else None
+)
+
+# Concurrent identical questions (same key as the response cache) share one
+# generation instead of each running retrieval and the LLM.
+_inflight = SingleFlight()
+_inflight_streams = StreamFlight()
+
+# Bounds concurrent generations against Ollama; cache hits and coalesced
+# joiners never take a slot.
+_admission = AdmissionController(
+    max_concurrent=_settings.admission_max_concurrent,
+    max_queue=_settings.admission_max_queue,
+    queue_timeout=_settings.admission_queue_timeout,
+    retry_after=_settings.admission_retry_after,
+)
+# Batch generations wait out this many rejections before giving up.
+_BATCH_ADMISSION_ATTEMPTS = 5
+
 
 def get_chatbot() -> RAGChatbot:
     """
@@ -58,6 +105,7 @@ def get_chatbot() -> RAGChatbot:
             collection_name=settings.chroma_collection,
             persist_directory=settings.chroma_persist_dir,
             embedding_model=settings.embedding_model,
+            on_swap=_clear_answer_caches,
         )
 
         if not vector_store.has_documents():
@@ -71,12 +119,32 @@ def get_chatbot() -> RAGChatbot:
             model_name=settings.ollama_model,
             num_ctx=settings.llm_num_ctx,
             temperature=settings.llm_temperature,
+            queue_depth=_admission.pending,
         )
         logger.info("Chatbot initialized successfully")
 
     return _chatbot_instance
 
 
+def _clear_answer_caches() -> None:
+    """Forget every cached answer (history cleared or collection swapped)."""
+    with _cache_lock:
+        _response_cache.clear()
+    if _semantic_cache is not None:
+        _semantic_cache.clear()
+
+
+def _current_chatbot() -> RAGChatbot:
+    """``get_chatbot()`` after picking up a collection rebuilt elsewhere.
+
+    Answers cached from the old collection are dropped by the swap, so this
+    runs before any cache lookup.
+    """
+    chatbot = get_chatbot()
+    chatbot.refresh_collection()
+    return chatbot
+
+
 def _cache_key(message: str, show_sources: bool) -> str:
     """Normalise a question into a stable cache key."""
     return f"{message.strip().lower()}|{show_sources}"
@@ -97,6 +165,94 @@ def _parse_sources(answer: str, show_sources: bool):
     return response_text, sources
 
 
+async def _question_vector(chatbot: RAGChatbot, message: str):
+    """Embed the question for the semantic cache (None if disabled or failing)."""
+    if _semantic_cache is None:
+        return None
+    try:
+        return await chatbot.aembed_query(message)
+    except Exception:
+        logger.warning("Could not embed question for the semantic cache", exc_info=True)
+        return None
+
+
+def _semantic_lookup(vector, show_sources: bool):
+    """Return a cached raw answer (text plus optional sources suffix) and the
+    model that generated it, or (None, None)."""
+    if vector is None:
+        return None, None
+    hit = _semantic_cache.lookup(vector, require_sources=show_sources)
+    if hit is None:
+        return None, None
+    logger.debug("Semantic cache hit (%.3f) for: %s", hit.similarity, hit.question)
+    if show_sources:
+        return hit.answer, hit.model
+    return _parse_sources(hit.answer, True)[0], hit.model
+
+
+def _semantic_store(vector, message: str, answer: str, show_sources: bool,
+                    model: str | None = None) -> None:
+    if vector is not None and answer not in (
+        rag_chatbot.FALLBACK_ANSWER, rag_chatbot.STREAM_FALLBACK_ANSWER
+    ):
+        _semantic_cache.add(vector, message, answer, has_sources=show_sources, model=model)
+
+
+def _rejection(error: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=error.status_code,
+        detail=error.detail,
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+async def _answer(chatbot: RAGChatbot, request: ChatRequest, key: str, vector) -> ChatResponse:
+    """Answer a question and fill both caches; run once per in-flight key.
+
+    One retrieval serves the extractive fast path and, when that has no
+    confident answer, generation; only generation takes an admission slot.
+    """
+    docs = await chatbot.aretrieve(request.message)
+    model = None
+    answer = chatbot.fast_answer(request.message, docs, show_sources=request.show_sources)
+    fast_path = answer is not None
+    if not fast_path:
+        async with _admission.slot(Priority.INTERACTIVE):
+            # Chosen once admitted, so it reflects the load at generation time.
+            model = chatbot.choose_model()
+            answer = await chatbot.aask(
+                request.message, show_sources=request.show_sources, model=model,
+                fast_path=False, docs=docs,
+            )
+    response_text, sources = _parse_sources(answer, request.show_sources)
+    result = ChatResponse(response=response_text, sources=sources, model=model,
+                          fast_path=fast_path)
+    if answer != rag_chatbot.FALLBACK_ANSWER:
+        with _cache_lock:
+            _response_cache[key] = result
+        _semantic_store(vector, request.message, answer, request.show_sources, model)
+    return result
+
+
+async def _generate_stream(chatbot: RAGChatbot, request: ChatRequest, vector,
+                           ticket: AdmissionTicket, model: str, docs):
+    """Stream an answer and cache the full text; shared by identical streams.
+
+    Releases the generation slot ``ticket`` once the stream ends.
+    """
+    try:
+        tokens = []
+        async for token in chatbot.ask_stream(
+            request.message, show_sources=request.show_sources, model=model, fast_path=False,
+            docs=docs,
+        ):
+            tokens.append(token)
+            yield token
+        _semantic_store(vector, request.message, "".join(tokens), request.show_sources, model)
+    finally:
+        ticket.release()
+
+
 @router.post(
     "/",
     summary="Send a chat message",
@@ -110,7 +266,7 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
     try:
-        chatbot = get_chatbot()
+        chatbot = _current_chatbot()
 
         # ── Check cache ────────────────────────────────────────────────
         key = _cache_key(request.message, request.show_sources)
@@ -120,23 +276,22 @@ async def chat(request: ChatRequest):
             logger.debug("Cache hit for: %s", key)
             return cached
 
-        # ── Run LLM off the event loop ────────────────────────────────
-        answer = await asyncio.to_thread(
-            chatbot.ask, request.message, show_sources=request.show_sources
-        )
+        # ── Semantic cache (paraphrases of answered questions) ─────────
+        vector = await _question_vector(chatbot, request.message)
+        answer, model = _semantic_lookup(vector, request.show_sources)
+        if answer is not None:
+            response_text, sources = _parse_sources(answer, request.show_sources)
+            return ChatResponse(response=response_text, sources=sources, model=model)
 
-        response_text, sources = _parse_sources(answer, request.show_sources)
-        result = ChatResponse(response=response_text, sources=sources)
-
-        # ── Store in cache ─────────────────────────────────────────────
-        with _cache_lock:
-            _response_cache[key] = result
+        # ── Retrieval, then the extractive fast path or generation, ────
+        # ── coalesced with identical in-flight requests ────────────────
+        result = await _inflight.run(key, lambda: _answer(chatbot, request, key, vector))
 
         # ── Persist to chat history ────────────────────────────────────
         chat_history_service.save_entry(
             user_message=request.message,
-            bot_response=response_text,
-            sources=sources,
+            bot_response=result.response,
+            sources=result.sources,
             show_sources=request.show_sources,
         )
 
@@ -144,6 +299,8 @@ async def chat(request: ChatRequest):
 
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise _rejection(e) from e
     except Exception as e:
         logger.exception("Error processing chat request")
         raise HTTPException(
@@ -152,26 +309,102 @@ async def chat(request: ChatRequest):
         )
 
 
+async def _until_disconnected(http_request: Request, tokens: AsyncIterator[str],
+                              interval: float) -> AsyncIterator[str]:
+    """Yield ``tokens``; raise ``ClientDisconnect`` once the client is gone.
+
+    Starlette only notices a gone client when a write fails, which may be
+    long after it left if no token is due (retrieval, a slow model). The
+    connection is therefore checked at least every ``interval`` seconds.
+    Leaving closes ``tokens``; once every identical stream has left, the
+    shared generation is cancelled (see ``StreamFlight``).
+    """
+    pending = None
+    checked = time.monotonic()
+    try:
+        while True:
+            pending = asyncio.ensure_future(tokens.__anext__())
+            while not pending.done():
+                await asyncio.wait({pending}, timeout=interval)
+                if time.monotonic() - checked >= interval:
+                    checked = time.monotonic()
+                    if await http_request.is_disconnected():
+                        raise ClientDisconnect()
+            try:
+                token = pending.result()
+            except StopAsyncIteration:
+                return
+            yield token
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+        await tokens.aclose()
+
+
 @router.post(
     "/stream",
     summary="Stream a chat response (SSE)",
     description="Send a message and receive the response as a Server-Sent Events stream.",
 )
-async def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request):
     """Stream tokens from the chatbot as Server-Sent Events."""
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    chatbot = get_chatbot()
+    chatbot = _current_chatbot()
+
+    # Cache lookup and admission happen before the response starts, so a
+    # shed request gets a real 429/503 status rather than an error event.
+    vector = await _question_vector(chatbot, request.message)
+    cached, model = _semantic_lookup(vector, request.show_sources)
+    key = _cache_key(request.message, request.show_sources)
+    fast_path = False
+    docs = None
+    # A stream already generating this answer had no fast-path answer, so
+    # joining it needs no retrieval.
+    if cached is None and key not in _inflight_streams:
+        docs = await chatbot.aretrieve(request.message)
+        cached = chatbot.fast_answer(request.message, docs, show_sources=request.show_sources)
+        fast_path = cached is not None
+    tokens = None
+    if cached is None:
+        ticket = None
+        if key not in _inflight_streams:
+            try:
+                ticket = await _admission.acquire(Priority.STREAMING)
+            except AdmissionRejected as e:
+                raise _rejection(e) from e
+            if key in _inflight_streams:
+                # An identical stream started while this one was queued.
+                ticket.release()
+                ticket = None
+        model = chatbot.choose_model() if ticket is not None else _inflight_streams.meta(key)
+        # Late joiners replay the tokens produced so far, then the tail.
+        tokens = _inflight_streams.subscribe(
+            key, lambda: _generate_stream(chatbot, request, vector, ticket, model, docs), meta=model
+        )
 
     async def _event_generator():
         full_response = []
         try:
-            async for token in chatbot.ask_stream(
-                request.message, show_sources=request.show_sources
-            ):
-                full_response.append(token)
-                yield f"data: {token}\n\n"
+            if tokens is None:
+                # Same framing as a live stream: answer text, then sources.
+                text = _parse_sources(cached, True)[0]
+                for token in (text, cached[len(text):]):
+                    if token:
+                        full_response.append(token)
+                        yield f"data: {token}\n\n"
+            else:
+                # aclosing: however the response ends, the subscription is
+                # released at once, so an abandoned generation stops promptly.
+                async with aclosing(_until_disconnected(
+                    http_request, tokens, _settings.stream_disconnect_poll
+                )) as stream:
+                    async for token in stream:
+                        full_response.append(token)
+                        yield f"data: {token}\n\n"
             yield "data: [DONE]\n\n"
 
             # Persist streamed response to chat history
@@ -183,11 +416,130 @@ async def chat_stream(request: ChatRequest):
                 sources=sources,
                 show_sources=request.show_sources,
             )
+        except ClientDisconnect:
+            logger.info("Client disconnected after %d tokens; stream stopped",
+                        len(full_response))
         except Exception as e:
             logger.exception("Error during streaming")
             yield f"data: [ERROR] {e}\n\n"
 
-    return StreamingResponse(_event_generator(), media_type="text/event-stream")
+    # Every data line is answer text, so the model travels in a header.
+    headers = {}
+    if model:
+        headers["X-Chat-Model"] = model
+    if fast_path:
+        headers["X-Chat-Fast-Path"] = "true"
+    return StreamingResponse(_event_generator(), media_type="text/event-stream", headers=headers)
+
+
+@asynccontextmanager
+async def _batch_slot():
+    """Low-priority admission slot for one batch generation.
+
+    Interactive traffic may displace or shed batch work; instead of failing
+    the question, the slot is requested again after ``Retry-After``.
+    """
+    for attempt in range(_BATCH_ADMISSION_ATTEMPTS):
+        try:
+            ticket = await _admission.acquire(Priority.BATCH)
+            break
+        except AdmissionRejected as e:
+            if attempt == _BATCH_ADMISSION_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(e.retry_after)
+    try:
+        yield ticket
+    finally:
+        ticket.release()
+
+
+async def _batch_results(chatbot: RAGChatbot, request: BatchChatRequest):
+    """Yield a ``BatchChatResult`` per question as soon as it is answered.
+
+    Cached answers come first; identical questions are generated once.
+    """
+    pending: dict[str, list[int]] = {}
+    for index, question in enumerate(request.questions):
+        key = _cache_key(question, request.show_sources)
+        with _cache_lock:
+            cached = _response_cache.get(key)
+        if cached is not None:
+            yield BatchChatResult(index=index, question=question, **cached.model_dump())
+        else:
+            pending.setdefault(key, []).append(index)
+    if not pending:
+        return
+
+    keys = list(pending)
+    questions = [request.questions[pending[key][0]] for key in keys]
+    async for position, answer, model in chatbot.ask_many(
+        questions, show_sources=request.show_sources, gate=_batch_slot
+    ):
+        response_text, sources = _parse_sources(answer, request.show_sources)
+        generated = answer != rag_chatbot.FALLBACK_ANSWER
+        response = ChatResponse(
+            response=response_text, sources=sources, model=model,
+            fast_path=generated and model is None,
+        )
+        if generated and model is not None:
+            with _cache_lock:
+                _response_cache[keys[position]] = response
+        for index in pending[keys[position]]:
+            yield BatchChatResult(
+                index=index, question=request.questions[index], **response.model_dump()
+            )
+
+
+@router.post(
+    "/batch",
+    summary="Answer a set of questions",
+    description=(
+        "Answer up to BATCH_MAX_QUESTIONS questions with one batched embedding call and "
+        "shared retrieval. Returns all results, or with stream=true one NDJSON line per "
+        "answer as it completes."
+    ),
+    status_code=status.HTTP_200_OK,
+    response_model=BatchChatResponse,
+)
+async def chat_batch(request: BatchChatRequest):
+    """Answer a list of questions (e.g. an instructor's question set)."""
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if any(not question or not question.strip() for question in request.questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    limit = get_settings().batch_max_questions
+    if len(request.questions) > limit:
+        raise HTTPException(status_code=400, detail=f"At most {limit} questions per batch")
+
+    chatbot = _current_chatbot()
+    results = _batch_results(chatbot, request)
+
+    if request.stream:
+        async def _lines():
+            # A failure must not cut the stream short: every question not
+            # answered yet gets an error line instead.
+            answered: set[int] = set()
+            try:
+                async for result in results:
+                    answered.add(result.index)
+                    yield result.model_dump_json() + "\n"
+            except Exception as e:
+                logger.exception("Error processing batch request")
+                for index in range(len(request.questions)):
+                    if index not in answered:
+                        yield json.dumps({"index": index, "error": str(e)}) + "\n"
+
+        return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+    try:
+        collected = [result async for result in results]
+    except Exception as e:
+        logger.exception("Error processing batch request")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing batch request: {str(e)}",
+        )
+    return BatchChatResponse(results=sorted(collected, key=lambda result: result.index))
 
 
 @router.get(
@@ -211,11 +563,40 @@ async def get_history():
 async def delete_history():
     """Clear the persisted chat history."""
     chat_history_service.clear_history()
-    with _cache_lock:
-        _response_cache.clear()
+    _clear_answer_caches()
     return {"message": "Chat history cleared"}
 
 
+@router.get(
+    "/metrics",
+    summary="Chat cache metrics",
+    description="Answer cache hit rates and sizes, request coalescing and admission counters.",
+    status_code=status.HTTP_200_OK,
+)
+async def get_metrics():
+    """Return answer-cache, request-coalescing and admission counters."""
+    with _cache_lock:
+        response_cache = {
+            "entries": len(_response_cache),
+            "maxsize": _response_cache.maxsize,
+            "ttl": _response_cache.ttl,
+        }
+    return {
+        "response_cache": response_cache,
+        "semantic_cache": _semantic_cache.stats() if _semantic_cache is not None else None,
+        "single_flight": {
+            "chat": _inflight.stats(),
+            "stream": _inflight_streams.stats(),
+        },
+        "admission": _admission.stats(),
+        # Generations stopped early, i.e. Ollama capacity handed back.
+        "cancellations": {
+            "client_disconnects": _inflight_streams.stats()["cancelled"],
+            "deadlines": getattr(_chatbot_instance, "generation_timeouts", 0),
+        },
+    }
+
+
 @router.get(
     "/status",
     summary="Check chatbot status",
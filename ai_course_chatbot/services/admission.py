@@ -0,0 +1,181 @@
+"""Admission control and priority queueing for LLM generations."""
+import asyncio
+import bisect
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Lower values are admitted first."""
+
+    STREAMING = 0
+    INTERACTIVE = 1
+    BATCH = 2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a generation is shed instead of queued or admitted.
+
+    ``status_code`` is 429 when the wait queue is full (or the request was
+    displaced by a higher-priority one) and 503 when it waited longer than
+    the queue timeout. ``retry_after`` is a suggested delay in seconds.
+    """
+
+    def __init__(self, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionTicket:
+    """A held generation slot; ``release`` is idempotent."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(time.monotonic() - self._started)
+
+
+class AdmissionController:
+    """Bound concurrent generations and queue the overflow by priority.
+
+    At most ``max_concurrent`` slots are held at once (0 means unlimited).
+    Further requests wait in a queue of at most ``max_queue`` entries,
+    ordered by priority and then arrival; a freed slot is handed straight to
+    the head of the queue. When the queue is full a request displaces the
+    newest waiter of a strictly lower priority, or is rejected with 429.
+    Waiting longer than ``queue_timeout`` seconds is rejected with 503.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 32,
+                 queue_timeout: float = 30.0, retry_after: int = 5):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.default_retry_after = retry_after
+        self._active = 0
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._service_seconds: float | None = None  # EWMA of slot hold time
+        self.admitted = 0
+        self.rejected = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def pending(self) -> int:
+        """Generations running or waiting for a slot."""
+        return self._active + len(self._queue)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new arrival."""
+        if self._service_seconds is None or self.max_concurrent <= 0:
+            return self.default_retry_after
+        backlog = (len(self._queue) + 1) / self.max_concurrent
+        return max(1, math.ceil(self._service_seconds * backlog))
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> AdmissionTicket:
+        if self.max_concurrent <= 0 or (self._active < self.max_concurrent and not self._queue):
+            self._active += 1
+            self.admitted += 1
+            return AdmissionTicket(self)
+
+        if len(self._queue) >= self.max_queue:
+            self._make_room(priority)
+
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        bisect.insort(self._queue, waiter)
+        try:
+            # asyncio.wait reports a timeout by leaving the future pending;
+            # wait_for would raise asyncio.TimeoutError, which is only the
+            # builtin TimeoutError from Python 3.11 on.
+            await asyncio.wait((waiter.future,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            future = waiter.future
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # The slot was handed over just as the caller went away.
+                self._release(0.0)
+            self._discard(waiter)
+            raise
+        if not waiter.future.done():
+            waiter.future.cancel()
+            self._discard(waiter)
+            self.timed_out += 1
+            raise AdmissionRejected(
+                503, self.retry_after(), "Timed out waiting for a free generation slot"
+            )
+        waiter.future.result()  # raises if the request was displaced
+        return AdmissionTicket(self)
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE):
+        ticket = await self.acquire(priority)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def _make_room(self, priority: Priority) -> None:
+        victim = self._queue[-1] if self._queue else None
+        if victim is None or victim.priority <= priority:
+            self.rejected += 1
+            raise AdmissionRejected(429, self.retry_after(), "Too many pending chat requests")
+        self._queue.pop()
+        self.shed += 1
+        logger.info("Shedding queued priority-%d request for a priority-%d one",
+                    victim.priority, priority)
+        victim.future.set_exception(AdmissionRejected(
+            429, self.retry_after(), "Displaced by higher-priority chat requests"
+        ))
+
+    def _discard(self, waiter: _Waiter) -> None:
+        try:
+            self._queue.remove(waiter)
+        except ValueError:
+            pass
+
+    def _release(self, held_seconds: float) -> None:
+        if held_seconds > 0:
+            previous = self._service_seconds
+            self._service_seconds = (
+                held_seconds if previous is None else 0.8 * previous + 0.2 * held_seconds
+            )
+        while self._queue:
+            waiter = self._queue.pop(0)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                self.admitted += 1
+                return
+        self._active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": len(self._queue),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "retry_after": self.retry_after(),
+        }
@@ -0,0 +1,144 @@
+"""Semantic answer cache: paraphrased questions reuse an earlier answer."""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SemanticHit:
+    """A cached answer and how close its question was to the lookup."""
+
+    question: str
+    answer: str
+    similarity: float
+    model: str | None = None
+
+
+@dataclass
+class _Entry:
+    question: str
+    answer: str
+    has_sources: bool
+    created_at: float
+    last_used: float
+    model: str | None = None
+
+
+class SemanticCache:
+    """Answers indexed by the embedding of the question that produced them.
+
+    A lookup returns the most similar live entry whose cosine similarity
+    reaches ``threshold``. Entries expire ``ttl`` seconds after they were
+    stored, and once ``maxsize`` entries are live the least recently used
+    one is replaced. Vectors live in one preallocated matrix, so a lookup
+    is a single matrix-vector product.
+    """
+
+    def __init__(self, threshold: float = 0.92, maxsize: int = 512, ttl: float = 3600.0,
+                 timer=time.monotonic):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._vectors: np.ndarray | None = None
+        self._entries: list[_Entry | None] = [None] * maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray | None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector)) if vector.ndim == 1 else 0.0
+        if not norm:
+            return None
+        return vector / norm
+
+    def lookup(self, embedding, require_sources: bool = False) -> SemanticHit | None:
+        """Return the best cached answer for ``embedding``, if similar enough.
+
+        With ``require_sources`` only answers generated with their source
+        list qualify (an answer without sources cannot serve that request).
+        """
+        query = self._unit(embedding)
+        with self._lock:
+            now = self._timer()
+            self._expire_locked(now)
+            if query is None or self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            scores = self._vectors @ query
+            best, best_score = None, self.threshold
+            for slot, entry in enumerate(self._entries):
+                if entry is None or (require_sources and not entry.has_sources):
+                    continue
+                if scores[slot] >= best_score:
+                    best, best_score = slot, float(scores[slot])
+
+            if best is None:
+                self.misses += 1
+                return None
+            entry = self._entries[best]
+            entry.last_used = now
+            self.hits += 1
+            return SemanticHit(entry.question, entry.answer, best_score, entry.model)
+
+    def add(self, embedding, question: str, answer: str, has_sources: bool,
+            model: str | None = None) -> None:
+        vector = self._unit(embedding)
+        if vector is None:
+            return
+        with self._lock:
+            now = self._timer()
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                # First entry, or the embedding model changed: start over.
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.maxsize
+            self._expire_locked(now)
+
+            slot = next((i for i, entry in enumerate(self._entries) if entry is None), None)
+            if slot is None:
+                slot = min(range(self.maxsize), key=lambda i: self._entries[i].last_used)
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._entries[slot] = _Entry(question, answer, has_sources, now, now, model)
+
+    def _expire_locked(self, now: float) -> None:
+        for slot, entry in enumerate(self._entries):
+            if entry is not None and now - entry.created_at > self.ttl:
+                self._entries[slot] = None
+                self._vectors[slot] = 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._entries = [None] * self.maxsize
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(entry is not None for entry in self._entries)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters, current size and configuration."""
+        entries = len(self)
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "threshold": self.threshold,
+            }
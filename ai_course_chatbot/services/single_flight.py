@@ -0,0 +1,175 @@
+"""Single-flight coalescing of identical in-flight chat requests."""
+import asyncio
+import contextlib
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Run one coroutine per key; concurrent callers with that key share it.
+
+    The shared task is shielded, so a caller that goes away (e.g. a client
+    disconnect cancelling its request) does not cancel the work the other
+    callers are waiting for. The key is released as soon as the task
+    finishes, so later requests start a fresh flight (and normally hit the
+    answer caches instead).
+    """
+
+    def __init__(self):
+        self._flights: dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._flights[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+            self.leaders += 1
+        else:
+            self.joined += 1
+            logger.debug("Joined in-flight request for: %s", key)
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away.
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "joined": self.joined, "in_flight": len(self._flights)}
+
+
+class _Broadcast:
+    """Token buffer of one streamed answer, replayable from the start."""
+
+    def __init__(self):
+        self.tokens: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.meta = None
+        self.changed = asyncio.Condition()
+        self.listeners = 0
+        self.on_idle: Callable[[], None] | None = None  # last listener left early
+
+    async def publish(self, token: str) -> None:
+        async with self.changed:
+            self.tokens.append(token)
+            self.changed.notify_all()
+
+    async def close(self, error: BaseException | None = None) -> None:
+        async with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    async def listen(self) -> AsyncIterator[str]:
+        position = 0
+        self.listeners += 1
+        try:
+            while True:
+                async with self.changed:
+                    await self.changed.wait_for(
+                        lambda seen=position: seen < len(self.tokens) or self.done
+                    )
+                    batch = self.tokens[position:]
+                    finished, error = self.done, self.error
+                for token in batch:
+                    yield token
+                position += len(batch)
+                if finished and position >= len(self.tokens):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            self.listeners -= 1
+            if not self.listeners and not self.done and self.on_idle is not None:
+                self.on_idle()
+
+
+class StreamFlight:
+    """Share one token stream between concurrent identical stream requests.
+
+    The first subscriber starts the producer; anyone joining later first
+    receives every token produced so far and then the live tail. The
+    producer keeps running while at least one subscriber is listening; when
+    the last one leaves early (e.g. the client disconnected) it is cancelled
+    and closed, which stops the upstream generation.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Broadcast] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.leaders = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    def subscribe(self, key: str, factory: Callable[[], AsyncIterator[str]],
+                  meta: Any = None) -> AsyncIterator[str]:
+        """Join or start the stream for ``key``; a starting subscriber may
+        attach ``meta`` (e.g. the model used) for later joiners to read."""
+        broadcast = self._flights.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            broadcast.meta = meta
+            self._flights[key] = broadcast
+            task = asyncio.ensure_future(self._pump(key, broadcast, factory()))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            broadcast.on_idle = lambda: self._abandon(key, broadcast, task)
+            self.leaders += 1
+        else:
+            self.joined += 1
+            logger.debug("Joined in-flight stream for: %s (%d tokens buffered)",
+                         key, len(broadcast.tokens))
+        return broadcast.listen()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def meta(self, key: str) -> Any:
+        broadcast = self._flights.get(key)
+        return broadcast.meta if broadcast is not None else None
+
+    def _abandon(self, key: str, broadcast: _Broadcast, task: asyncio.Task) -> None:
+        # Unlisted first, so nobody joins a stream that is being cancelled.
+        if self._flights.get(key) is broadcast:
+            del self._flights[key]
+        if task.done():
+            return
+        task.cancel()
+        self.cancelled += 1
+        logger.info("Cancelled stream for %s after %d tokens: no subscribers left",
+                    key, len(broadcast.tokens))
+
+    async def _pump(self, key: str, broadcast: _Broadcast, source: AsyncIterator[str]) -> None:
+        error = None
+        try:
+            # aclosing: a cancelled pump closes the source (and its upstream
+            # HTTP stream) right away instead of at garbage collection.
+            async with contextlib.aclosing(source):
+                async for token in source:
+                    await broadcast.publish(token)
+        except asyncio.CancelledError:
+            error = RuntimeError("Stream cancelled: no subscribers left")
+            raise
+        except Exception as e:  # noqa: BLE001 - sent to every subscriber by close()
+            error = e
+        finally:
+            if self._flights.get(key) is broadcast:
+                del self._flights[key]
+            await broadcast.close(error)
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "joined": self.joined,
+            "in_flight": len(self._flights),
+            "cancelled": self.cancelled,
+        }
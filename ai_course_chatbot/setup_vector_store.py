@@ -4,10 +4,12 @@ Main Application
 Entry point for the AI RAG Chatbot application.
 """
 import argparse
+import itertools
 import logging
 import os
 
 from ai_course_chatbot.ai_modules import VectorStore, PDFLoader
+from ai_course_chatbot.ai_modules.qa_loader import load_qa_markdown
 from ai_course_chatbot.config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -21,9 +23,12 @@ def setup_vector_store(
     rebuild: bool = False,
     normalize_lower: bool = False,
     default_lang: str = "en",
+    qa_paths: list[str] | None = None,
 ) -> VectorStore | None:
-    if not pdf_paths:
-        raise ValueError("At least one PDF path must be provided to load into the VectorStore.")
+    pdf_paths = pdf_paths or []
+    qa_paths = qa_paths or []
+    if not pdf_paths and not qa_paths:
+        raise ValueError("At least one PDF or Q/A file must be provided to load into the VectorStore.")
 
     logger.info("Using embedding model: %s", embedding_model)
     if ollama_model:
@@ -35,15 +40,41 @@ def setup_vector_store(
 
     logger.info("Loading PDF files...")
     pdf_loader = PDFLoader()
-    documents = pdf_loader.load_and_chunk_pdfs(pdf_paths)
-
-    if not documents:
-        logger.warning("No documents were loaded from the provided PDF paths.")
+    # Chunks are streamed into the store while later pages are still being
+    # parsed, so memory does not grow with the number of PDFs.
+    chunks = pdf_loader.iter_chunks(pdf_paths)
+    # Curated Q/A pairs are stored alongside the chunks; the chatbot can
+    # return their answers directly (extractive fast path).
+    qa_documents = [doc for path in qa_paths for doc in load_qa_markdown(path)]
+    chunks = itertools.chain(qa_documents, chunks)
+    first = next(chunks, None)
+
+    if first is None:
+        logger.warning("No documents were loaded from the provided paths.")
         return None
+    documents = itertools.chain([first], chunks)
+
+    if rebuild:
+        # The chat API keeps serving the current collection until the
+        # rebuilt one is complete and the alias is swapped.
+        logger.info("Rebuilding vector store...")
+        report = vector_store.rebuild(documents)
+        logger.info(
+            "Vector store rebuilt as %s with %d documents.",
+            vector_store.collection_name, report.added,
+        )
+        return vector_store
 
     logger.info("Adding documents to vector store...")
-    vector_store.add_documents(documents)
-    logger.info("Vector store populated successfully.")
+    # Each loaded PDF is the current version of its source, so chunks that
+    # an overwritten file no longer produces are removed, except for files
+    # that failed partway through parsing.
+    report = vector_store.add_documents(documents, replace_sources=True,
+                                        keep_sources=pdf_loader.failed_sources)
+    logger.info(
+        "Vector store populated successfully (%d added, %d kept, %d deleted).",
+        report.added, report.kept, report.deleted,
+    )
 
     return vector_store
 
@@ -52,11 +83,12 @@ def main():
     settings = get_settings()
     parser = argparse.ArgumentParser(description="AI RAG Chatbot - Chat with your PDF documents using Ollama")
     parser.add_argument("--pdf", nargs="+", help="Path(s) to PDF file(s) to load")
+    parser.add_argument("--qa", nargs="+", help="Path(s) to Q/A markdown file(s) (**Question:**/**Answer:**/**Page:** blocks)")
     parser.add_argument("--model", default=settings.ollama_model, help="Ollama model to use for chat")
     parser.add_argument("--embedding-model", default=settings.embedding_model, help="Embedding model")
     parser.add_argument("--embedding-lower", action="store_true", help="Lowercase text before embedding")
     parser.add_argument("--lang", default="en", help="Default language tag")
-    parser.add_argument("--rebuild", action="store_true", help="Clear collection before loading")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the collection from these PDFs in a shadow copy and swap it in")
 
     args = parser.parse_args()
 
@@ -77,6 +109,7 @@ def main():
         rebuild=args.rebuild,
         normalize_lower=args.embedding_lower,
         default_lang=args.lang,
+        qa_paths=args.qa,
     )
 
 
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Report the recall cost of quantized flat-index search against the Chroma
+float path on the configured collection.
+
+Stored chunk embeddings are used as queries (their own chunk is excluded
+from the results), so no Ollama server is needed. For every quantization
+mode a temporary FlatIndex is built from the same vectors and its top-k is
+compared with Chroma's top-k.
+
+    python scripts/quantization_recall.py --k 5 --sample 200 --rerank-factor 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from ai_course_chatbot.ai_modules import VectorStore, flat_index
+
+
+def _top_ids(ids: list[str], exclude: str, k: int) -> set[str]:
+    """First ``k`` IDs, ignoring the query's own chunk."""
+    return set([doc_id for doc_id in ids if doc_id != exclude][:k])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, default=5, help="Top-k to compare")
+    parser.add_argument("--sample", type=int, default=200, help="Number of query vectors")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="Candidates per result to rescore")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = VectorStore(backend="chroma")
+    data = store.vectorstore.get(include=["embeddings"])
+    ids = list(data["ids"])
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    if not ids:
+        print("Collection is empty; run setup_vector_store first.")
+        sys.exit(2)
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(ids), size=min(args.sample, len(ids)), replace=False)
+    collection = store.vectorstore._collection
+    chroma = collection.query(
+        query_embeddings=vectors[sample].tolist(), n_results=args.k + 1, include=[]
+    )["ids"]
+    reference = [_top_ids(found, ids[row], args.k) for row, found in zip(sample, chroma)]
+
+    print(f"Collection: {store.collection_name} ({len(ids)} chunks, dim {vectors.shape[1]})")
+    print(f"Recall@{args.k} vs Chroma over {len(sample)} queries, rerank factor {args.rerank_factor}")
+    print(f"{'mode':<8} {'recall':>8} {'loss':>8} {'first-pass MB':>14} {'float32 MB':>11}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for quantization in flat_index.QUANTIZATIONS:
+            index = flat_index.FlatIndex(
+                os.path.join(temp_dir, quantization), embedding_function=store.embeddings,
+                quantization=quantization, rerank_factor=args.rerank_factor,
+            )
+            index.add_vectors(ids, vectors, [""] * len(ids), [{} for _ in ids])
+
+            hits = total = 0
+            for row, expected in zip(sample, reference):
+                found = index.similarity_search_by_vector_with_score(vectors[row].tolist(), k=args.k + 1)
+                got = _top_ids([doc.id for doc, _ in found], ids[row], args.k)
+                hits += len(got & expected)
+                total += len(expected)
+
+            recall = hits / total if total else 1.0
+            footprint = index.memory_footprint()
+            print(
+                f"{quantization:<8} {recall:>8.3f} {1.0 - recall:>8.3f} "
+                f"{footprint['search_bytes'] / 1e6:>14.1f} {footprint['float32_bytes'] / 1e6:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Tests for generation admission control
+"""
+import asyncio
+
+import pytest
+
+from ai_course_chatbot.services.admission import (AdmissionController,
+                                                  AdmissionRejected, Priority)
+
+
+def test_freed_slots_go_to_the_highest_priority_waiter():
+    controller = AdmissionController(max_concurrent=1, max_queue=4)
+    order = []
+
+    async def request(name, priority):
+        async with controller.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        first = asyncio.ensure_future(request("first", Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.ensure_future(request("batch", Priority.BATCH)),
+            asyncio.ensure_future(request("interactive", Priority.INTERACTIVE)),
+            asyncio.ensure_future(request("stream", Priority.STREAMING)),
+        ]
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(main())
+    assert order == ["first", "stream", "interactive", "batch"]
+    assert controller.stats()["active"] == 0
+
+
+def test_full_queue_rejects_or_displaces_lower_priority():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, retry_after=3)
+
+    async def main():
+        held = await controller.acquire()
+        batch = asyncio.ensure_future(controller.acquire(Priority.BATCH))
+        await asyncio.sleep(0)
+        stream = asyncio.ensure_future(controller.acquire(Priority.STREAMING))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as displaced:
+            await batch
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire(Priority.INTERACTIVE)
+
+        held.release()
+        (await stream).release()
+        return displaced.value, rejected.value
+
+    displaced, rejected = asyncio.run(main())
+    assert displaced.status_code == rejected.status_code == 429
+    assert rejected.retry_after == 3
+    stats = controller.stats()
+    assert (stats["shed"], stats["rejected"], stats["active"]) == (1, 1, 0)
+
+
+def test_queue_timeout_and_cancellation_do_not_leak_slots():
+    controller = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=0.02)
+
+    async def main():
+        held = await controller.acquire()
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await controller.acquire()
+
+        cancelled = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        held.release()
+        held.release()  # idempotent
+        return timed_out.value
+
+    assert asyncio.run(main()).status_code == 503
+    stats = controller.stats()
+    assert (stats["active"], stats["queued"], stats["timed_out"]) == (0, 0, 1)
@@ -0,0 +1,45 @@
+"""
+Tests for the BM25 lexical index
+"""
+from ai_course_chatbot.ai_modules.bm25_index import BM25Index, tokenize
+from ai_course_chatbot.ai_modules.vector_store import reciprocal_rank_fusion
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("Who is the narrator, Dr. Watson?") == ["narrator", "dr", "watson"]
+
+
+def test_search_ranks_exact_terms(tmp_path):
+    """Rare exact terms such as names or course codes rank first."""
+    index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    index.add(
+        ["a", "b", "c"],
+        [
+            "Holmes met Stamford at the hospital laboratory.",
+            "The laboratory was used for chemistry experiments.",
+            "Course CS101 covers neural networks.",
+        ],
+    )
+
+    assert index.search("Stamford", k=2)[0][0] == "a"
+    assert [doc_id for doc_id, _ in index.search("cs101 syllabus", k=2)] == ["c"]
+    assert index.search("the of", k=2) == []
+
+
+def test_add_is_idempotent_and_delete_removes(tmp_path):
+    """Re-adding an ID replaces it; deleted IDs no longer match."""
+    path = str(tmp_path / "bm25.sqlite")
+    index = BM25Index(path)
+    index.add(["a"], ["harpoon pig"])
+    index.add(["a"], ["harpoon pig butcher"])
+    assert len(index) == 1
+
+    index.delete(["a"])
+    assert index.search("harpoon") == []
+    assert len(BM25Index(path)) == 0
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]], k=60)
+    assert [doc_id for doc_id, _ in fused][:2] == ["y", "x"]
+    assert {doc_id for doc_id, _ in fused} == {"x", "y", "z", "w"}
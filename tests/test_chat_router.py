@@ -1,14 +1,21 @@
 """
 Tests for the chat router
 """
+import asyncio
+import json
+
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+
+from starlette.requests import ClientDisconnect
 
 from ai_course_chatbot.routers import chat_router
 from ai_course_chatbot.routers.chat_router import _cache_lock, _response_cache
 from ai_course_chatbot.ai_modules import VectorStore, RAGChatbot
+from ai_course_chatbot.services.admission import AdmissionController
+from ai_course_chatbot.services.single_flight import StreamFlight
 
 
 app = FastAPI()
@@ -76,7 +83,9 @@ def test_chat_successful_response():
     # Mock the chatbot
     mock_chatbot = Mock(spec=RAGChatbot)
     mock_chatbot.model_name = "test-model"
-    mock_chatbot.ask.return_value = "This is a test response.\n\nSources:\n1. test.pdf (Page 1)"
+    mock_chatbot.aask.return_value = "This is a test response.\n\nSources:\n1. test.pdf (Page 1)"
+    mock_chatbot.choose_model.return_value = "test-model"
+    mock_chatbot.fast_answer.return_value = None
     
     chat_router._chatbot_instance = mock_chatbot
     
@@ -91,6 +100,7 @@ def test_chat_successful_response():
     assert data["response"] == "This is a test response."
     assert "sources" in data
     assert len(data["sources"]) > 0
+    assert data["model"] == "test-model"
     
     # Clean up
     chat_router._chatbot_instance = None
@@ -101,7 +111,9 @@ def test_chat_without_sources():
     chat_router._response_cache.clear()
     mock_chatbot = Mock(spec=RAGChatbot)
     mock_chatbot.model_name = "test-model"
-    mock_chatbot.ask.return_value = "This is a test response."
+    mock_chatbot.aask.return_value = "This is a test response."
+    mock_chatbot.choose_model.return_value = "test-model"
+    mock_chatbot.fast_answer.return_value = None
     
     chat_router._chatbot_instance = mock_chatbot
     
@@ -131,3 +143,214 @@ def test_delete_history_clears_response_cache():
     assert response.status_code == 200
     with _cache_lock:
         assert len(_response_cache) == 0
+
+
+def test_paraphrase_is_served_from_semantic_cache():
+    """A reworded question reuses the first answer on both chat endpoints."""
+    chat_router._response_cache.clear()
+    chat_router._semantic_cache.clear()
+    vectors = {
+        "what is a neural net?": [1.0, 0.0, 0.2],
+        "What's a neural network": [0.99, 0.01, 0.2],
+    }
+    mock_chatbot = Mock(spec=RAGChatbot)
+    mock_chatbot.aembed_query.side_effect = lambda message: vectors[message]
+    mock_chatbot.aask.return_value = "Layers of weights.\n\nSources:\n1. lecture3 (Page 2)"
+    mock_chatbot.choose_model.return_value = "test-model"
+    mock_chatbot.fast_answer.return_value = None
+    chat_router._chatbot_instance = mock_chatbot
+
+    with patch("ai_course_chatbot.routers.chat_router.chat_history_service.save_entry"):
+        first = client.post("/chat/", json={"message": "what is a neural net?"})
+        second = client.post("/chat/", json={"message": "What's a neural network"})
+        streamed = client.post("/chat/stream", json={"message": "What's a neural network"})
+
+    assert second.json() == first.json()
+    assert second.json()["sources"] == ["1. lecture3 (Page 2)"]
+    mock_chatbot.aask.assert_awaited_once()
+    mock_chatbot.ask_stream.assert_not_called()
+    assert "data: Layers of weights.\n\n" in streamed.text
+    assert streamed.text.endswith("data: [DONE]\n\n")
+    assert second.json()["model"] == streamed.headers["X-Chat-Model"] == "test-model"
+
+    metrics = client.get("/chat/metrics").json()
+    assert metrics["semantic_cache"]["hits"] == 2
+    assert metrics["semantic_cache"]["entries"] == 1
+
+    chat_router._chatbot_instance = None
+    chat_router._semantic_cache.clear()
+
+
+def test_full_admission_queue_sheds_with_retry_after():
+    """When no slot or queue space is free, both endpoints answer 429 fast."""
+    chat_router._response_cache.clear()
+    mock_chatbot = Mock(spec=RAGChatbot)
+    mock_chatbot.fast_answer.return_value = None
+    chat_router._chatbot_instance = mock_chatbot
+    admission = AdmissionController(max_concurrent=1, max_queue=0, retry_after=7)
+    held = asyncio.run(admission.acquire())
+
+    with patch.object(chat_router, "_admission", admission):
+        response = client.post("/chat/", json={"message": "Who is Robin Hood?"})
+        streamed = client.post("/chat/stream", json={"message": "Who is Robin Hood?"})
+
+    assert response.status_code == streamed.status_code == 429
+    assert response.headers["Retry-After"] == streamed.headers["Retry-After"] == "7"
+    mock_chatbot.aask.assert_not_called()
+    mock_chatbot.ask_stream.assert_not_called()
+    assert admission.stats()["rejected"] == 2
+
+    held.release()
+    chat_router._chatbot_instance = None
+
+
+def test_fast_path_answers_without_generation():
+    """A confident stored answer is returned directly on both endpoints."""
+    chat_router._response_cache.clear()
+    mock_chatbot = Mock(spec=RAGChatbot)
+    mock_chatbot.fast_answer.return_value = "Dr. John Watson.\n\nSources:\n1. cano (Page 3)"
+    chat_router._chatbot_instance = mock_chatbot
+
+    with patch("ai_course_chatbot.routers.chat_router.chat_history_service.save_entry") as save_entry:
+        response = client.post("/chat/", json={"message": "Who narrates the stories?"})
+        repeated = client.post("/chat/", json={"message": "Who narrates the stories?"})
+        streamed = client.post("/chat/stream", json={"message": "Who narrates the stories?"})
+
+    data = response.json()
+    assert data["fast_path"] is True
+    assert data["response"] == "Dr. John Watson."
+    assert data["sources"] == ["1. cano (Page 3)"]
+    assert repeated.json() == data
+    assert streamed.headers["X-Chat-Fast-Path"] == "true"
+    assert "data: Dr. John Watson.\n\n" in streamed.text
+    mock_chatbot.aask.assert_not_called()
+    mock_chatbot.ask_stream.assert_not_called()
+    # The repeated /chat/ question is an exact cache hit: no second retrieval.
+    assert mock_chatbot.fast_answer.call_count == 2
+    assert save_entry.call_count == 2
+    save_entry.assert_called_with(
+        user_message="Who narrates the stories?", bot_response="Dr. John Watson.",
+        sources=["1. cano (Page 3)"], show_sources=True,
+    )
+
+    chat_router._chatbot_instance = None
+
+
+def test_identical_requests_share_one_retrieval():
+    """Concurrent identical questions retrieve and answer once."""
+    chat_router._response_cache.clear()
+    mock_chatbot = Mock(spec=RAGChatbot)
+    mock_chatbot.aembed_query.return_value = None
+
+    async def aretrieve(message):
+        await asyncio.sleep(0.05)
+        return []
+
+    mock_chatbot.aretrieve.side_effect = aretrieve
+    mock_chatbot.fast_answer.return_value = "Dr. John Watson."
+    chat_router._chatbot_instance = mock_chatbot
+    request = chat_router.ChatRequest(message="Who narrates the stories?", show_sources=False)
+
+    async def main():
+        return await asyncio.gather(*(chat_router.chat(request) for _ in range(3)))
+
+    with patch("ai_course_chatbot.routers.chat_router.chat_history_service.save_entry") as save_entry:
+        results = asyncio.run(main())
+
+    assert [r.response for r in results] == ["Dr. John Watson."] * 3
+    assert all(r.fast_path for r in results)
+    mock_chatbot.aretrieve.assert_awaited_once()
+    assert save_entry.call_count == 3
+
+    chat_router._chatbot_instance = None
+
+
+def test_batch_answers_each_distinct_question_once():
+    """Cached answers are reused and duplicates are generated once."""
+    chat_router._response_cache.clear()
+    with _cache_lock:
+        _response_cache[chat_router._cache_key("Who is Watson?", True)] = chat_router.ChatResponse(
+            response="A doctor.", sources=["1. study (Page 1)"], model="test-model"
+        )
+    asked = []
+
+    async def ask_many(questions, show_sources=True, gate=None):
+        asked.append(list(questions))
+        for position in reversed(range(len(questions))):
+            yield position, f"Answer {position}.\n\nSources:\n1. cano (Page 2)", "test-model"
+
+    mock_chatbot = Mock(spec=RAGChatbot)
+    mock_chatbot.ask_many.side_effect = ask_many
+    chat_router._chatbot_instance = mock_chatbot
+    questions = ["Who is Watson?", "Where is Baker Street?", "Who is Holmes?", "where is baker street?"]
+
+    response = client.post("/chat/batch", json={"questions": questions})
+    streamed = client.post("/chat/batch", json={"questions": questions[1:3], "stream": True})
+
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert [r["response"] for r in results] == ["A doctor.", "Answer 0.", "Answer 1.", "Answer 0."]
+    assert results[1]["sources"] == ["1. cano (Page 2)"]
+    assert asked == [["Where is Baker Street?", "Who is Holmes?"]]
+    # The second request is fully cached by the first.
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    assert next(line for line in streamed.text.splitlines() if line).startswith('{"response":"Answer 0."')
+    assert len(asked) == 1
+    assert client.post("/chat/batch", json={"questions": []}).status_code == 400
+
+    chat_router._chatbot_instance = None
+
+
+def test_batch_stream_reports_failed_questions_per_item():
+    """A failure mid-stream becomes an error line for each unanswered question."""
+    chat_router._response_cache.clear()
+
+    async def ask_many(questions, show_sources=True, gate=None):
+        yield 1, "Answer 1.", "test-model"
+        raise RuntimeError("Ollama went away")
+
+    mock_chatbot = Mock(spec=RAGChatbot)
+    mock_chatbot.ask_many.side_effect = ask_many
+    chat_router._chatbot_instance = mock_chatbot
+
+    streamed = client.post("/chat/batch", json={
+        "questions": ["Who is Watson?", "Who is Holmes?", "Who is Hudson?"], "stream": True,
+    })
+
+    lines = [json.loads(line) for line in streamed.text.splitlines() if line]
+    assert streamed.status_code == 200
+    assert lines[0]["index"] == 1
+    assert lines[1:] == [
+        {"index": 0, "error": "Ollama went away"},
+        {"index": 2, "error": "Ollama went away"},
+    ]
+
+    chat_router._chatbot_instance = None
+
+
+def test_disconnected_client_cancels_the_shared_generation():
+    """A gone client is noticed while waiting for tokens and the producer stops."""
+    flight = StreamFlight()
+    closed = asyncio.Event()
+    http_request = Mock(is_disconnected=AsyncMock(side_effect=[False, True]))
+
+    async def tokens():
+        try:
+            yield "Robin "
+            await asyncio.sleep(10)  # e.g. a slow model
+            yield "Hood"
+        finally:
+            closed.set()
+
+    async def main():
+        received = []
+        with pytest.raises(ClientDisconnect):
+            async for token in chat_router._until_disconnected(
+                http_request, flight.subscribe("q", tokens), interval=0.01
+            ):
+                received.append(token)
+        await asyncio.wait_for(closed.wait(), 1)
+        return received
+
+    assert asyncio.run(main()) == ["Robin "]
+    assert flight.stats()["cancelled"] == 1
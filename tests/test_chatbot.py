@@ -3,12 +3,21 @@ Simple tests for the AI RAG Chatbot components.
 Note: These are basic smoke tests. Full testing requires actual PDFs and Ollama running.
 """
 
+import asyncio
+import contextlib
 import os
 import tempfile
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
 
 from ai_course_chatbot.ai_modules import PDFLoader, VectorStore, RAGChatbot
+from ai_course_chatbot.ai_modules.embedding_cache import CachedEmbeddings
+from ai_course_chatbot.ai_modules.qa_loader import load_qa_markdown
+from ai_course_chatbot.ai_modules.rag_chatbot import FALLBACK_ANSWER, GenerationTimeout
+from ai_course_chatbot.ai_modules.vector_store import StoreRetriever
 
 class TestPDFLoader(unittest.TestCase):
     """Test PDF loader functionality."""
@@ -28,6 +37,34 @@ class TestPDFLoader(unittest.TestCase):
         with self.assertRaises(FileNotFoundError):
             loader.load_pdf("nonexistent_file.pdf")
 
+    def test_parallel_loading_matches_sequential(self):
+        """Page ranges parsed in a process pool give the same chunks, in order."""
+
+        pdf_path = os.path.join(os.path.dirname(__file__), "..", "data", "robin_hood.pdf")
+        paths = [pdf_path, "nonexistent_file.pdf"]
+
+        sequential = PDFLoader(workers=1, use_cache=False).load_and_chunk_pdfs(paths)
+        parallel = PDFLoader(workers=2, pages_per_task=16, use_cache=False).load_and_chunk_pdfs(paths)
+
+        self.assertGreater(len(sequential), 0)
+        self.assertEqual(
+            [(doc.page_content, doc.metadata) for doc in parallel],
+            [(doc.page_content, doc.metadata) for doc in sequential],
+        )
+
+    def test_qa_markdown_is_parsed_into_answerable_documents(self):
+        """Every Question/Answer/Page block becomes one plain-text Q/A document."""
+
+        path = os.path.join(os.path.dirname(__file__), "..", "data", "sherlock-holmes", "cano.md")
+        docs = load_qa_markdown(path)
+
+        self.assertGreater(len(docs), 5)
+        first = docs[0].metadata
+        self.assertEqual(first["source_type"], "qa")
+        self.assertEqual(first["page"], 3)
+        self.assertTrue(first["answer"].startswith("The narrator is Dr. John Watson."))
+        self.assertNotIn("**", docs[0].page_content)
+
 
 class TestVectorStore(unittest.TestCase):
     """Test vector store functionality."""
@@ -52,13 +89,209 @@ class TestVectorStore(unittest.TestCase):
             # Should handle empty list gracefully
             store.add_documents([])
 
+    def test_hybrid_search_merges_dense_and_lexical_hits(self):
+        """Lexical-only hits are fetched by ID, scored and fused with dense results."""
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = VectorStore(persist_directory=temp_dir)
+            store.lexical_index.add(["b:p1:x"], ["Stamford introduced Watson"])
+            dense = Document(page_content="dense", metadata={}, id="a:p0:y")
+            lexical = {"ids": ["b:p1:x"], "documents": ["Stamford introduced Watson"],
+                       "metadatas": [{"source": "b.pdf"}], "embeddings": [[3.0, 4.0]]}
+
+            with patch.object(store, "_scored_dense_search", return_value=[(dense, 0.9)]), \
+                    patch.object(store.vectorstore, "get", return_value=lexical) as get, \
+                    patch.object(store, "document_count", return_value=1):
+                store.sync_lexical_index()
+                hits = store.search_with_scores("Who is Stamford?", k=2, embedding=[1.0, 0.0])
+
+            get.assert_called_once_with(ids=["b:p1:x"], include=["documents", "metadatas", "embeddings"])
+            scores = {doc.id: score for doc, score in hits}
+            self.assertEqual(set(scores), {"a:p0:y", "b:p1:x"})
+            self.assertEqual(scores["a:p0:y"], 0.9)
+            self.assertAlmostEqual(scores["b:p1:x"], 0.6, places=5)
+            self.assertEqual({doc.metadata["score"] for doc, _ in hits}, {0.9, 0.6})
+            self.assertEqual(dense.metadata, {})  # scores go on copies
+
+    def test_search_is_dense_only_until_the_bm25_backfill_finishes(self):
+        """The backfill runs in the background; searches never wait for it."""
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            writer = VectorStore(persist_directory=temp_dir)
+            writer.embeddings.embeddings = Mock(
+                embed_documents=lambda texts: [[1.0, float(len(t))] for t in texts],
+                embed_query=lambda text: [1.0, 0.0],
+            )
+            writer.add_documents([Document(page_content="Stamford introduced Watson",
+                                           metadata={"source": "a.pdf"})])
+            writer.lexical_index.delete(writer.lexical_index.doc_ids())  # e.g. an old collection
+            store = VectorStore(persist_directory=temp_dir, embeddings=writer.embeddings)
+
+            with patch.object(store.lexical_index, "search") as lexical_search:
+                store.search("Who is Stamford?", k=2)
+            lexical_search.assert_not_called()
+
+            store._lexical_sync_thread.join(timeout=5)
+            self.assertEqual(len(store.lexical_index), 1)
+            self.assertEqual(len(store.search("Who is Stamford?", k=2)), 1)
+
+    def test_replace_sources_deletes_only_stale_chunks(self):
+        """Re-ingesting a changed PDF keeps unchanged chunks and drops removed ones."""
+
+        def pages(*texts):
+            return [
+                Document(page_content=text, metadata={"source": "/docs/notes.pdf", "page": i})
+                for i, text in enumerate(texts)
+            ]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = VectorStore(persist_directory=temp_dir)
+            store.embeddings.embeddings = Mock(
+                embed_documents=lambda texts: [[1.0, float(len(t))] for t in texts]
+            )
+            store.add_documents(pages("intro", "old chapter"), replace_sources=True)
+            store.add_documents(
+                [Document(page_content="other", metadata={"source": "other.pdf"})]
+            )
+
+            report = store.add_documents(pages("intro", "new chapter"), replace_sources=True)
+
+            self.assertEqual((report.added, report.kept, report.deleted), (1, 1, 1))
+            stored = store.vectorstore.get(include=["documents"])["documents"]
+            self.assertEqual(sorted(stored), ["intro", "new chapter", "other"])
+            self.assertEqual(store.lexical_index.search("old", k=5), [])
+
+    def test_replace_sources_keeps_other_types_with_the_same_stem(self):
+        """Q/A pairs from cano.md and chunks of cano.pdf are replaced separately."""
+
+        for backend in ("chroma", "flat"):
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as temp_dir:
+                store = VectorStore(persist_directory=temp_dir, backend=backend)
+                store.embeddings.embeddings = Mock(
+                    embed_documents=lambda texts: [[1.0, float(len(t))] for t in texts]
+                )
+                qa = Document(page_content="Question: Who narrates?\nAnswer: Watson.",
+                              metadata={"source": "/data/cano.md", "page": 3, "source_type": "qa"})
+                chunk = Document(page_content="Watson narrates the stories.",
+                                 metadata={"source": "/data/cano.pdf", "page": 3})
+                store.add_documents([qa], replace_sources=True)
+                report = store.add_documents([chunk], replace_sources=True)
+
+                self.assertEqual((report.added, report.deleted), (1, 0))
+                self.assertEqual(store.document_count(), 2)
+
+    def test_pdf_failing_mid_file_keeps_its_stored_chunks(self):
+        """Chunks yielded before a parse error do not make the rest look stale."""
+
+        pdf_path = os.path.join(os.path.dirname(__file__), "..", "data", "robin_hood.pdf")
+
+        def lazy_load(fail_at=None):
+            for page in range(3):
+                if page == fail_at:
+                    raise ValueError("damaged page")
+                yield Document(page_content=f"page {page} text", metadata={"source": pdf_path, "page": page})
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = VectorStore(persist_directory=temp_dir)
+            store.embeddings.embeddings = Mock(
+                embed_documents=lambda texts: [[1.0, float(len(t))] for t in texts]
+            )
+            loader = PDFLoader(workers=1, use_cache=False)
+            with patch("ai_course_chatbot.ai_modules.pdf_loader.PyPDFLoader") as pypdf_loader:
+                pypdf_loader.return_value.lazy_load.side_effect = lazy_load
+                store.add_documents(loader.iter_chunks([pdf_path]), replace_sources=True,
+                                    keep_sources=loader.failed_sources)
+                pypdf_loader.return_value.lazy_load.side_effect = lambda: lazy_load(fail_at=1)
+                report = store.add_documents(loader.iter_chunks([pdf_path]), replace_sources=True,
+                                             keep_sources=loader.failed_sources)
+
+            self.assertEqual(loader.failed_sources, {pdf_path})
+            self.assertEqual((report.added, report.kept, report.deleted), (0, 1, 0))
+            self.assertEqual(store.document_count(), 3)
+
+    def test_rebuild_swaps_alias_for_running_readers(self):
+        """A rebuild lands in a new collection that other stores switch to on search."""
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            embed = Mock(embed_documents=lambda texts: [[1.0, float(len(t))] for t in texts])
+            writer = VectorStore(persist_directory=temp_dir)
+            writer.embeddings.embeddings = embed
+            writer.add_documents([Document(page_content="old text", metadata={"source": "a.pdf"})])
+            on_swap = Mock()
+            reader = VectorStore(persist_directory=temp_dir, on_swap=on_swap)
+            first = reader.collection_name
+
+            writer.rebuild([Document(page_content="new text", metadata={"source": "a.pdf"})])
+            second = writer.collection_name
+            writer.rebuild([Document(page_content="newer text", metadata={"source": "a.pdf"})])
+
+            # Two generations back is kept for one more swap: the reader
+            # has not switched yet and may still be searching it.
+            collections = {c.name for c in writer.vectorstore._client.list_collections()}
+            self.assertIn(first, collections)
+
+            self.assertTrue(reader.refresh())
+            self.assertFalse(reader.refresh())
+            on_swap.assert_called_once_with()
+            self.assertEqual(reader.collection_name, writer.collection_name)
+            stored = reader.vectorstore.get(include=["documents"])["documents"]
+            self.assertEqual(stored, ["newer text"])
+
+            writer.rebuild([Document(page_content="newest text", metadata={"source": "a.pdf"})])
+            collections = {c.name for c in writer.vectorstore._client.list_collections()}
+            self.assertIn(second, collections)
+            self.assertNotIn(first, collections)
+
+    def test_search_reports_cosine_similarity(self):
+        """The top dense hit comes back with its cosine similarity to the query."""
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = VectorStore(persist_directory=temp_dir)
+            store.embeddings.embeddings = Mock(
+                embed_documents=lambda texts: [[3.0, 4.0] if "Watson" in t else [0.0, 1.0] for t in texts],
+                embed_query=lambda text: [1.0, 0.0],
+            )
+            store.add_documents([
+                Document(page_content="Dr. Watson narrates", metadata={"source": "cano.md"}),
+                Document(page_content="A hound on the moor", metadata={"source": "cano.md"}),
+            ])
+
+            doc, score = store.search_with_scores("Who narrates?", k=1)[0]
+
+        self.assertEqual(doc.page_content, "Dr. Watson narrates")
+        self.assertAlmostEqual(score, 0.6, places=5)
+
+    def test_adaptive_search_keeps_hits_above_the_score_cutoff(self):
+        """Only chunks close to the best score are kept, each with its score."""
+
+        vectors = {"Watson narrates": [1.0, 0.0], "Watson and Holmes": [0.9, 0.1],
+                   "A hound on the moor": [0.0, 1.0]}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = VectorStore(persist_directory=temp_dir)
+            store.embeddings.embeddings = Mock(
+                embed_documents=lambda texts: [vectors[t] for t in texts],
+                embed_query=lambda text: [1.0, 0.0],
+            )
+            store.add_documents([
+                Document(page_content=text, metadata={"source": "cano.md"}) for text in vectors
+            ])
+
+            docs = store.search_adaptive("Who is Watson?")
+            store.min_k = 3
+            padded = store.search_adaptive("Who is Watson?")
+
+        self.assertEqual([d.page_content for d in docs], ["Watson narrates", "Watson and Holmes"])
+        self.assertEqual(docs[0].metadata["score"], 1.0)
+        self.assertGreater(docs[1].metadata["score"], 0.99)
+        self.assertEqual(len(padded), 3)
+        self.assertEqual(padded[2].metadata["score"], 0.0)
+
 
 class TestRAGChatbot(unittest.TestCase):
     """Test RAG chatbot functionality."""
     
-    @patch('ai_course_chatbot.ai_modules.rag_chatbot.Ollama')
-    @patch('ai_course_chatbot.ai_modules.rag_chatbot.RetrievalQA')
-    def test_chatbot_initialization(self, mock_qa, mock_ollama):
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_chatbot_initialization(self, mock_ollama):
         """Test that chatbot initializes correctly."""
 
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -75,6 +308,192 @@ class TestRAGChatbot(unittest.TestCase):
             self.assertEqual(chatbot.model_name, "gemma3:4b-it-qat")
             self.assertIsNotNone(chatbot.prompt_template)
 
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_aask_retrieves_and_generates_asynchronously(self, mock_chat):
+        """aask awaits the store's async search instead of the blocking one."""
+
+        mock_chat.return_value = FakeListChatModel(responses=["Watson is a doctor."])
+        store = Mock()
+        store.asearch = AsyncMock(return_value=[
+            Document(page_content="Dr. Watson", metadata={"source": "/docs/study.pdf", "page": 3}),
+        ])
+        mock_vector_store = Mock(spec=VectorStore)
+        mock_vector_store.get_retriever.return_value = StoreRetriever(store=store, k=2)
+
+        chatbot = RAGChatbot(vector_store=mock_vector_store)
+        answer = asyncio.run(chatbot.aask("Who is Watson?"))
+
+        self.assertEqual(answer, "Watson is a doctor.\n\nSources:\n1. study (Page 3)")
+        store.asearch.assert_awaited_once_with("Who is Watson?", k=2)
+        store.search.assert_not_called()
+
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_ask_stream_does_not_block_on_retrieval(self, mock_chat):
+        """Streaming retrieval is awaited; the blocking search is never called."""
+
+        mock_chat.return_value = FakeListChatModel(responses=["Baker Street"])
+        store = Mock()
+        store.asearch = AsyncMock(return_value=[
+            Document(page_content="221B", metadata={"source": "/docs/study.pdf", "page": 1}),
+        ])
+        mock_vector_store = Mock(spec=VectorStore)
+        mock_vector_store.get_retriever.return_value = StoreRetriever(store=store, k=2)
+        chatbot = RAGChatbot(vector_store=mock_vector_store)
+
+        async def collect():
+            return [token async for token in chatbot.ask_stream("Where?")]
+
+        tokens = asyncio.run(collect())
+
+        self.assertEqual("".join(tokens), "Baker Street\n\nSources:\n1. study (Page 1)")
+        store.asearch.assert_awaited_once_with("Where?", k=2)
+        store.search.assert_not_called()
+
+
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_default_settings_compress_a_full_retrieval(self, mock_chat):
+        """Six chunk-sized hits are cut down before packing, not just truncated."""
+
+        def chunk(i):
+            filler = " ".join(f"Filler sentence {i}-{j} about nothing in particular." for j in range(18))
+            lead = "Watson had served as an army surgeon in Afghanistan. " if i == 0 else ""
+            return Document(page_content=lead + filler, metadata={"source": "study", "page": i})
+
+        docs = [chunk(i) for i in range(6)]
+        chatbot = RAGChatbot(vector_store=Mock(spec=VectorStore))
+        prompt, used = chatbot._build_prompt("Where did Watson serve as a surgeon?", docs)
+
+        self.assertIn("Watson had served as an army surgeon in Afghanistan.", prompt)
+        self.assertNotIn("Filler sentence 5-17", prompt)
+        self.assertEqual(len(used), 6)
+        self.assertLessEqual(chatbot.context_packer.estimate_tokens(prompt),
+                             chatbot.context_compressor.budget_tokens)
+
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_confident_qa_match_skips_generation(self, mock_chat):
+        """A stored Q/A answer above the threshold is returned without the LLM."""
+
+        mock_chat.return_value = FakeListChatModel(responses=["generated"])
+        qa = Document(
+            page_content="Question: Who narrates?\nAnswer: Dr. Watson.",
+            metadata={"source": "cano", "page": 3, "source_type": "qa", "answer": "Dr. Watson.",
+                      "score": 0.9},
+        )
+        chatbot = RAGChatbot(vector_store=Mock(spec=VectorStore))
+        chatbot.retriever = Mock(ainvoke=AsyncMock(return_value=[qa]))
+
+        self.assertEqual(asyncio.run(chatbot.aask("Who narrates?")),
+                         "Dr. Watson.\n\nSources:\n1. cano (Page 3)")
+        # The fast path reuses the retrieval instead of querying again.
+        chatbot.retriever.ainvoke.assert_awaited_once_with("Who narrates?")
+
+        qa.metadata["score"] = 0.5
+        self.assertEqual(asyncio.run(chatbot.aask("Who narrates?", show_sources=False)), "generated")
+
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_confident_chunk_match_answers_with_its_best_sentence(self, mock_chat):
+        """A chunk hit is cut down to the sentences answering the question."""
+
+        chunk = Document(
+            page_content="The fog lay thick over London. Watson had served as an army surgeon "
+                         "in Afghanistan. Mrs. Hudson brought up the tea.",
+            metadata={"source": "study.pdf", "page": 2, "score": 0.97},
+        )
+        chatbot = RAGChatbot(vector_store=Mock(spec=VectorStore))
+
+        self.assertEqual(
+            chatbot.fast_answer("Where did Watson serve as a surgeon?", [chunk], show_sources=False),
+            "Watson had served as an army surgeon in Afghanistan.",
+        )
+        # A paraphrase sharing no term has no sentence to extract: generate.
+        self.assertIsNone(chatbot.fast_answer("Which war did the doctor fight in?", [chunk]))
+
+
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_ask_many_retrieves_together_and_limits_generations(self, mock_chat):
+        """One batched retrieval; generations never exceed the concurrency limit."""
+
+        mock_chat.return_value = FakeListChatModel(responses=["answer"])
+        mock_vector_store = Mock(spec=VectorStore)
+        mock_vector_store.asearch_many = AsyncMock(return_value=[
+            [Document(page_content=f"chunk {i}", metadata={"source": "cano", "page": i})]
+            for i in range(4)
+        ])
+        chatbot = RAGChatbot(vector_store=mock_vector_store)
+        active, peak = 0, 0
+
+        @contextlib.asynccontextmanager
+        async def gate():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            yield
+            active -= 1
+
+        async def collect():
+            return [r async for r in chatbot.ask_many(
+                ["q0", "q1", "q2", "q3"], concurrency=2, gate=gate
+            )]
+
+        results = asyncio.run(collect())
+
+        mock_vector_store.asearch_many.assert_awaited_once_with(["q0", "q1", "q2", "q3"], k=2)
+        self.assertEqual(sorted(index for index, _, _ in results), [0, 1, 2, 3])
+        self.assertEqual({i: a for i, a, _ in results}[2], "answer\n\nSources:\n1. cano (Page 2)")
+        self.assertEqual(peak, 2)
+
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_stream_past_its_deadline_is_aborted(self, mock_chat):
+        """A runaway answer is cut off at generation_timeout and counted."""
+
+        mock_chat.return_value = FakeListChatModel(responses=["a very long answer"], sleep=0.05)
+        store = Mock()
+        store.asearch = AsyncMock(return_value=[Document(page_content="221B", metadata={})])
+        mock_vector_store = Mock(spec=VectorStore)
+        mock_vector_store.get_retriever.return_value = StoreRetriever(store=store, k=2)
+        chatbot = RAGChatbot(vector_store=mock_vector_store)
+        chatbot.generation_timeout = 0.12
+        tokens = []
+
+        async def collect():
+            async for token in chatbot.ask_stream("Where?", fast_path=False):
+                tokens.append(token)
+
+        with self.assertRaises(GenerationTimeout):
+            asyncio.run(collect())
+        self.assertTrue(0 < len(tokens) < len("a very long answer"))
+        self.assertEqual(chatbot.generation_timeouts, 1)
+        self.assertEqual(chatbot.llm_pool.stats()[0]["errors"], 0)
+
+    @patch('ai_course_chatbot.ai_modules.rag_chatbot.ChatOllama')
+    def test_sync_answer_past_its_deadline_falls_back(self, mock_chat):
+        """ask() enforces generation_timeout too, without blaming the host."""
+
+        mock_chat.return_value = FakeListChatModel(responses=["a very long answer"], sleep=0.05)
+        store = Mock(search=Mock(return_value=[Document(page_content="221B", metadata={})]))
+        mock_vector_store = Mock(spec=VectorStore)
+        mock_vector_store.get_retriever.return_value = StoreRetriever(store=store, k=2)
+        chatbot = RAGChatbot(vector_store=mock_vector_store)
+        chatbot.generation_timeout = 0.12
+
+        self.assertEqual(chatbot.ask("Where?", fast_path=False), FALLBACK_ANSWER)
+        self.assertEqual(chatbot.generation_timeouts, 1)
+        self.assertEqual(chatbot.llm_pool.stats()[0]["errors"], 0)
+
+    def test_query_embeddings_are_batched_through_the_cache(self):
+        """Only uncached questions are embedded, in a single call."""
+
+        inner = Mock(embed_documents=Mock(side_effect=lambda texts: [[float(len(t))] for t in texts]))
+        embeddings = CachedEmbeddings(inner, model="m")
+        inner.embed_query = Mock(return_value=[9.0])
+        embeddings.embed_query("Who is Watson?")
+
+        vectors = embeddings.embed_queries(["who is  watson?", "Baker Street", "Baker Street"])
+
+        self.assertEqual(vectors, [[9.0], [12.0], [12.0]])
+        inner.embed_documents.assert_called_once_with(["Baker Street"])
+
 
 def run_tests():
     """Run all tests."""
@@ -0,0 +1,60 @@
+"""
+Tests for extractive context compression
+"""
+from langchain_core.documents import Document
+
+from ai_course_chatbot.ai_modules.context_compressor import ContextCompressor
+
+STUDY = (
+    "The fog lay thick over London that morning. Holmes was at his chemistry table. "
+    "Watson had served as an army surgeon in Afghanistan. Mrs. Hudson brought up the tea."
+)
+HOUND = "The hound howled on the moor. Sir Henry had lost a boot at the hotel."
+
+
+def doc(text, page=0):
+    return Document(page_content=text, metadata={"source": "a.pdf", "page": page})
+
+
+def test_only_sentences_matching_the_question_are_kept():
+    compressor = ContextCompressor(budget_tokens=20, chars_per_token=4.0)
+    docs = compressor.compress("Where did Watson serve as a surgeon?", [doc(STUDY, 1), doc(HOUND, 2)])
+
+    assert docs[0].page_content == "Watson had served as an army surgeon in Afghanistan."
+    assert docs[0].metadata["page"] == 1
+    # Every retrieved chunk keeps its best sentence, even without a match.
+    assert docs[1].page_content == "The hound howled on the moor."
+
+
+def test_kept_sentences_stay_in_original_order_within_the_budget():
+    compressor = ContextCompressor(budget_tokens=40, chars_per_token=4.0)
+    docs = compressor.compress("Holmes and Watson in London", [doc(STUDY)])
+
+    assert docs[0].page_content == (
+        "The fog lay thick over London that morning. Holmes was at his chemistry table. "
+        "Watson had served as an army surgeon in Afghanistan."
+    )
+
+
+def test_context_within_budget_is_unchanged():
+    original = [doc(STUDY), doc(HOUND)]
+    assert ContextCompressor(budget_tokens=1000).compress("Watson", original) is original
+    assert ContextCompressor(budget_tokens=0).compress("Watson", original) is original
+
+
+def test_paraphrased_question_keeps_the_chunks_whole():
+    compressor = ContextCompressor(budget_tokens=20, chars_per_token=4.0)
+    original = [doc(STUDY, 1), doc(HOUND, 2)]
+    # No term overlap: scoring cannot pick a sentence, so none is dropped.
+    docs = compressor.compress("Which war did the doctor fight in?", original)
+
+    assert docs is original
+    assert "Watson had served as an army surgeon in Afghanistan." in docs[0].page_content
+
+
+def test_reserved_tokens_shrink_the_budget():
+    compressor = ContextCompressor(budget_tokens=60, chars_per_token=4.0)
+    assert compressor.compress("Watson", [doc(STUDY)])[0].page_content == STUDY
+
+    docs = compressor.compress("Where did Watson serve as a surgeon?", [doc(STUDY)], reserved_tokens=40)
+    assert docs[0].page_content == "Watson had served as an army surgeon in Afghanistan."
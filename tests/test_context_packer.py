@@ -0,0 +1,42 @@
+"""
+Tests for token-budgeted context packing
+"""
+from langchain_core.documents import Document
+
+from ai_course_chatbot.ai_modules.context_packer import ContextPacker
+
+
+def doc(text, page=0):
+    return Document(page_content=text, metadata={"source": "a.pdf", "page": page})
+
+
+def test_chunks_that_fit_are_kept_in_relevance_order():
+    packer = ContextPacker(budget_tokens=100, chars_per_token=1.0)
+    packed = packer.pack([doc("a" * 40, 1), doc("b" * 40, 2)])
+
+    assert packed.text == "a" * 40 + "\n\n" + "b" * 40
+    assert [d.metadata["page"] for d in packed.documents] == [1, 2]
+    assert (packed.tokens, packed.truncated, packed.skipped) == (82, 0, 0)
+
+
+def test_overflowing_chunk_is_truncated_at_a_word_boundary():
+    packer = ContextPacker(budget_tokens=120, chars_per_token=1.0, min_chunk_tokens=10)
+    words = " ".join(["word"] * 40)  # 199 characters
+    packed = packer.pack([doc("x" * 50), doc(words, 7)], reserved_tokens=20)
+
+    assert packed.budget == 100
+    assert packed.truncated == 1
+    assert packed.tokens <= packed.budget
+    tail = packed.documents[1]
+    assert tail.metadata["page"] == 7
+    assert words.startswith(tail.page_content)
+    assert tail.page_content.endswith("word")
+
+
+def test_chunks_are_skipped_rather_than_overflowing():
+    packer = ContextPacker(budget_tokens=60, chars_per_token=1.0, min_chunk_tokens=32)
+    packed = packer.pack([doc("a" * 50, 1), doc("b" * 500, 2), doc("c" * 5, 3)])
+
+    assert [d.metadata["page"] for d in packed.documents] == [1, 3]
+    assert packed.skipped == 1
+    assert packed.tokens <= 60
@@ -0,0 +1,95 @@
+"""
+Tests for the persistent embedding cache
+"""
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from ai_course_chatbot.ai_modules.embedding_cache import (CachedEmbeddings,
+                                                          EmbeddingCache,
+                                                          content_hash)
+
+
+def test_cache_roundtrip_and_counters(tmp_path):
+    """Stored vectors are returned per model and hits/misses are counted."""
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    cache.put_many("model-a", {"h1": [0.5, 1.0]})
+
+    assert cache.get_many("model-a", ["h1", "h2"]) == {"h1": [0.5, 1.0]}
+    assert cache.get_many("model-b", ["h1"]) == {}
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Entries beyond max_entries are evicted oldest-first."""
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put_many("m", {"old": [1.0]})
+    cache.put_many("m", {"mid": [2.0]})
+    cache.get_many("m", ["old"])  # refresh "old"
+    cache.put_many("m", {"new": [3.0]})
+
+    assert len(cache) == 2
+    assert set(cache.get_many("m", ["old", "mid", "new"])) == {"old", "new"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cached_embeddings_only_embeds_misses(tmp_path):
+    """Only unseen texts reach the wrapped client, and order is preserved."""
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many("m", {content_hash("known"): [1.0, 1.0]})
+
+    inner = Mock()
+    inner.embed_documents.return_value = [[2.0, 2.0]]
+    embeddings = CachedEmbeddings(inner, model="m", cache=cache)
+
+    vectors = embeddings.embed_documents(["new", "known", "new"])
+
+    inner.embed_documents.assert_called_once_with(["new"])
+    assert vectors == [[2.0, 2.0], [1.0, 1.0], [2.0, 2.0]]
+    assert cache.get_many("m", [content_hash("new")])
+
+
+def test_query_cache_reuses_normalized_queries():
+    """Whitespace/case variants of a question share one embedding call."""
+    inner = Mock()
+    inner.embed_query.return_value = [0.1, 0.2]
+    embeddings = CachedEmbeddings(inner, model="m", query_cache_size=2)
+
+    first = embeddings.embed_query("What is  a neural net?")
+    second = embeddings.embed_query("  what is a NEURAL net?")
+
+    assert first == second == [0.1, 0.2]
+    inner.embed_query.assert_called_once_with("What is a neural net?")
+    stats = embeddings.query_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_query_cache_is_bounded():
+    """The query LRU never grows beyond its configured size."""
+    inner = Mock()
+    inner.embed_query.side_effect = lambda text: [float(len(text))]
+    embeddings = CachedEmbeddings(inner, model="m", query_cache_size=2)
+
+    for question in ("a", "bb", "ccc", "a"):
+        embeddings.embed_query(question)
+
+    assert inner.embed_query.call_count == 4
+    assert embeddings.query_cache_stats()["entries"] == 2
+
+
+def test_async_query_embedding_shares_the_lru():
+    inner = Mock()
+    inner.aembed_query = AsyncMock(return_value=[0.3, 0.4])
+    embeddings = CachedEmbeddings(inner, model="m", query_cache_size=2)
+
+    first = asyncio.run(embeddings.aembed_query("Who is Watson?"))
+    second = embeddings.embed_query("who is watson?")
+
+    assert first == second == [0.3, 0.4]
+    inner.aembed_query.assert_awaited_once_with("Who is Watson?")
+    inner.embed_query.assert_not_called()
@@ -0,0 +1,84 @@
+"""
+Tests for the adaptive embedding batch scheduler
+"""
+import pytest
+
+from ai_course_chatbot.ai_modules import embedding_scheduler
+
+
+def _items(n: int):
+    return ((f"doc-{i}", f"id-{i}") for i in range(n))
+
+
+def test_scheduler_processes_everything_and_grows_fast_batches():
+    """Fast batches increase the batch size up to the configured maximum."""
+    seen: list[str] = []
+    scheduler = embedding_scheduler.EmbeddingBatchScheduler(
+        batch_size=4, min_batch_size=2, max_batch_size=16,
+        concurrency=2, target_batch_seconds=10.0,
+    )
+
+    report = scheduler.run(_items(50), lambda docs, ids: seen.extend(ids))
+
+    assert report.processed == 50
+    assert report.failed == 0
+    assert sorted(seen) == sorted(f"id-{i}" for i in range(50))
+    assert report.final_batch_size == 16
+    assert report.docs_per_second > 0
+
+
+def test_scheduler_retries_failed_batch_with_smaller_size():
+    """A failing batch is halved and retried instead of aborting the run."""
+    calls: list[int] = []
+
+    def flaky(docs, ids):
+        calls.append(len(ids))
+        if len(calls) == 1:
+            raise TimeoutError("ollama timed out")
+
+    scheduler = embedding_scheduler.EmbeddingBatchScheduler(
+        batch_size=8, min_batch_size=2, max_batch_size=8,
+        concurrency=1, retry_backoff=0.0,
+    )
+    report = scheduler.run(_items(8), flaky)
+
+    assert report.processed == 8
+    assert report.failed == 0
+    assert report.retries == 2
+    assert calls == [8, 4, 4]
+
+
+def test_scheduler_gives_up_after_max_retries():
+    """Permanently failing batches are reported, not raised."""
+    def broken(docs, ids):
+        raise ConnectionError("connection refused")
+
+    scheduler = embedding_scheduler.EmbeddingBatchScheduler(
+        batch_size=4, min_batch_size=4, max_batch_size=4,
+        concurrency=1, max_retries=1, retry_backoff=0.0,
+    )
+    report = scheduler.run(_items(4), broken)
+
+    assert report.processed == 0
+    assert report.failed == 4
+
+
+def test_scheduler_raises_programming_errors_without_retrying():
+    """Only host/transport failures are split and retried."""
+    calls = []
+
+    def buggy(docs, ids):
+        calls.append(len(ids))
+        raise TypeError("unexpected argument")
+
+    scheduler = embedding_scheduler.EmbeddingBatchScheduler(
+        batch_size=4, min_batch_size=1, concurrency=1, retry_backoff=0.0,
+    )
+    with pytest.raises(TypeError):
+        scheduler.run(_items(4), buggy)
+    assert calls == [4]
+
+
+def test_scheduler_rejects_invalid_bounds():
+    with pytest.raises(ValueError):
+        embedding_scheduler.EmbeddingBatchScheduler(min_batch_size=10, max_batch_size=5)
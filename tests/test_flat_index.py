@@ -0,0 +1,127 @@
+"""
+Tests for the memory-mapped flat vector index
+"""
+import tempfile
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ai_course_chatbot.ai_modules import VectorStore
+from ai_course_chatbot.ai_modules.flat_index import FlatIndex
+
+VOCAB = ["holmes", "watson", "violin", "harpoon", "laboratory"]
+
+
+class KeywordEmbeddings(Embeddings):
+    """Bag-of-words vectors over a tiny vocabulary; deterministic and offline."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        words = text.lower().split()
+        return [float(words.count(term)) + 0.01 for term in VOCAB]
+
+
+def _index(path) -> FlatIndex:
+    return FlatIndex(str(path), embedding_function=KeywordEmbeddings())
+
+
+def test_search_returns_top_k_by_cosine(tmp_path):
+    index = _index(tmp_path)
+    index.add_texts(
+        ["holmes violin", "watson laboratory", "harpoon harpoon"],
+        metadatas=[{"page": 1}, {"page": 2}, {"page": 3}],
+        ids=["a", "b", "c"],
+    )
+
+    results = index.similarity_search_with_score("harpoon", k=2)
+
+    assert results[0][0].id == "c"
+    assert results[0][0].metadata == {"page": 3}
+    assert results[0][1] > results[1][1]
+    assert len(index) == 3
+
+
+def test_index_persists_and_other_readers_see_appends(tmp_path):
+    """A second instance maps the same files and picks up later writes."""
+    writer = _index(tmp_path)
+    writer.add_texts(["holmes"], ids=["a"])
+    reader = _index(tmp_path)
+    assert len(reader) == 1
+
+    writer.add_texts(["watson"], ids=["b"])
+    assert reader.similarity_search("watson", k=1)[0].id == "b"
+
+
+def test_delete_and_replace_compact_rows(tmp_path):
+    index = _index(tmp_path)
+    index.add_texts(["holmes", "watson", "violin"], ids=["a", "b", "c"])
+
+    assert index.delete(["b"]) is True
+    index.add_texts(["harpoon"], ids=["a"])
+
+    assert len(index) == 2
+    assert index.get(include=[])["ids"] == ["c", "a"]
+    assert index.get_by_ids(["a"])[0].page_content == "harpoon"
+    assert index.similarity_search("watson", k=5)[0].id != "b"
+
+
+def test_vector_store_flat_backend_adds_and_searches():
+    """VectorStore exposes the same interface on top of the flat backend."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = VectorStore(persist_directory=temp_dir, backend="flat")
+        store.embeddings.embeddings = KeywordEmbeddings()
+
+        store.add_documents([
+            Document(page_content="Holmes plays the violin", metadata={"source": "a.pdf", "page": 1}),
+            Document(page_content="Watson in the laboratory", metadata={"source": "b.pdf", "page": 2}),
+        ])
+
+        assert store.document_count() == 2
+        assert store.similarity_search("violin", k=1)[0].metadata["source"] == "a.pdf"
+        assert store.search("laboratory", k=1)[0].metadata["source"] == "b.pdf"
+
+
+def test_get_filters_by_metadata(tmp_path):
+    index = _index(tmp_path)
+    index.add_texts(
+        ["holmes", "watson", "violin"],
+        metadatas=[{"source": "a"}, {"source": "b"}, {"source": "a"}],
+        ids=["x", "y", "z"],
+    )
+
+    assert index.get(where={"source": "a"}, include=[])["ids"] == ["x", "z"]
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_search_reranks_with_full_precision(tmp_path, quantization):
+    """Quantized first pass keeps recall high and scores stay exact cosine."""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 64)).astype(np.float32)
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+
+    index = FlatIndex(str(tmp_path), KeywordEmbeddings(), quantization=quantization, rerank_factor=8)
+    index.add_vectors(ids, vectors, ["text"] * len(ids), [{} for _ in ids])
+
+    results = index.similarity_search_by_vector_with_score(vectors[7].tolist(), k=3)
+    assert results[0][0].id == "doc-7"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+
+    queries = vectors[:50] + rng.normal(scale=0.5, size=(50, 64)).astype(np.float32)
+    assert index.recall_at_k(queries, k=10) >= 0.7
+
+    footprint = index.memory_footprint()
+    assert footprint["search_bytes"] < footprint["float32_bytes"]
+
+
+def test_quantized_codes_survive_reopen_and_delete(tmp_path):
+    index = FlatIndex(str(tmp_path), KeywordEmbeddings(), quantization="int8")
+    index.add_texts(["holmes", "watson", "violin"], ids=["a", "b", "c"])
+    index.delete(["a"])
+
+    reopened = FlatIndex(str(tmp_path), KeywordEmbeddings(), quantization="int8")
+    assert reopened.similarity_search("violin", k=1)[0].id == "c"
+    assert sorted(p.name for p in tmp_path.glob("codes-*")) == ["codes-1.int8"]
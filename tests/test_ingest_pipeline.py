@@ -0,0 +1,35 @@
+"""
+Tests for the bounded ingestion pipeline stages
+"""
+import time
+
+import pytest
+
+from ai_course_chatbot.ai_modules.ingest_pipeline import prefetch
+
+
+def test_prefetch_preserves_order_and_bounds_read_ahead():
+    produced = []
+
+    def source():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    stream = prefetch(source(), maxsize=2)
+    assert next(stream) == 0
+    time.sleep(0.3)
+    # One consumed, two queued and one waiting to be put.
+    assert len(produced) <= 4
+    assert list(stream) == list(range(1, 100))
+
+
+def test_prefetch_reraises_producer_errors():
+    def source():
+        yield 1
+        raise ValueError("bad page")
+
+    stream = prefetch(source(), maxsize=4)
+    assert next(stream) == 1
+    with pytest.raises(ValueError, match="bad page"):
+        next(stream)
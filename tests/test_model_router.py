@@ -0,0 +1,55 @@
+"""
+Tests for load-adaptive model routing
+"""
+from ai_course_chatbot.ai_modules.model_router import ModelRouter
+
+
+class Load:
+    def __init__(self):
+        self.depth = 0
+        self.now = 0.0
+
+
+def make_router(load, fast="gemma3:1b"):
+    return ModelRouter(
+        "gemma3:4b", fast, queue_depth=lambda: load.depth, queue_threshold=8,
+        p95_threshold=10.0, cooldown=30.0, timer=lambda: load.now,
+    )
+
+
+def test_deep_queue_switches_to_fast_model_and_back_with_hysteresis():
+    load = Load()
+    router = make_router(load)
+    assert router.choose() == "gemma3:4b"
+
+    load.depth = 8
+    assert router.choose() == "gemma3:1b"
+
+    load.depth, load.now = 2, 10.0  # drained, but still inside the cooldown
+    assert router.choose() == "gemma3:1b"
+    load.depth, load.now = 6, 40.0  # past the cooldown, but not below half the threshold
+    assert router.choose() == "gemma3:1b"
+    load.depth = 4
+    assert router.choose() == "gemma3:4b"
+    assert router.stats()["switches"] == 1
+
+
+def test_slow_primary_generations_trigger_fast_model():
+    load = Load()
+    router = make_router(load)
+    for seconds in (2.0, 3.0, 2.5, 3.5, 2.0):
+        router.record("gemma3:4b", seconds)
+    router.record("gemma3:1b", 60.0)  # fast-model timings do not count
+    assert router.choose() == "gemma3:4b"
+
+    for _ in range(5):
+        router.record("gemma3:4b", 12.0)
+    assert router.choose() == "gemma3:1b"
+    assert router.stats()["p95_seconds"] == 12.0
+
+
+def test_without_fast_model_primary_is_always_used():
+    load = Load()
+    load.depth = 100
+    assert make_router(load, fast="").choose() == "gemma3:4b"
+    assert make_router(load, fast="gemma3:4b").choose() == "gemma3:4b"
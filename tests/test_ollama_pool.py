@@ -0,0 +1,118 @@
+"""
+Tests for the multi-backend Ollama pool, against local fake Ollama servers
+"""
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+
+from ai_course_chatbot.ai_modules.ollama_pool import (OllamaPool,
+                                                      PooledEmbeddings)
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Just enough of the Ollama API for /api/version, /api/embed and /api/chat."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload: bytes, content_type="application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._send(json.dumps({"version": "0.0.0"}).encode())
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.paths.append(self.path)
+        if self.path == "/api/embed":
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            self._send(json.dumps({"model": body["model"], "embeddings": [[1.0, 0.0]] * len(inputs)}).encode())
+            return
+        message = {"role": "assistant", "content": self.server.name}
+        lines = [
+            {"model": body["model"], "created_at": "2024-01-01T00:00:00Z", "message": message, "done": False},
+            {"model": body["model"], "created_at": "2024-01-01T00:00:00Z",
+             "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop"},
+        ]
+        self._send("".join(json.dumps(line) + "\n" for line in lines).encode(), "application/x-ndjson")
+
+
+@pytest.fixture
+def servers():
+    started = []
+    for name in ("a", "b"):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+        server.name, server.paths = name, []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        started.append(server)
+    yield started
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def dead_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_requests_go_to_the_least_loaded_backend(servers):
+    pool = OllamaPool([url(s) for s in servers], lambda u: ChatOllama(model="m", base_url=u))
+    messages = [HumanMessage(content="hi")]
+
+    with pool.lease() as busy:
+        answers = {pool.run(lambda llm: llm.invoke(messages)).content for _ in range(3)}
+
+    idle = next(s.name for s in servers if url(s) != busy.url)
+    assert answers == {idle}
+    assert [b["outstanding"] for b in pool.stats()] == [0, 0]
+
+
+def test_failing_backend_is_retried_elsewhere_and_ejected(servers):
+    dead = dead_url()
+    pool = OllamaPool(
+        [dead, url(servers[0])],
+        lambda u: OllamaEmbeddings(model="nomic-embed-text", base_url=u),
+        failure_threshold=2,
+    )
+    embeddings = PooledEmbeddings(pool)
+
+    for _ in range(4):
+        assert embeddings.embed_query("Sherwood") == [1.0, 0.0]
+
+    stats = {b["url"]: b for b in pool.stats()}
+    assert stats[dead]["ejected"] and stats[dead]["errors"] == 2
+    assert len(servers[0].paths) == 4
+
+
+def test_health_check_ejects_down_hosts_and_readmits_recovered_ones(servers):
+    clock = [0.0]
+    dead, live = dead_url(), url(servers[0])
+    pool = OllamaPool([dead, live], lambda u: u, timer=lambda: clock[0])
+    pool.backends[1].failures, pool.backends[1].ejected_until = 3, 30.0  # e.g. was restarting
+
+    pool.check_health(timeout=0.5)
+    assert {b["url"]: b["ejected"] for b in pool.stats()} == {dead: True, live: False}
+    assert {pool.run(lambda client: client) for _ in range(3)} == {live}
+
+    # With every host ejected the pool fails open instead of refusing work.
+    pool.backends[1].ejected_until = 60.0
+    assert pool.run(lambda client: client) == dead
+    clock[0] = 61.0
+    assert not any(b["ejected"] for b in pool.stats())
@@ -0,0 +1,70 @@
+"""
+Tests for the parsed-chunk cache used by PDFLoader
+"""
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from ai_course_chatbot.ai_modules import PDFLoader
+from ai_course_chatbot.ai_modules.parse_cache import ParseCache
+
+PDF = os.path.join(os.path.dirname(__file__), "..", "data", "robin_hood.pdf")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_unchanged_file_skips_extraction(tmp_path, workers):
+    copy = tmp_path / "handout.pdf"
+    shutil.copy(PDF, copy)
+    loader = PDFLoader(workers=workers, pages_per_task=40, cache_dir=str(tmp_path / "cache"))
+    parsed = loader.load_and_chunk_pdfs([PDF])
+
+    with patch("ai_course_chatbot.ai_modules.pdf_loader.PyPDFLoader") as pypdf_loader, \
+            patch("ai_course_chatbot.ai_modules.pdf_loader._parse_page_range") as parse_range:
+        cached = loader.load_and_chunk_pdfs([str(copy)])
+
+    pypdf_loader.assert_not_called()
+    parse_range.assert_not_called()
+    assert [doc.page_content for doc in cached] == [doc.page_content for doc in parsed]
+    assert {doc.metadata["source"] for doc in cached} == {str(copy)}
+    assert cached[0].metadata["page"] == parsed[0].metadata["page"]
+
+
+def test_key_changes_with_content_and_chunking(tmp_path):
+    copy = tmp_path / "handout.pdf"
+    shutil.copy(PDF, copy)
+    cache = ParseCache(str(tmp_path / "cache"))
+    key = cache.key(str(copy), 1000, 200)
+
+    assert cache.key(str(copy), 500, 200) != key
+    with open(copy, "ab") as f:
+        f.write(b"\n% appended")
+    assert cache.key(str(copy), 1000, 200) != key
+
+
+def test_failed_parse_is_not_cached(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    loader = PDFLoader(workers=1, use_cache=False)
+
+    def broken():
+        yield from loader.load_pdf(PDF)[:3]
+        raise ValueError("corrupt page")
+
+    with pytest.raises(ValueError):
+        list(cache.record("k", broken()))
+
+    assert cache.load("k", PDF) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_closing_the_record_early_discards_the_entry(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    chunks = PDFLoader(workers=1, use_cache=False).load_pdf(PDF)[:3]
+
+    recording = cache.record("k", iter(chunks))
+    assert next(recording) is chunks[0]
+    recording.close()
+
+    assert cache.load("k", PDF) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,52 @@
+"""
+Tests for the semantic answer cache
+"""
+from ai_course_chatbot.services.semantic_cache import SemanticCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_paraphrase_above_threshold_hits():
+    cache = SemanticCache(threshold=0.9, maxsize=4)
+    cache.add([1.0, 0.0, 0.1], "what is a neural net?", "A model.", has_sources=True)
+
+    hit = cache.lookup([0.98, 0.02, 0.1])
+    assert hit is not None
+    assert hit.answer == "A model."
+    assert hit.similarity > 0.9
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_answers_without_sources_do_not_serve_source_requests():
+    cache = SemanticCache(threshold=0.9)
+    cache.add([1.0, 0.0], "q", "answer", has_sources=False)
+
+    assert cache.lookup([1.0, 0.0], require_sources=True) is None
+    assert cache.lookup([1.0, 0.0], require_sources=False).answer == "answer"
+
+
+def test_entries_expire_and_lru_is_evicted():
+    clock = FakeClock()
+    cache = SemanticCache(threshold=0.99, maxsize=2, ttl=10, timer=clock)
+    cache.add([1.0, 0.0], "a", "A", has_sources=True)
+    cache.add([0.0, 1.0], "b", "B", has_sources=True)
+
+    clock.now = 1.0
+    assert cache.lookup([1.0, 0.0]).answer == "A"
+    cache.add([0.7, 0.7], "c", "C", has_sources=True)  # evicts "b", the least recently used
+
+    assert cache.lookup([0.0, 1.0]) is None
+    assert cache.stats()["evictions"] == 1
+
+    clock.now = 12.0
+    assert cache.lookup([1.0, 0.0]) is None
+    assert len(cache) == 0
@@ -0,0 +1,116 @@
+"""
+Tests for single-flight request coalescing
+"""
+import asyncio
+
+from ai_course_chatbot.services.single_flight import SingleFlight, StreamFlight
+
+
+def test_concurrent_callers_share_one_run():
+    flight = SingleFlight()
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.run("q|True", generate) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert calls == 1
+    assert flight.stats() == {"leaders": 1, "joined": 4, "in_flight": 0}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_run():
+    flight = SingleFlight()
+
+    async def generate():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flight.run("q", generate))
+        second = asyncio.ensure_future(flight.run("q", generate))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "answer"
+
+
+def test_late_stream_joiner_replays_prefix_then_tail():
+    flight = StreamFlight()
+
+    async def main():
+        halfway = asyncio.Event()
+        resume = asyncio.Event()
+
+        async def tokens():
+            yield "Robin "
+            yield "Hood "
+            halfway.set()
+            await resume.wait()
+            yield "lived "
+            yield "here."
+
+        async def collect(stream):
+            return [token async for token in stream]
+
+        first = asyncio.ensure_future(collect(flight.subscribe("q", tokens)))
+        await halfway.wait()
+        late = asyncio.ensure_future(collect(flight.subscribe("q", tokens)))
+        await asyncio.sleep(0)
+        resume.set()
+        return await first, await late
+
+    first, late = asyncio.run(main())
+    assert first == late == ["Robin ", "Hood ", "lived ", "here."]
+    assert flight.stats() == {"leaders": 1, "joined": 1, "in_flight": 0, "cancelled": 0}
+
+
+def test_stream_error_reaches_every_subscriber():
+    flight = StreamFlight()
+
+    async def tokens():
+        yield "partial"
+        raise RuntimeError("model went away")
+
+    async def main():
+        async def collect():
+            return [token async for token in flight.subscribe("q", tokens)]
+        return await asyncio.gather(collect(), collect(), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [str(result) for result in results] == ["model went away"] * 2
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_stream_is_cancelled_when_every_subscriber_leaves():
+    flight = StreamFlight()
+    closed = asyncio.Event()
+
+    async def tokens():
+        try:
+            while True:
+                yield "more "
+                await asyncio.sleep(0.001)
+        finally:
+            closed.set()
+
+    async def main():
+        streams = [flight.subscribe("q", tokens), flight.subscribe("q", tokens)]
+        for stream in streams:
+            await stream.__anext__()
+        await streams[0].aclose()
+        await asyncio.sleep(0.01)
+        still_running = not closed.is_set()
+        await streams[1].aclose()
+        await asyncio.wait_for(closed.wait(), 1)
+        return still_running
+
+    assert asyncio.run(main())  # one listener left is enough to keep it going
+    assert flight.stats()["cancelled"] == 1
+    assert "q" not in flight